@@ -6,3 +6,7 @@ from .ABuPickStockExecute import do_pick_stock_work
 from .ABuPickTimeExecute import do_symbols_with_same_factors, do_symbols_with_diff_factors
 # noinspection all
 from . import ABuPickTimeWorker as pick_time_worker
+# noinspection all
+from . import ABuPickTimeExecute as pick_time_execute
+# noinspection all
+from . import ABuPickTimeMaster as pick_time_master
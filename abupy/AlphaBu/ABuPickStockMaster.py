@@ -15,7 +15,7 @@ from .ABuPickStockExecute import do_pick_stock_work, do_pick_stock_thread_work
 from ..CoreBu import ABuEnv
 from ..CoreBu.ABuEnv import EMarketDataFetchMode
 from ..CoreBu.ABuEnvProcess import AbuEnvProcess
-from ..MarketBu.ABuMarket import split_k_market, all_symbol
+from ..MarketBu.ABuMarket import split_k_task, all_symbol
 from ..MarketBu import ABuMarket
 from ..CoreBu.ABuFixes import partial
 from ..CoreBu.ABuParallel import delayed, Parallel
@@ -57,12 +57,10 @@ class AbuPickStockMaster(object):
                 logging.info('batch get only support E_DATA_FETCH_FORCE_LOCAL for Parallel!')
                 n_process_pick_stock = 1
 
-            # 根据输入的choice_symbols和要并行的进程数，分配symbol到n_process_pick_stock进程中
-            process_symbols = split_k_market(n_process_pick_stock, market_symbols=choice_symbols)
-
-            # 因为切割会有余数，所以将原始设置的进程数切换为分割好的个数, 即32 -> 33 16 -> 17
+            # 根据输入的choice_symbols和要并行的进程数，分配symbol到子序列任务中
+            split_n_process, process_symbols = split_k_task(n_process_pick_stock, choice_symbols)
             if n_process_pick_stock > 1:
-                n_process_pick_stock = len(process_symbols)
+                n_process_pick_stock = split_n_process
 
             parallel = Parallel(
                 n_jobs=n_process_pick_stock, verbose=0, pre_dispatch='2*n_jobs')
@@ -12,11 +12,11 @@ from __future__ import division
 import logging
 
 import numpy as np
-import pandas as pd
 from enum import Enum
 
 from .ABuPickTimeWorker import AbuPickTimeWorker
 from ..CoreBu.ABuEnvProcess import add_process_env_sig
+from ..CoreBu.ABuStore import AbuResultAccumulator
 from ..TradeBu import ABuTradeExecute
 from ..TradeBu import ABuTradeProxy
 from ..TradeBu.ABuKLManager import AbuKLManager
@@ -25,6 +25,13 @@ from ..UtilBu.ABuProgress import AbuMulPidProgress
 __author__ = '阿布'
 __weixin__ = 'abu_quant'
 
+"""
+    择时结果分块落盘的交易对象数量阈值，默认None即所有交易对象的择时结果都保留在内存中，最后一次性连接，
+    如需开启分块落盘使用下面代码，即每积累500个交易对象的择时结果写入一个分块文件（有pyarrow使用parquet）：
+    abupy.alpha.pick_time_execute.g_spill_symbol_cnt = 500
+"""
+g_spill_symbol_cnt = None
+
 
 class EFitError(Enum):
     """
@@ -44,7 +51,7 @@ class EFitError(Enum):
 
 
 def _do_pick_time_work(capital, buy_factors, sell_factors, kl_pd, benchmark, draw=False,
-                       show_info=False, show_pg=False):
+                       show_info=False, show_pg=False, resume=None):
     """
     内部方法：包装AbuPickTimeWorker进行fit，分配错误码，通过trade_summary生成orders_pd，action_pd
     :param capital: AbuCapital实例对象
@@ -55,15 +62,26 @@ def _do_pick_time_work(capital, buy_factors, sell_factors, kl_pd, benchmark, dra
     :param draw: 是否绘制在对应的金融时间序列上的交易行为
     :param show_info: 是否显示在整个金融时间序列上的交易结果
     :param show_pg: 是否择时内部启动进度条，适合单进程或者每个进程里只有一个symbol进行择时
+    :param resume: 增量择时断点管理对象，AbuPickTimeResume实例对象，默认None，即不进行增量择时
     :return:
     """
     if kl_pd is None or kl_pd.shape[0] == 0:
         return None, EFitError.NET_ERROR
 
-    pick_timer_worker = AbuPickTimeWorker(capital, kl_pd, benchmark, buy_factors, sell_factors)
+    pick_timer_worker = None
+    if resume is not None:
+        # 尝试从断点恢复择时worker，断点不存在或者失效时进行完整择时
+        pick_timer_worker = resume.load_worker(capital, kl_pd, benchmark, buy_factors, sell_factors)
+    if pick_timer_worker is None:
+        pick_timer_worker = AbuPickTimeWorker(capital, kl_pd, benchmark, buy_factors, sell_factors)
     if show_pg:
         pick_timer_worker.enable_task_pg()
+    if resume is not None:
+        pick_timer_worker.enable_checkpoint()
     pick_timer_worker.fit()
+    if resume is not None:
+        # 保存本次择时生成的断点，供下一次增量择时使用
+        resume.dump_worker(pick_timer_worker, buy_factors, sell_factors)
 
     if len(pick_timer_worker.orders) == 0:
         # 择时金融时间序列拟合操作后，没有任何order生成
@@ -80,7 +98,8 @@ def _do_pick_time_work(capital, buy_factors, sell_factors, kl_pd, benchmark, dra
 @add_process_env_sig
 def do_symbols_with_same_factors(target_symbols, benchmark, buy_factors, sell_factors, capital,
                                  apply_capital=True, kl_pd_manager=None,
-                                 show=False, back_target_symbols=None, func_factors=None, show_progress=True):
+                                 show=False, back_target_symbols=None, func_factors=None, show_progress=True,
+                                 resume=None):
     """
     输入为多个择时交易对象，以及相同的择时买入，卖出因子序列，对多个交易对象上实施相同的因子
     :param target_symbols: 多个择时交易对象序列
@@ -94,13 +113,14 @@ def do_symbols_with_same_factors(target_symbols, benchmark, buy_factors, sell_fa
     :param back_target_symbols:  补位targetSymbols为了忽略网络问题及数据不足导致的问题
     :param func_factors: funcFactors在内层解开factors dicts为了do_symbols_with_diff_factors
     :param show_progress: 进度条显示，默认True
+    :param resume: 增量择时断点管理对象，AbuPickTimeResume实例对象，默认None，即不进行增量择时
     """
     if kl_pd_manager is None:
         kl_pd_manager = AbuKLManager(benchmark, capital)
 
     def _batch_symbols_with_same_factors(p_buy_factors, p_sell_factors):
-        r_orders_pd = None
-        r_action_pd = None
+        # 每一个交易对象的择时结果添加到累加器中，最后一次性连接
+        r_accumulator = AbuResultAccumulator(spill_cnt=g_spill_symbol_cnt)
         r_all_fit_symbols_cnt = 0
         # 启动多进程进度显示AbuMulPidProgress
         with AbuMulPidProgress(len(target_symbols), 'pick times complete', show_progress=show_progress) as progress:
@@ -117,7 +137,8 @@ def do_symbols_with_same_factors(target_symbols, benchmark, buy_factors, sell_fa
                     kl_pd = kl_pd_manager.get_pick_time_kl_pd(target_symbol)
                     ret, fit_error = _do_pick_time_work(capital, p_buy_factors, p_sell_factors, kl_pd, benchmark,
                                                         draw=show, show_info=show,
-                                                        show_pg=(len(target_symbols) == 1 and show_progress))
+                                                        show_pg=(len(target_symbols) == 1 and show_progress),
+                                                        resume=resume)
                 except Exception as e:
                     logging.exception(e)
                     continue
@@ -134,7 +155,7 @@ def do_symbols_with_same_factors(target_symbols, benchmark, buy_factors, sell_fa
                         target_symbol = back_target_symbols.pop()
                         kl_pd = kl_pd_manager.get_pick_time_kl_pd(target_symbol)
                         ret, fit_error = _do_pick_time_work(capital, p_buy_factors, p_sell_factors, kl_pd, benchmark,
-                                                            draw=show, show_info=show)
+                                                            draw=show, show_info=show, resume=resume)
                         if fit_error == EFitError.NO_ORDER_GEN:
                             r_all_fit_symbols_cnt += 1
                         if ret is not None:
@@ -142,9 +163,9 @@ def do_symbols_with_same_factors(target_symbols, benchmark, buy_factors, sell_fa
                 if ret is None:
                     continue
                 r_all_fit_symbols_cnt += 1
-                # 连接每一个交易对象生成的orders_pd和action_pd
-                r_orders_pd = ret[0] if r_orders_pd is None else pd.concat([r_orders_pd, ret[0]])
-                r_action_pd = ret[1] if r_action_pd is None else pd.concat([r_action_pd, ret[1]])
+                # 添加每一个交易对象生成的orders_pd和action_pd
+                r_accumulator.append(ret[0], ret[1])
+        r_orders_pd, r_action_pd = r_accumulator.result()
         return r_orders_pd, r_action_pd, r_all_fit_symbols_cnt
 
     orders_pd, action_pd, all_fit_symbols_cnt = _batch_symbols_with_same_factors(buy_factors, sell_factors)
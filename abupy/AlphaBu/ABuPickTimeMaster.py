@@ -8,20 +8,29 @@ from __future__ import division
 from __future__ import print_function
 
 import numpy as np
-import pandas as pd
 
 from .ABuPickTimeExecute import do_symbols_with_same_factors
 from ..CoreBu.ABuEnvProcess import AbuEnvProcess
+from ..CoreBu.ABuStore import AbuResultAccumulator
 from ..CoreBu import ABuEnv
 from ..CoreBu.ABuEnv import EMarketDataFetchMode
-from ..MarketBu.ABuMarket import split_k_market
+from ..MarketBu.ABuMarket import split_k_task
 from ..TradeBu import ABuTradeExecute
 from ..TradeBu.ABuKLManager import AbuKLManager
+from ..TradeBu import ABuKLArena
 from ..CoreBu.ABuParallel import delayed, Parallel
 
 __author__ = '阿布'
 __weixin__ = 'abu_quant'
 
+"""
+    多进程择时时是否使用共享内存传递金融时间序列，默认关闭，如需开启使用下面代码：
+    abupy.alpha.pick_time_master.g_shared_kl_arena = True
+    开启后主进程将择时金融时间序列及基准一次性写入共享内存，子进程通过零拷贝视图构建金融时间序列，
+    不再每个进程序列化拷贝完整的kl_pd_manager，需要python3.8以上multiprocessing.shared_memory支持
+"""
+g_shared_kl_arena = False
+
 
 class AbuPickTimeMaster(object):
     """择时并行多任务调度类"""
@@ -32,7 +41,7 @@ class AbuPickTimeMaster(object):
                                              n_process_kl=ABuEnv.g_cpu_cnt * 2 if ABuEnv.g_is_mac_os
                                              else ABuEnv.g_cpu_cnt,
                                              n_process_pick_time=ABuEnv.g_cpu_cnt,
-                                             show_progress=True):
+                                             show_progress=True, resume=None):
         """
         将多个交易对象拆解为多份交易对象序列，多任务并行完成择时工作
         :param target_symbols: 多个择时交易对象序列
@@ -44,6 +53,7 @@ class AbuPickTimeMaster(object):
         :param n_process_kl: 控制金融时间序列管理对象内部启动n_process_kl进程获取金融序列数据
         :param n_process_pick_time: 控制择时操作并行任务数量
         :param show_progress: 显示进度条，透传do_symbols_with_same_factors，默认True
+        :param resume: 增量择时断点管理对象，AbuPickTimeResume实例对象，透传do_symbols_with_same_factors，默认None
         """
 
         if kl_pd_manager is None:
@@ -55,11 +65,8 @@ class AbuPickTimeMaster(object):
             # 因为下面要根据n_process_pick_time来split_k_market
             n_process_pick_time = ABuEnv.g_cpu_cnt
 
-        # 将target_symbols切割为n_process_pick_time个子序列，这样可以每个进程处理一个子序列
-        process_symbols = split_k_market(n_process_pick_time, market_symbols=target_symbols)
-
-        # 因为切割会有余数，所以将原始设置的进程数切换为分割好的个数, 即32 -> 33 16 -> 17
-        n_process_pick_time = len(process_symbols)
+        # 将target_symbols切割为子序列任务，默认n_process_pick_time个子序列，这样可以每个进程处理一个子序列
+        n_process_pick_time, process_symbols = split_k_task(n_process_pick_time, target_symbols)
 
         parallel = Parallel(
             n_jobs=n_process_pick_time, verbose=0, pre_dispatch='2*n_jobs')
@@ -70,25 +77,36 @@ class AbuPickTimeMaster(object):
             # 因为上面已经并行或者单进程进行数据采集kl_pd_manager，之后的并行，为确保hdf5不会多进程读写设置LOCAL
             ABuEnv.g_data_fetch_mode == EMarketDataFetchMode.E_DATA_FETCH_FORCE_LOCAL
 
+        p_kl_pd_manager, p_benchmark = kl_pd_manager, benchmark
+        if g_shared_kl_arena and ABuKLArena.g_shared_memory_enable and n_process_pick_time > 1:
+            # 共享内存模式下传递给子进程的kl_pd_manager及benchmark只序列化共享内存描述信息
+            p_kl_pd_manager = kl_pd_manager.make_shared_manager()
+            p_benchmark = p_kl_pd_manager.benchmark
         # do_symbols_with_same_factors被装饰器add_process_env_sig装饰，需要进程间内存拷贝对象AbuEnvProcess
         p_nev = AbuEnvProcess()
-        # 每个并行的进程通过do_symbols_with_same_factors及自己独立的子序列独立工作，注意kl_pd_manager装载了所有需要的数据
-        out = parallel(delayed(do_symbols_with_same_factors)(choice_symbols, benchmark, buy_factors, sell_factors,
-                                                             capital, apply_capital=False,
-                                                             kl_pd_manager=kl_pd_manager, env=p_nev,
-                                                             show_progress=show_progress)
-                       for choice_symbols in process_symbols)
+        try:
+            # 每个并行的进程通过do_symbols_with_same_factors及自己独立的子序列独立工作，注意kl_pd_manager装载了所有需要的数据
+            out = parallel(delayed(do_symbols_with_same_factors)(choice_symbols, p_benchmark,
+                                                                 buy_factors, sell_factors,
+                                                                 capital, apply_capital=False,
+                                                                 kl_pd_manager=p_kl_pd_manager, env=p_nev,
+                                                                 show_progress=show_progress, resume=resume)
+                           for choice_symbols in process_symbols)
+        finally:
+            if p_kl_pd_manager is not kl_pd_manager:
+                # 所有子进程结束后释放共享内存
+                p_kl_pd_manager.kl_arena.close()
         # 择时并行结束后恢复之前的数据获取模式
         ABuEnv.g_data_fetch_mode = tmp_fetch_mode
-        orders_pd = None
-        action_pd = None
+        accumulator = AbuResultAccumulator()
         all_fit_symbols_cnt = 0
         for sub_out in out:
-            # 将每个子序列进程的处理结果进行合并
+            # 将每个子序列进程的处理结果添加到累加器，最后一次性合并
             sub_orders_pd, sub_action_pd, sub_all_fit_symbols_cnt = sub_out
-            orders_pd = sub_orders_pd if orders_pd is None else pd.concat([orders_pd, sub_orders_pd])
-            action_pd = sub_action_pd if action_pd is None else pd.concat([action_pd, sub_action_pd])
+            if sub_orders_pd is not None and sub_action_pd is not None:
+                accumulator.append(sub_orders_pd, sub_action_pd)
             all_fit_symbols_cnt += sub_all_fit_symbols_cnt
+        orders_pd, action_pd = accumulator.result()
 
         if orders_pd is not None and action_pd is not None:
             # 将合并后的结果按照时间及行为进行排序
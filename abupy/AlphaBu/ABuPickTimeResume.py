@@ -0,0 +1,160 @@
+# -*- encoding:utf-8 -*-
+"""
+    增量择时模块，择时结束后将每一个交易对象的择时worker在断点交易日之前的状态，即因子状态，
+    订单序列等序列化保存，下一次回测时只需要从断点继续驱动新增的交易日，结果与完整回测一致
+
+    eg:
+        from abupy import AbuPickTimeResume
+        # 第一次回测，注意需要固定回测开始时间start，否则每天的回测开始时间变化后断点失效，将回退为完整择时
+        resume = AbuPickTimeResume()
+        abu_result_tuple, _ = abu.run_loop_back(read_cash, buy_factors, sell_factors, start='2016-01-01',
+                                                choice_symbols=choice_symbols, resume=resume)
+        abu.store_abu_result_tuple(abu_result_tuple, n_folds=2, resume=resume)
+
+        # 之后数据更新后的增量回测
+        resume = abu.load_abu_resume(n_folds=2)
+        abu_result_tuple, _ = abu.run_loop_back(read_cash, buy_factors, sell_factors, start='2016-01-01',
+                                                choice_symbols=choice_symbols, resume=resume)
+        abu.store_abu_result_tuple(abu_result_tuple, n_folds=2, resume=resume)
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import hashlib
+import io
+import os
+import uuid
+
+from ..CoreBu import ABuEnv
+from ..CoreBu.ABuFixes import pickle
+from ..MarketBu import ABuSymbolPd
+from ..UtilBu import ABuFileUtil
+
+__author__ = '阿布'
+__weixin__ = 'abu_quant'
+
+"""
+    断点距离最后一个交易日的交易日数量，回测中因子忽略最后一个交易日，且月任务标记需要下一个交易日，
+    所以断点设置在最后一个交易日之前，增量择时从最后一个交易日重新开始驱动
+"""
+K_RESUME_OVERLAP = 1
+
+"""
+    择时worker中不进行序列化的对象，增量择时从断点恢复时替换为本次回测的对象，
+    即所有因子中引用的kl_pd，combine_kl_pd，benchmark，capital都指向本次回测的新对象
+"""
+K_RESUME_REFS = ('kl_pd', 'combine_kl_pd', 'benchmark', 'capital')
+
+
+def dumps_worker(worker):
+    """
+    序列化择时worker，worker中引用的K_RESUME_REFS对象只序列化名称
+    :param worker: AbuPickTimeWorker实例对象
+    :return: bytes
+    """
+    refs = {id(getattr(worker, ref)): ref for ref in K_RESUME_REFS}
+    buf = io.BytesIO()
+    pickler = pickle.Pickler(buf, pickle.HIGHEST_PROTOCOL)
+    pickler.persistent_id = lambda obj: refs.get(id(obj))
+    pickler.dump(worker)
+    return buf.getvalue()
+
+
+def loads_worker(worker_bytes, **refs):
+    """
+    反序列化择时worker，K_RESUME_REFS对象使用refs中的新对象替换
+    :param worker_bytes: dumps_worker序列化的bytes
+    :param refs: K_RESUME_REFS中每一个名称对应的新对象
+    :return: AbuPickTimeWorker实例对象
+    """
+    unpickler = pickle.Unpickler(io.BytesIO(worker_bytes))
+    unpickler.persistent_load = lambda pid: refs[pid]
+    return unpickler.load()
+
+
+def factors_sign(buy_factors, sell_factors):
+    """买入因子序列和卖出因子序列的签名，因子及参数变化后断点失效"""
+    return hashlib.md5(repr((buy_factors, sell_factors)).encode('utf-8')).hexdigest()
+
+
+class AbuPickTimeResume(object):
+    """增量择时断点管理类，以文件夹为单位，每一个交易对象一个断点文件，多进程中各自独立读写"""
+
+    def __init__(self, resume_dir=None):
+        """
+        :param resume_dir: 断点文件夹路径，默认None，即在g_project_cache_dir下生成一个新的文件夹
+        """
+        if resume_dir is None:
+            resume_dir = os.path.join(ABuEnv.g_project_cache_dir, 'pick_time_resume', uuid.uuid4().hex)
+        self.resume_dir = resume_dir
+
+    def __str__(self):
+        """打印对象显示：断点文件夹路径，断点数量"""
+        return 'resume_dir:{}, resume symbols:{}'.format(self.resume_dir, len(self))
+
+    __repr__ = __str__
+
+    def __len__(self):
+        """对象长度：断点文件数量"""
+        if not os.path.exists(self.resume_dir):
+            return 0
+        return len([fn for fn in os.listdir(self.resume_dir) if fn.endswith('.pkl')])
+
+    def _state_path(self, symbol):
+        """交易对象对应的断点文件路径"""
+        return os.path.join(self.resume_dir, '{}.pkl'.format(symbol))
+
+    def load_worker(self, capital, kl_pd, benchmark, buy_factors, sell_factors):
+        """
+        从断点恢复择时worker，并设置worker从断点交易日开始继续驱动
+        :param capital: 本次回测的AbuCapital实例对象
+        :param kl_pd: 本次回测的金融时间序列
+        :param benchmark: 本次回测的AbuBenchmark实例对象
+        :param buy_factors: 本次回测的买入因子序列
+        :param sell_factors: 本次回测的卖出因子序列
+        :return: 恢复的AbuPickTimeWorker实例对象，断点不存在或者失效返回None
+        """
+        state_path = self._state_path(kl_pd.name)
+        if not ABuFileUtil.file_exist(state_path):
+            return None
+        with open(state_path, 'rb') as state_file:
+            state = pickle.load(state_file)
+
+        resume_ind = state['resume_ind']
+        if state['factors_sign'] != factors_sign(buy_factors, sell_factors):
+            # 因子或者因子参数变化
+            return None
+        if resume_ind >= kl_pd.shape[0] or kl_pd['date'].values[0] != state['start_date'] \
+                or kl_pd['date'].values[resume_ind] != state['resume_date']:
+            # 回测开始时间变化，或者断点前的数据发生变化（如复权），断点失效
+            return None
+
+        combine_kl_pd = ABuSymbolPd.combine_pre_kl_pd(kl_pd, n_folds=1)
+        worker = loads_worker(state['worker'], kl_pd=kl_pd, combine_kl_pd=combine_kl_pd, benchmark=benchmark,
+                              capital=capital)
+        worker.resume_ind = resume_ind
+        return worker
+
+    def dump_worker(self, worker, buy_factors, sell_factors):
+        """
+        保存择时worker择时过程中生成的断点
+        :param worker: 已经完成fit的AbuPickTimeWorker实例对象
+        :param buy_factors: 本次回测的买入因子序列
+        :param sell_factors: 本次回测的卖出因子序列
+        """
+        if worker.checkpoint is None:
+            return
+        resume_ind, worker_bytes = worker.checkpoint
+        kl_date = worker.kl_pd['date'].values
+        state = {'start_date': kl_date[0], 'resume_ind': resume_ind, 'resume_date': kl_date[resume_ind],
+                 'factors_sign': factors_sign(buy_factors, sell_factors), 'worker': worker_bytes}
+
+        state_path = self._state_path(worker.kl_pd.name)
+        ABuFileUtil.ensure_dir(state_path)
+        # 先写临时文件再替换，避免中断后留下不完整的断点文件
+        tmp_path = '{}.{}.tmp'.format(state_path, os.getpid())
+        with open(tmp_path, 'wb') as state_file:
+            pickle.dump(state, state_file, pickle.HIGHEST_PROTOCOL)
+        getattr(os, 'replace', os.rename)(tmp_path, state_path)
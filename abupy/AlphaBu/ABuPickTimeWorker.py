@@ -9,13 +9,16 @@ from __future__ import division
 from __future__ import print_function
 
 import copy
+from contextlib import contextmanager
 
 import numpy as np
 
 from ..MarketBu import ABuSymbolPd
 from ..FactorBuyBu.ABuFactorBuyBase import AbuFactorBuyBase
 from ..FactorSellBu.ABuFactorSellBase import AbuFactorSellBase
+from ..TradeBu import ABuPickTimeMemo
 from .ABuPickBase import AbuPickTimeWorkBase
+from . import ABuPickTimeResume
 # noinspection PyUnresolvedReferences
 from ..CoreBu.ABuFixes import filter
 from ..UtilBu.ABuProgress import AbuMulPidProgress
@@ -29,6 +32,28 @@ __weixin__ = 'abu_quant'
 """
 g_natural_long_task = True
 
+"""
+    是否开启向量化择时模式，默认关闭，如需开启使用下面代码：
+    abupy.alpha.pick_time_worker.g_vectorized_task = True
+    开启后实现了fit_signals的买入因子一次性计算全部买入信号，择时只遍历有买入信号或者
+    有持仓订单的交易日，没有实现fit_signals的买入因子仍然每个交易日执行fit_day，
+    存在周任务，月任务因子或者买入因子专属选股因子时自动回退到逐日驱动的择时方式，
+    grid search中由ABuGridSearch.g_grid_vectorized_task控制，见vectorized_task
+"""
+g_vectorized_task = False
+
+
+@contextmanager
+def vectorized_task(enable=True):
+    """临时设置g_vectorized_task的上下文，退出时还原之前的设置"""
+    global g_vectorized_task
+    prev = g_vectorized_task
+    g_vectorized_task = enable
+    try:
+        yield
+    finally:
+        g_vectorized_task = prev
+
 
 # noinspection PyAttributeOutsideInit
 class AbuPickTimeWorker(AbuPickTimeWorkBase):
@@ -46,7 +71,9 @@ class AbuPickTimeWorker(AbuPickTimeWorkBase):
         # 回测阶段kl
         self.kl_pd = kl_pd
         # 合并加上回测之前1年的数据，为了生成特征数据
-        self.combine_kl_pd = ABuSymbolPd.combine_pre_kl_pd(self.kl_pd, n_folds=1)
+        memo = ABuPickTimeMemo.active_memo()
+        self.combine_kl_pd = ABuSymbolPd.combine_pre_kl_pd(self.kl_pd, n_folds=1) if memo is None else \
+            memo.combine_kl_pd(self.kl_pd, lambda: ABuSymbolPd.combine_pre_kl_pd(self.kl_pd, n_folds=1))
         # 如特别在乎效率性能，打开下面注释的方式，只在g_enable_ml_feature模式下开启, 注释上一行
         # self.combine_kl_pd = ABuSymbolPd.combine_pre_kl_pd(self.kl_pd,
         #                                                    n_folds=1) if ABuEnv.g_enable_ml_feature else None
@@ -62,6 +89,14 @@ class AbuPickTimeWorker(AbuPickTimeWorkBase):
         self.orders = list()
         # 择时进度条，默认空, 即不打开，不显示择时进度
         self.task_pg = None
+        # 向量化择时模式下通过fit_signals计算了买入信号的买入因子序列，默认空，即全部使用fit_day
+        self.signal_buy_factors = list()
+        # 择时开始的交易日序号，增量择时从断点恢复时为断点交易日序号
+        self.resume_ind = 0
+        # 需要生成增量择时断点的交易日序号，默认None，即不生成断点，由enable_checkpoint设置
+        self.checkpoint_ind = None
+        # 增量择时断点：(断点交易日序号, 择时到断点交易日之前的worker序列化数据)
+        self.checkpoint = None
 
     def __str__(self):
         """打印对象显示：买入因子列表＋卖出因子列表"""
@@ -76,6 +111,30 @@ class AbuPickTimeWorker(AbuPickTimeWorkBase):
             self.task_pg.init_ui_progress()
             self.task_pg.display_step = 42
 
+    def enable_checkpoint(self):
+        """开启增量择时断点，断点设置在最后K_RESUME_OVERLAP个交易日之前"""
+        self.checkpoint_ind = max(self.kl_pd.shape[0] - 1 - ABuPickTimeResume.K_RESUME_OVERLAP, self.resume_ind, 0)
+        self.checkpoint = None
+
+    def _make_checkpoint(self, today_ind):
+        """
+        在驱动today_ind交易日之前检测是否需要生成增量择时断点，即序列化择时到断点交易日之前的状态
+        :param today_ind: 即将驱动的交易日序号，None代表择时已经结束
+        """
+        if self.checkpoint_ind is None or self.checkpoint is not None:
+            return
+        if today_ind is not None and today_ind < self.checkpoint_ind:
+            return
+        # 向量化择时中跳过的交易日，断点交易日之后才会被驱动，所以断点交易日即为恢复时开始驱动的交易日
+        checkpoint_ind = self.checkpoint_ind if today_ind is None else today_ind
+        for buy_factor in self.signal_buy_factors:
+            # 向量化择时中没有被驱动的交易日延迟消耗的skip_days在断点前结算
+            buy_factor.walk_fit_signals(checkpoint_ind)
+        # 进度条不需要序列化
+        task_pg, self.task_pg = self.task_pg, None
+        self.checkpoint = (checkpoint_ind, ABuPickTimeResume.dumps_worker(self))
+        self.task_pg = task_pg
+
     def _week_task(self, today):
         """
         周任务：使用self.week_buy_factors，self.week_sell_factors进行迭代
@@ -136,7 +195,11 @@ class AbuPickTimeWorker(AbuPickTimeWorkBase):
             # 如果择时买入因子没有被封锁执行任务
             if not buy_factor.lock_factor:
                 # 迭代买入因子，每个因子都对今天进行择时，如果生成order加入self.orders
-                order = buy_factor.read_fit_day(today)
+                if buy_factor in self.signal_buy_factors:
+                    # 向量化择时模式下通过预先计算的买入信号决定是否执行fit_day
+                    order = buy_factor.read_fit_signals(today)
+                else:
+                    order = buy_factor.read_fit_day(today)
                 if order and order.order_deal:
                     self.orders.append(order)
 
@@ -183,10 +246,8 @@ class AbuPickTimeWorker(AbuPickTimeWorkBase):
             self.task_pg.show()
 
         day_cnt = today.key
-        # 判断是否执行周任务, 返回结果赋予today对象
-        today.exec_week = today.week_task == 1 if g_natural_long_task else day_cnt % 5 == 0
-        # 判断是否执行月任务, 返回结果赋予today对象
-        today.exec_month = today.month_task == 1 if g_natural_long_task else day_cnt % 20 == 0
+        self._make_checkpoint(int(day_cnt))
+        self._mark_long_task(today)
 
         if day_cnt == 0 and not today.exec_week:
             # 如果是择时第一天，且没有执行周任务，需要初始化买入因子专属周任务选股池子
@@ -204,6 +265,76 @@ class AbuPickTimeWorker(AbuPickTimeWorkBase):
         # 执行择时因子日任务
         self._day_task(today)
 
+    # noinspection PyMethodMayBeStatic
+    def _mark_long_task(self, today):
+        """判断今天是否执行周任务，月任务，结果赋予today对象，日任务因子如AbuWeekMonthBuy也会读取这两个属性"""
+        day_cnt = today.key
+        # 判断是否执行周任务, 返回结果赋予today对象
+        today.exec_week = today.week_task == 1 if g_natural_long_task else day_cnt % 5 == 0
+        # 判断是否执行月任务, 返回结果赋予today对象
+        today.exec_month = today.month_task == 1 if g_natural_long_task else day_cnt % 20 == 0
+
+    def _enable_signal_task(self):
+        """
+        判断是否可以进行向量化择时：周任务，月任务以及买入因子专属选股因子需要逐日驱动，
+        存在任何一个即不能跳过交易日，只能回退到逐日驱动的择时方式
+        """
+        if len(self.week_buy_factors) > 0 or len(self.month_buy_factors) > 0 or len(
+                self.week_sell_factors) > 0 or len(self.month_sell_factors) > 0:
+            return False
+
+        for buy_factor in self.buy_factors:
+            if len(buy_factor.ps_week) > 0 or len(buy_factor.ps_month) > 0:
+                return False
+            if len(list(filter(lambda sell_factor: hasattr(sell_factor, 'fit_week') or hasattr(
+                    sell_factor, 'fit_month'), buy_factor.sell_factors))) > 0:
+                return False
+        return True
+
+    def _signal_task_loop(self):
+        """
+        向量化择时：实现了fit_signals的买入因子一次性计算全部买入信号，如果所有买入因子都
+        实现了fit_signals，只需要遍历有买入信号的交易日，以及存在持仓订单时的每一个交易日，
+        否则仍然需要遍历所有交易日，但实现了fit_signals的买入因子只在信号日执行fit_day
+        """
+        self.signal_buy_factors = list(filter(lambda buy_factor: hasattr(buy_factor, 'fit_signals'),
+                                              self.buy_factors))
+        for buy_factor in self.signal_buy_factors:
+            buy_factor.init_fit_signals(walk_ind=self.resume_ind - 1)
+
+        kl_cnt = self.kl_pd.shape[0]
+        if len(self.signal_buy_factors) < len(self.buy_factors):
+            # 存在没有实现fit_signals的买入因子，每一个交易日都需要驱动
+            signal_inds = np.arange(0, kl_cnt)
+        elif len(self.buy_factors) == 0:
+            signal_inds = np.array([], dtype=int)
+        else:
+            # 所有买入因子的信号合并，任何一个因子有信号的交易日都需要驱动
+            signal_inds = np.flatnonzero(np.logical_or.reduce(
+                [buy_factor.signal_array for buy_factor in self.signal_buy_factors]))
+
+        today_ind = self.resume_ind
+        while today_ind < kl_cnt:
+            if not self._has_keep_orders():
+                # 没有持仓订单的情况下直接跳到下一个有买入信号的交易日
+                signal_pos = np.searchsorted(signal_inds, today_ind)
+                if signal_pos >= len(signal_inds):
+                    break
+                today_ind = signal_inds[signal_pos]
+
+            if self.task_pg is not None:
+                self.task_pg.show(today_ind + 1)
+            self._make_checkpoint(today_ind)
+            today = self.kl_pd.iloc[today_ind]
+            # 跳过交易日不影响exec_week，exec_month，它们只由当天的数据决定
+            self._mark_long_task(today)
+            self._day_task(today)
+            today_ind += 1
+
+    def _has_keep_orders(self):
+        """是否存在还没有卖出的持仓订单，存在持仓订单的交易日卖出因子必须逐日驱动"""
+        return any(order.sell_type == 'keep' for order in self.orders)
+
     # noinspection PyTypeChecker
     def fit(self, *args, **kwargs):
         """
@@ -238,8 +369,17 @@ class AbuPickTimeWorker(AbuPickTimeWorkBase):
                 >>>>
             """
             self.kl_pd['month_task'] = np.where(self.kl_pd.shift(-1)['date'] - self.kl_pd['date'] > 60, 1, 0)
-        # 通过pandas apply进行交易日递进择时
-        self.kl_pd.apply(self._task_loop, axis=1)
+        if g_vectorized_task and self._enable_signal_task():
+            # 向量化择时模式，只遍历有买入信号或者有持仓订单的交易日
+            self._signal_task_loop()
+        else:
+            # 从向量化择时生成的断点恢复时，需要清除断点中的向量化买入因子序列
+            self.signal_buy_factors = list()
+            # 通过pandas apply进行交易日递进择时，增量择时从断点交易日开始
+            kl_pd = self.kl_pd if self.resume_ind == 0 else self.kl_pd.iloc[self.resume_ind:]
+            kl_pd.apply(self._task_loop, axis=1)
+        # 断点交易日之后没有任何交易日被驱动的情况下，择时结束时的状态即为断点
+        self._make_checkpoint(None)
 
         if self.task_pg is not None:
             self.task_pg.close_ui_progress()
@@ -7,6 +7,7 @@ from .ABuPickStockWorker import AbuPickStockWorker
 
 from .ABuPickTimeWorker import AbuPickTimeWorker
 from .ABuPickTimeMaster import AbuPickTimeMaster
+from .ABuPickTimeResume import AbuPickTimeResume
 
 from . import ABuPickStockExecute
 from . import ABuPickTimeExecute
@@ -20,6 +21,7 @@ __all__ = [
     'AbuPickStockWorker',
     'AbuPickTimeWorker',
     'AbuPickTimeMaster',
+    'AbuPickTimeResume',
 
     'ABuPickStockExecute',
     'ABuPickTimeExecute',
@@ -29,7 +29,8 @@ def run_loop_back(read_cash, buy_factors, sell_factors, stock_picks=None, choice
                   end=None,
                   commission_dict=None,
                   n_process_kl=None,
-                  n_process_pick=None):
+                  n_process_pick=None,
+                  resume=None):
     """
     封装执行择时，选股回测。
 
@@ -73,6 +74,8 @@ def run_loop_back(read_cash, buy_factors, sell_factors, stock_picks=None, choice
 
     :param n_process_kl: 金融时间序列数据收集启动并行的进程数，默认None, 内部根据cpu数量分配
     :param n_process_pick: 择时与选股操作启动并行的进程数，默认None, 内部根据cpu数量分配
+    :param resume: 增量择时断点管理对象，AbuPickTimeResume实例对象，默认None，即不进行增量择时，
+                   传入后有效断点的交易对象只从断点继续择时，择时结束后更新断点，详见ABuPickTimeResume
     :return: (AbuResultTuple对象, AbuKLManager对象)
     """
     if start is not None and end is not None and ABuDateUtil.date_str_to_int(end) - ABuDateUtil.date_str_to_int(
@@ -123,7 +126,7 @@ def run_loop_back(read_cash, buy_factors, sell_factors, stock_picks=None, choice
     orders_pd, action_pd, all_fit_symbols_cnt = AbuPickTimeMaster.do_symbols_with_same_factors_process(
         choice_symbols, benchmark,
         buy_factors, sell_factors, capital, kl_pd_manager=kl_pd_manager, n_process_kl=n_process_kl,
-        n_process_pick_time=n_process_pick)
+        n_process_pick_time=n_process_pick, resume=resume)
 
     # 都完事时检测一下还有没有ui进度条
     ABuProgress.do_check_process_is_dead()
@@ -160,7 +163,8 @@ def run_kl_update(n_folds=2, start=None, end=None, market=None, n_jobs=16, how='
     :param end: 请求的结束日期 str对象 eg: '2016-07-26'
     :param market: 需要查询的市场，eg：EMarketTargetType.E_MARKET_TARGET_US
     :param n_jobs: 并行的任务数，对于进程代表进程数，线程代表线程数
-    :param how: process：多进程，thread：多线程，main：单进程单线程
+    :param how: process：多进程，thread：多线程，main：单进程单线程，async：异步网络请求，对数据源的并发数量
+                及请求频率限制见ABuDataFeedAsync
     """
 
     pre_market = None
@@ -183,7 +187,7 @@ def run_kl_update(n_folds=2, start=None, end=None, market=None, n_jobs=16, how='
 
 
 def store_abu_result_tuple(abu_result_tuple, n_folds=None, store_type=EStoreAbu.E_STORE_NORMAL,
-                           custom_name=None):
+                           custom_name=None, resume=None):
     """
     保存abu.run_loop_back的回测结果AbuResultTuple对象，根据n_folds，store_type参数
     来定义存储的文件名称，透传参数使用ABuStore.store_abu_result_tuple执行操作
@@ -192,8 +196,10 @@ def store_abu_result_tuple(abu_result_tuple, n_folds=None, store_type=EStoreAbu.
     :param n_folds: 回测执行了几年，只影响存贮文件名
     :param store_type: 回测保存类型EStoreAbu类型，只影响存贮文件名
     :param custom_name: 如果store_type=EStoreAbu.E_STORE_CUSTOM_NAME时需要的自定义文件名称
+    :param resume: 回测使用的增量择时断点管理对象AbuPickTimeResume，默认None，即不保存断点
     """
-    ABuStore.store_abu_result_tuple(abu_result_tuple, n_folds, store_type=store_type, custom_name=custom_name)
+    ABuStore.store_abu_result_tuple(abu_result_tuple, n_folds, store_type=store_type, custom_name=custom_name,
+                                    resume=resume)
 
 
 def load_abu_result_tuple(n_folds=None, store_type=EStoreAbu.E_STORE_NORMAL, custom_name=None):
@@ -210,6 +216,18 @@ def load_abu_result_tuple(n_folds=None, store_type=EStoreAbu.E_STORE_NORMAL, cus
     return ABuStore.load_abu_result_tuple(n_folds, store_type, custom_name=custom_name)
 
 
+def load_abu_resume(n_folds=None, store_type=EStoreAbu.E_STORE_NORMAL, custom_name=None):
+    """
+    读取使用store_abu_result_tuple保存的增量择时断点，透传参数使用ABuStore.load_abu_resume执行操作
+
+    :param n_folds: 回测执行了几年，只影响读取的文件名
+    :param store_type: 回测保存类型EStoreAbu类型，只影响读取的文件名
+    :param custom_name: 如果store_type=EStoreAbu.E_STORE_CUSTOM_NAME时需要的自定义文件名称
+    :return: AbuPickTimeResume对象
+    """
+    return ABuStore.load_abu_resume(n_folds, store_type, custom_name=custom_name)
+
+
 # noinspection PyUnusedLocal
 def gen_buy_from_chinese(*args, **kwargs):
     """
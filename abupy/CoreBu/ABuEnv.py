@@ -423,6 +423,8 @@ class EDataCacheType(Enum):
     E_DATA_CACHE_CSV = 1
     """适合分布式扩展，存贮空间需要大"""
     E_DATA_CACHE_MONGODB = 2
+    """列式存储，所有symbol共享列文件，读取时内存映射，索引查询及读取最快，适合全市场回测"""
+    E_DATA_CACHE_COLUMNAR = 3
 
 
 # """默认金融时间序列数据缓存类型为HDF5，单机固态硬盘推荐HDF5，非固态硬盘使用CSV，否则量大后hdf5写入速度无法接受"""
@@ -433,6 +435,9 @@ g_data_cache_type = EDataCacheType.E_DATA_CACHE_CSV
 """csv模式下的存储路径"""
 g_project_kl_df_data_csv = path.join(g_project_data_dir, 'csv')
 
+"""列式存储模式下的存储路径"""
+g_project_kl_df_data_columnar = path.join(g_project_data_dir, 'columnar')
+
 # ＊＊＊＊＊＊＊＊＊＊＊＊＊＊＊＊＊＊＊＊ 数据源 end   ＊＊＊＊＊＊＊＊＊＊＊＊＊＊＊＊
 
 # ＊＊＊＊＊＊＊＊＊＊＊＊＊＊＊＊＊＊＊＊＊＊＊特征快照切割 start ＊＊＊＊＊＊＊＊＊＊＊＊＊＊＊＊＊＊＊＊＊＊＊＊＊＊＊＊＊
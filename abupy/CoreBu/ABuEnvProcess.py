@@ -16,6 +16,15 @@ from ..CoreBu.ABuFixes import signature, Parameter
 __author__ = '阿布'
 __weixin__ = 'abu_quant'
 
+# 只在主进程中使用的设置，不拷贝到子进程，如进度回调函数需要在主进程中汇总子进程进度，子进程中不应该继续回调
+K_MAIN_PROCESS_ONLY_SIG = frozenset(['g_progress_hook'])
+
+
+def _process_env_sig(module):
+    """筛选模块中以g_或者_g_开头的, 且不能callable，即不是方法，且不是只在主进程中使用的属性"""
+    return [sig for sig in dir(module) if not callable(sig) and (sig.startswith('g_') or sig.startswith('_g_'))
+            and sig not in K_MAIN_PROCESS_ONLY_SIG]
+
 
 def add_process_env_sig(func):
     """
@@ -65,8 +74,7 @@ class AbuEnvProcess(object):
         """迭代注册了的需要拷贝内存设置的模块，通过筛选模块中以g_或者_g_开头的属性，将这些属性拷贝为类属性变量"""
         for module in self.register_module():
             # 迭代注册了的需要拷贝内存设置的模块, 筛选模块中以g_或者_g_开头的, 且不能callable，即不是方法
-            sig_env = list(filter(
-                lambda _sig: not callable(_sig) and (_sig.startswith('g_') or _sig.startswith('_g_')), dir(module)))
+            sig_env = _process_env_sig(module)
 
             module_name = module.__name__
             # map(lambda sig: setattr(self, '{}_{}'.format(module_name, sig), module.__dict__[sig]), sig_env)
@@ -103,8 +111,7 @@ class AbuEnvProcess(object):
         """为子进程拷贝主进程中的设置执行，在add_process_env_sig装饰器中调用，外部不应主动使用"""
         for module in self.register_module():
             # 迭代注册了的需要拷贝内存设置的模块, 筛选模块中以g_或者_g_开头的, 且不能callable，即不是方法
-            sig_env = list(filter(
-                lambda sig: not callable(sig) and (sig.startswith('g_') or sig.startswith('_g_')), dir(module)))
+            sig_env = _process_env_sig(module)
             module_name = module.__name__
             for _sig in sig_env:
                 # 格式化类变量中对应模块属性的key
@@ -120,8 +127,7 @@ class AbuEnvProcess(object):
 
         str_dict = dict()
         for module in self.register_module():
-            sig_env = list(filter(
-                lambda sig: not callable(sig) and (sig.startswith('g_') or sig.startswith('_g_')), dir(module)))
+            sig_env = _process_env_sig(module)
             module_name = module.__name__
             for _sig in sig_env:
                 # format对象属性的映射key值
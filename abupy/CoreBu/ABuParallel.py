@@ -11,13 +11,47 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
+import atexit
 import functools
+import logging
 
 from ..CoreBu import ABuEnv
 
 __author__ = '阿布'
 __weixin__ = 'abu_quant'
 
+"""
+    并行任务后端，默认'multiprocessing'，即每一次并行启动一个新的进程池，如需多次并行之间复用进程池使用下面代码：
+    abupy.CoreBu.ABuParallel.g_parallel_backend = 'persistent'
+    注意持久化进程池中的进程在第一次并行时创建，之后在主进程中新定义的类或者修改的代码需要shutdown_persistent_pool后才能生效
+"""
+g_parallel_backend = 'multiprocessing'
+
+"""
+    每一个进程任务块中的任务数量，默认1，即进程每次从任务队列中获取一个任务执行，可使用下面代码修改：
+    abupy.CoreBu.ABuParallel.g_task_chunk_size = 4
+"""
+g_task_chunk_size = 1
+
+"""
+    并行任务切分的细粒度系数，默认1，即任务序列切分为与进程数相同的份数，每个进程静态分配一份，
+    设置大于1后任务序列切分为进程数 * g_task_split_k份，空闲的进程动态从任务队列中获取任务，避免某一份慢任务拖累整体，
+    即eg：abupy.CoreBu.ABuParallel.g_task_split_k = 8，设置足够大即每一个symbol一个任务
+"""
+g_task_split_k = 1
+
+"""
+    进程池中每一个子进程启动时执行的初始化函数，默认None，用于在子进程中重建不能跨进程使用的资源，如数据库连接池，
+    需要是模块级别可被pickle的函数，eg：
+    abupy.CoreBu.ABuParallel.g_process_initializer = init_worker_process
+"""
+g_process_initializer = None
+
+# 持久化进程池以及持久化进程池的进程数量，创建进程池时使用的初始化函数
+_g_persistent_pool = None
+_g_persistent_pool_n_jobs = 0
+_g_persistent_pool_initializer = None
+
 # if ABuEnv.g_is_mac_os:
 if False:
     """
@@ -31,9 +65,9 @@ else:
     # windows需要使用ProcessPoolExecutor
     try:
         # noinspection PyCompatibility
-        from concurrent.futures import ProcessPoolExecutor
+        from concurrent.futures import ProcessPoolExecutor, as_completed
     except ImportError:
-        from ..ExtBu.futures import ProcessPoolExecutor
+        from ..ExtBu.futures import ProcessPoolExecutor, as_completed
 
 
     def delayed(function):
@@ -53,48 +87,117 @@ else:
         return delayed_function
 
 
+    def _run_chunk(chunk):
+        """
+        在子进程中顺序执行一个任务块中的所有任务
+        :param chunk: 任务块，序列中每一个元素是delayed.delayed_function保留的tuple
+        :return: 任务块中每一个任务的返回结果组成的list
+        """
+        return [jb[0](*jb[1], **jb[2]) for jb in chunk]
+
+
+    def _get_persistent_pool(n_jobs):
+        """获取持久化进程池，进程数量或者初始化函数不一致时关闭之前的进程池，重新创建"""
+        global _g_persistent_pool, _g_persistent_pool_n_jobs, _g_persistent_pool_initializer
+        if _g_persistent_pool is None or _g_persistent_pool_n_jobs != n_jobs \
+                or _g_persistent_pool_initializer is not g_process_initializer:
+            shutdown_persistent_pool()
+            _g_persistent_pool = _make_pool(n_jobs)
+            _g_persistent_pool_n_jobs = n_jobs
+            _g_persistent_pool_initializer = g_process_initializer
+        return _g_persistent_pool
+
+
+    def _make_pool(n_jobs):
+        """创建进程池，设置了g_process_initializer时每一个子进程启动时先执行初始化函数"""
+        if g_process_initializer is None:
+            return ProcessPoolExecutor(max_workers=n_jobs)
+        return ProcessPoolExecutor(max_workers=n_jobs, initializer=g_process_initializer)
+
+
+    def shutdown_persistent_pool():
+        """关闭持久化进程池，进程退出时自动调用，外部修改了进程池中需要使用的代码后也可主动调用"""
+        global _g_persistent_pool, _g_persistent_pool_n_jobs, _g_persistent_pool_initializer
+        if _g_persistent_pool is not None:
+            _g_persistent_pool.shutdown(wait=True)
+        _g_persistent_pool = None
+        _g_persistent_pool_n_jobs = 0
+        _g_persistent_pool_initializer = None
+
+
+    atexit.register(shutdown_persistent_pool)
+
+
     # noinspection PyUnusedLocal
     class Parallel(object):
-        """封装ProcessPoolExecutor进行并行任务执行操作"""
+        """封装ProcessPoolExecutor进行并行任务执行操作，结果按照任务提交顺序返回"""
 
-        def __init__(self, n_jobs=1, backend='multiprocessing', verbose=0,
+        def __init__(self, n_jobs=1, backend=None, verbose=0,
                      pre_dispatch='2 * n_jobs', batch_size='auto',
                      temp_folder=None, max_nbytes='1M', mmap_mode='r'):
             """
             :param n_jobs: 并行启动的进程数，任务数量
-            :param backend: 无意义，只是为了统一接口规范，与joblib.Parallel保持一样的参数
+            :param backend: 并行后端，None即使用g_parallel_backend设置，'multiprocessing'：每次并行启动新的进程池，
+                            'persistent'：复用持久化进程池
             :param verbose: 无意义，只是为了统一接口规范，与joblib.Parallel保持一样的参数
             :param pre_dispatch: 无意义，只是为了统一接口规范，与joblib.Parallel保持一样的参数
-            :param batch_size: 无意义，只是为了统一接口规范，与joblib.Parallel保持一样的参数
+            :param batch_size: 每一个进程任务块中的任务数量，'auto'即使用g_task_chunk_size设置
             :param temp_folder: 无意义，只是为了统一接口规范，与joblib.Parallel保持一样的参数
             :param max_nbytes: 无意义，只是为了统一接口规范，与joblib.Parallel保持一样的参数
             :param mmap_mode: 无意义，只是为了统一接口规范，与joblib.Parallel保持一样的参数
             """
             self.n_jobs = n_jobs
+            self.backend = g_parallel_backend if backend is None else backend
+            self.batch_size = g_task_chunk_size if batch_size == 'auto' else batch_size
 
         def __call__(self, iterable):
             """为与joblib并行保持一致，内部使用ProcessPoolExecutor开始工作"""
 
-            result = []
-
-            def when_done(r):
-                """ProcessPoolExecutor每一个进程结束后结果append到result中"""
-                result.append(r.result())
-
             if self.n_jobs <= 0:
                 # 主要为了适配 n_jobs = -1，joblib中启动cpu个数个进程并行执行
                 self.n_jobs = ABuEnv.g_cpu_cnt
 
             if self.n_jobs == 1:
                 # 如果只开一个进程，那么只在主进程(或当前运行的子进程)里运行，方便pdb debug且与joblib运行方式保持一致
-                for jb in iterable:
-                    result.append(jb[0](*jb[1], **jb[2]))
-            else:
-                with ProcessPoolExecutor(max_workers=self.n_jobs) as pool:
-                    for jb in iterable:
-                        # 这里iterable里每一个元素是delayed.delayed_function保留的tuple
-                        future_result = pool.submit(jb[0], *jb[1], **jb[2])
-                        future_result.add_done_callback(when_done)
+                return [jb[0](*jb[1], **jb[2]) for jb in iterable]
+
+            # 这里iterable里每一个元素是delayed.delayed_function保留的tuple，按照batch_size切分为任务块
+            jobs = list(iterable)
+            batch_size = max(int(self.batch_size), 1)
+            chunks = [jobs[ind:ind + batch_size] for ind in range(0, len(jobs), batch_size)]
+
+            if self.backend == 'persistent':
+                return self._ordered_results(_get_persistent_pool(self.n_jobs), chunks)
+
+            with _make_pool(self.n_jobs) as pool:
+                return self._ordered_results(pool, chunks)
+
+        @staticmethod
+        def _ordered_results(pool, chunks):
+            """
+            所有任务块一次性提交到进程池的任务队列中，空闲的进程动态从队列中获取任务块执行，
+            主进程中每完成一个任务块进行一次ABuProgress.g_progress_hook进度回调，最后按照任务提交顺序收集结果
+            """
+            # 局部引用，ABuProgress中引用本模块
+            from ..UtilBu import ABuProgress
+
+            futures = [pool.submit(_run_chunk, chunk) for chunk in chunks]
+            try:
+                for done_cnt, _ in enumerate(as_completed(futures)):
+                    # noinspection PyProtectedMember
+                    ABuProgress._call_progress_hook('parallel', (done_cnt + 1) / len(futures) * 100)
+            except BaseException:
+                # 进度回调抛出异常中断任务时，取消还没有开始执行的任务块，不等待它们执行完成
+                for future in futures:
+                    future.cancel()
+                raise
+            result = []
+            for future in futures:
+                try:
+                    result.extend(future.result())
+                except Exception as e:
+                    # 与之前add_done_callback的方式保持一致，某一个任务块失败只记录日志，不影响其它任务结果
+                    logging.exception(e)
             return result
 
 
@@ -2,7 +2,9 @@
 """针对交易回测结果存储，读取模块"""
 
 import os
-from collections import namedtuple
+import shutil
+import uuid
+from collections import namedtuple, OrderedDict
 from enum import Enum
 import datetime
 
@@ -12,6 +14,15 @@ import pandas as pd
 from ..CoreBu import ABuEnv
 from ..UtilBu import ABuFileUtil
 
+try:
+    # noinspection PyUnresolvedReferences
+    import pyarrow
+    """有pyarrow，分块落盘使用parquet列存储格式"""
+    g_spill_parquet = True
+except ImportError:
+    """没有pyarrow，分块落盘使用pickle格式"""
+    g_spill_parquet = False
+
 
 # noinspection PyClassHasNoInit
 class AbuResultTuple(namedtuple('AbuResultTuple',
@@ -37,6 +48,160 @@ class AbuResultTuple(namedtuple('AbuResultTuple',
             self.capital, self.benchmark)
 
 
+class AbuResultAccumulator(object):
+    """
+        择时结果orders_pd，action_pd累加器：每一个交易对象的择时结果只添加到序列中，
+        最后一次性连接，避免每一个交易对象都对不断增长的结果进行连接拷贝，
+        设置spill_cnt后每积累spill_cnt个结果就连接为一个分块写入磁盘，内存中只保留当前分块，
+        最后result时按照分块的行数，列类型预先分配最终结果的列，逐个读取分块填充，峰值内存为最终结果加一个分块
+    """
+
+    def __init__(self, spill_cnt=None):
+        """
+        :param spill_cnt: 分块落盘的结果数量阈值，默认None即所有结果都保留在内存中
+        """
+        self.spill_cnt = spill_cnt
+        self.orders_list = list()
+        self.action_list = list()
+        # 已经落盘的分块文件路径序列，序列中元素为(orders分块路径, action分块路径)
+        self.spill_paths = list()
+        # 与spill_paths一一对应的分块描述序列，序列中元素为(orders分块描述, action分块描述)，详_chunk_meta
+        self.spill_metas = list()
+        self.spill_dir = os.path.join(ABuEnv.g_project_cache_dir, 'spill',
+                                      '{}_{}'.format(os.getpid(), uuid.uuid4().hex))
+
+    def __len__(self):
+        """对象长度：已经添加的结果数量，包括已经落盘的分块"""
+        return len(self.orders_list) + len(self.spill_paths) * (self.spill_cnt if self.spill_cnt else 0)
+
+    def append(self, orders_pd, action_pd):
+        """
+        添加一个交易对象的择时结果
+        :param orders_pd: 交易订单构成的pd.DataFrame对象
+        :param action_pd: 交易行为构成的pd.DataFrame对象
+        """
+        self.orders_list.append(orders_pd)
+        self.action_list.append(action_pd)
+        if self.spill_cnt is not None and len(self.orders_list) >= self.spill_cnt:
+            self._spill()
+
+    def _spill(self):
+        """将内存中的结果连接为一个分块写入磁盘"""
+        chunk_ind = len(self.spill_paths)
+        orders_path = os.path.join(self.spill_dir, 'orders_{}'.format(chunk_ind))
+        action_path = os.path.join(self.spill_dir, 'action_{}'.format(chunk_ind))
+        ABuFileUtil.ensure_dir(orders_path)
+
+        orders_pd = pd.concat(self.orders_list)
+        action_pd = pd.concat(self.action_list)
+        self.spill_metas.append((self._chunk_meta(orders_pd), self._chunk_meta(action_pd)))
+        if g_spill_parquet:
+            if 'ml_features' in orders_pd.columns:
+                # 特征字典序列不能直接列存储，转换为str，AbuMlFeature.unzip_ml_feature支持str形式的特征
+                orders_pd['ml_features'] = orders_pd['ml_features'].map(
+                    lambda feature: None if feature is None else str(feature))
+            orders_pd.to_parquet(orders_path)
+            action_pd.to_parquet(action_path)
+        else:
+            ABuFileUtil.dump_pickle(orders_pd, orders_path)
+            ABuFileUtil.dump_pickle(action_pd, action_path)
+
+        self.spill_paths.append((orders_path, action_path))
+        self.orders_list = list()
+        self.action_list = list()
+
+    @staticmethod
+    def _chunk_meta(chunk_pd):
+        """分块描述：(行数, 列名->类型有序字典, 索引类型)，落盘读回后类型可能变化，以落盘前的为准"""
+        return chunk_pd.shape[0], OrderedDict(chunk_pd.dtypes.items()), chunk_pd.index.dtype
+
+    @staticmethod
+    def _merge_dtype(dtypes, missing):
+        """
+        多个分块中同一列的合并类型，与pd.concat一致：类型相同保持不变，数值类型提升，
+        有分块缺少这一列时需要填充nan，整数，bool提升为float64，其它情况使用object
+        """
+        if not all(isinstance(dtype, np.dtype) for dtype in dtypes):
+            return np.dtype(object)
+        if all(dtype.kind in 'biuf' for dtype in dtypes):
+            dtype = np.result_type(*dtypes)
+            if missing and dtype.kind in 'biu':
+                dtype = np.dtype('float64')
+            return dtype
+        if not missing and all(dtype == dtypes[0] for dtype in dtypes):
+            return dtypes[0]
+        return np.dtype(object)
+
+    @classmethod
+    def _merge_chunks(cls, metas, chunks):
+        """
+        将按照顺序迭代的分块合并为一个pd.DataFrame，根据分块描述预先分配每一列，每个分块读取后
+        直接填充到对应行，不同时持有所有分块
+        :param metas: 分块描述序列，详_chunk_meta
+        :param chunks: 与metas对应的分块迭代器
+        :return: 合并后的pd.DataFrame对象
+        """
+        total = sum(meta[0] for meta in metas)
+        columns = OrderedDict()
+        for _, dtypes, _ in metas:
+            for col in dtypes:
+                columns.setdefault(col, [])
+        for col in columns:
+            col_dtypes = [dtypes[col] for _, dtypes, _ in metas if col in dtypes]
+            missing = len(col_dtypes) < len(metas)
+            dtype = cls._merge_dtype(col_dtypes, missing)
+            columns[col] = np.full(total, np.nan, dtype=dtype) if missing else np.empty(total, dtype=dtype)
+        index = np.empty(total, dtype=cls._merge_dtype([meta[2] for meta in metas], False))
+
+        start = 0
+        for chunk_pd in chunks:
+            end = start + chunk_pd.shape[0]
+            index[start:end] = chunk_pd.index.to_numpy()
+            for col in chunk_pd.columns:
+                columns[col][start:end] = chunk_pd[col].to_numpy()
+            start = end
+        # copy=False不再合并为二维block，避免再拷贝一次最终结果
+        return pd.DataFrame(columns, index=pd.Index(index), copy=False)
+
+    @staticmethod
+    def _load_spill(spill_path):
+        """读取一个落盘的分块"""
+        return pd.read_parquet(spill_path) if g_spill_parquet else ABuFileUtil.load_pickle(spill_path)
+
+    def result(self):
+        """
+        连接所有结果，有落盘的分块时逐个读取分块填充到预先分配的结果中，连接后删除落盘文件
+        :return: (orders_pd, action_pd)，没有任何结果返回(None, None)
+        """
+        if len(self.spill_paths) == 0 and len(self.orders_list) == 0:
+            return None, None
+
+        if len(self.spill_paths) == 0:
+            # 没有落盘的分块，直接连接内存中的结果
+            orders_pd, action_pd = pd.concat(self.orders_list), pd.concat(self.action_list)
+            self.clear()
+            return orders_pd, action_pd
+
+        if len(self.orders_list) > 0:
+            # 内存中剩余的结果做为最后一个分块
+            self._spill()
+        orders_pd = self._merge_chunks([meta[0] for meta in self.spill_metas],
+                                       (self._load_spill(paths[0]) for paths in self.spill_paths))
+        action_pd = self._merge_chunks([meta[1] for meta in self.spill_metas],
+                                       (self._load_spill(paths[1]) for paths in self.spill_paths))
+        self.clear()
+        return orders_pd, action_pd
+
+    def clear(self):
+        """清空所有结果以及落盘文件"""
+        self.orders_list = list()
+        self.action_list = list()
+        self.spill_paths = list()
+        self.spill_metas = list()
+        if os.path.exists(self.spill_dir):
+            shutil.rmtree(self.spill_dir, ignore_errors=True)
+
+
 class EStoreAbu(Enum):
     """保存回测结果的enum类型"""
 
@@ -196,8 +361,14 @@ def _cache_abu_result_path(n_folds, store_type, custom_name):
     return orders_path, orders_key, action_path, action_key, capital_path, benchmark_path
 
 
+def _cache_abu_resume_path(n_folds, store_type, custom_name):
+    """由外部参数返回增量择时断点文件夹路径，eg: n2_test_resume"""
+    orders_path = _cache_abu_result_path(n_folds, store_type, custom_name)[0]
+    return orders_path[:-len('_orders_pd')] + '_resume'
+
+
 def store_abu_result_tuple(abu_result_tuple, n_folds=None, store_type=EStoreAbu.E_STORE_NORMAL,
-                           custom_name=None):
+                           custom_name=None, resume=None):
     """
     保存abu.run_loop_back的回测结果AbuResultTuple对象，根据n_folds，store_type参数
     来定义存储的文件名称
@@ -206,6 +377,7 @@ def store_abu_result_tuple(abu_result_tuple, n_folds=None, store_type=EStoreAbu.
     :param n_folds: 回测执行了几年，只影响存贮文件名
     :param store_type: 回测保存类型EStoreAbu类型，只影响存贮文件名
     :param custom_name: 如果store_type=EStoreAbu.E_STORE_CUSTOM_NAME时需要的自定义文件名称
+    :param resume: 回测使用的增量择时断点管理对象AbuPickTimeResume，默认None，即不保存断点
     """
     orders_path, orders_key, action_path, action_key, capital_path, benchmark_path = _cache_abu_result_path(
         n_folds, store_type, custom_name)
@@ -218,6 +390,13 @@ def store_abu_result_tuple(abu_result_tuple, n_folds=None, store_type=EStoreAbu.
     # abu_result_tuple.benchmark使用dump_pickle存储AbuBenchmark对象
     ABuFileUtil.dump_pickle(abu_result_tuple.benchmark, benchmark_path)
 
+    resume_path = _cache_abu_resume_path(n_folds, store_type, custom_name)
+    if resume is not None and os.path.abspath(resume.resume_dir) != os.path.abspath(resume_path):
+        # 增量择时断点文件夹整体拷贝，如果断点就是从resume_path读取的，回测中已经直接更新了断点，不需要拷贝
+        ABuFileUtil.del_file(resume_path)
+        if os.path.exists(resume.resume_dir):
+            shutil.copytree(resume.resume_dir, resume_path)
+
 
 def load_abu_result_tuple(n_folds=None, store_type=EStoreAbu.E_STORE_NORMAL, custom_name=None):
     """
@@ -245,6 +424,20 @@ def load_abu_result_tuple(n_folds=None, store_type=EStoreAbu.E_STORE_NORMAL, cus
     return AbuResultTuple(orders_pd, action_pd, capital, benchmark)
 
 
+def load_abu_resume(n_folds=None, store_type=EStoreAbu.E_STORE_NORMAL, custom_name=None):
+    """
+    读取使用store_abu_result_tuple保存的增量择时断点，断点文件夹不存在时返回的对象没有任何断点，
+    做为run_loop_back的resume参数进行增量回测，回测中将直接更新断点文件夹
+
+    :param n_folds: 回测执行了几年，只影响读取的文件名
+    :param store_type: 回测保存类型EStoreAbu类型，只影响读取的文件名
+    :param custom_name: 如果store_type=EStoreAbu.E_STORE_CUSTOM_NAME时需要的自定义文件名称
+    :return: AbuPickTimeResume对象
+    """
+    from ..AlphaBu.ABuPickTimeResume import AbuPickTimeResume
+    return AbuPickTimeResume(resume_dir=_cache_abu_resume_path(n_folds, store_type, custom_name))
+
+
 def delete_abu_result_tuple(n_folds=None, store_type=EStoreAbu.E_STORE_NORMAL, custom_name=None, del_index=False):
     """
     删除本地store_abu_result_tuple保存的回测结果，根据n_folds，store_type参数
@@ -265,6 +458,7 @@ def delete_abu_result_tuple(n_folds=None, store_type=EStoreAbu.E_STORE_NORMAL, c
     ABuFileUtil.del_file(action_path)
     ABuFileUtil.del_file(capital_path)
     ABuFileUtil.del_file(benchmark_path)
+    ABuFileUtil.del_file(_cache_abu_resume_path(n_folds, store_type, custom_name))
 
     if del_index:
         # 删除回测所对应的描述文件索引行
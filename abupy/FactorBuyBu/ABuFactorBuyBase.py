@@ -10,13 +10,17 @@ from __future__ import division
 import copy
 from abc import ABCMeta, abstractmethod
 
+import numpy as np
+
 from ..CoreBu.ABuFixes import six
 from ..CoreBu.ABuDeprecated import AbuDeprecated
 from ..BetaBu.ABuAtrPosition import AbuAtrPosition
 from ..BetaBu import ABuPositionBase
 from ..TradeBu.ABuOrder import AbuOrder
 from ..TradeBu.ABuMLFeature import AbuMlFeature
+from ..TradeBu import ABuPickTimeMemo
 from ..CoreBu.ABuBase import AbuParamBase
+from ..IndicatorBu import ABuNDCache
 from ..SlippageBu.ABuSlippageBuyMean import AbuSlippageBuyMean
 from ..UtilBu.ABuLazyUtil import LazyFunc
 from ..UmpBu.ABuUmpManager import AbuUmpManager
@@ -95,6 +99,9 @@ class AbuFactorBuyBase(six.with_metaclass(ABCMeta, AbuParamBase)):
         self.ump_manger = AbuUmpManager(self)
         # 默认的factor_name，子类通过_init_self可覆盖更具体的名字
         self.factor_name = '{}'.format(self.__class__.__name__)
+        # 择时共享缓存中区分因子类及参数的key，没有开启择时共享缓存时为None
+        self.memo_key = None if ABuPickTimeMemo.active_memo() is None else ABuPickTimeMemo.factor_key(
+            self.__class__, kwargs)
 
         # 忽略的交易日数量
         self.skip_days = 0
@@ -257,6 +264,11 @@ class AbuFactorBuyBase(six.with_metaclass(ABCMeta, AbuParamBase)):
         :param day_ind: 交易发生的时间索引，对应self.kl_pd.key
         :return:
         """
+        memo = ABuPickTimeMemo.active_memo()
+        if memo is not None:
+            # 交易特征只与金融时间序列及交易日有关，择时共享缓存中不同的因子组合复用
+            return memo.ml_feature(self.kl_pd, day_ind, True, lambda: AbuMlFeature().make_feature_dict(
+                self.kl_pd, self.combine_kl_pd, day_ind, buy_feature=True))
         return AbuMlFeature().make_feature_dict(self.kl_pd, self.combine_kl_pd, day_ind, buy_feature=True)
 
     @abstractmethod
@@ -283,6 +295,60 @@ class AbuFactorBuyBase(six.with_metaclass(ABCMeta, AbuParamBase)):
 
         return self.fit_day(today)
 
+    def init_fit_signals(self, walk_ind=-1):
+        """
+        向量化择时模式下由择时worker调用，通过子类实现的fit_signals一次性计算
+        self.kl_pd上所有交易日的买入信号，信号数组长度与self.kl_pd一致
+        :param walk_ind: 上一次被择时worker驱动的交易日序号，默认-1，增量择时从断点继续时为断点前一个交易日
+        """
+        memo = ABuPickTimeMemo.active_memo()
+        if memo is None:
+            self.signal_array = np.asarray(self.fit_signals(self.kl_pd), dtype=bool)
+        else:
+            # 相同symbol，时间范围，因子类及参数的买入信号在择时共享缓存中只计算一次
+            self.signal_array = memo.signal_array(self, lambda: self.fit_signals(self.kl_pd))
+        if self.signal_array.shape[0] != self.kl_pd.shape[0]:
+            raise ValueError('fit_signals must return array with len(kl_pd)={}, but got {}!'.format(
+                self.kl_pd.shape[0], self.signal_array.shape[0]))
+        # 上一次被择时worker驱动的交易日序号
+        self.signal_walk_ind = walk_ind
+
+    def walk_fit_signals(self, to_ind):
+        """
+        上次驱动的交易日到to_ind之间（不包括to_ind）没有被驱动的交易日，
+        等同于逐日驱动时read_fit_day中的skip_days递减
+        :param to_ind: 下一个需要驱动的交易日序号
+        """
+        skip_cnt = to_ind - self.signal_walk_ind - 1
+        self.signal_walk_ind = to_ind - 1
+        if self.skip_days > 0 and skip_cnt > 0:
+            self.skip_days = max(self.skip_days - skip_cnt, 0)
+
+    def read_fit_signals(self, today):
+        """
+        向量化择时模式下替代read_fit_day，择时worker只在部分交易日驱动因子，没有被驱动的交易日
+        以及没有买入信号的交易日都只消耗skip_days，只有fit_signals发出信号的交易日才执行read_fit_day，
+        所以实现fit_signals的因子在没有信号的交易日中fit_day不能有任何副作用
+        :param today: 当前驱动的交易日金融时间序列数据
+        :return: 生成的交易订单AbuOrder对象
+        """
+        today_ind = int(today.key)
+        self.walk_fit_signals(today_ind)
+        self.signal_walk_ind = today_ind
+
+        if not self.signal_array[today_ind]:
+            # 没有买入信号的交易日fit_day必然不会生成订单，只需要消耗skip_days
+            if self.skip_days > 0:
+                self.skip_days -= 1
+            return None
+        return self.read_fit_day(today)
+
+    """
+        向量化择时模式下可选实现fit_signals，择时worker通过hasattr判断是否支持：
+        def fit_signals(self, kl_pd):
+            return bool序列，长度与kl_pd一致，True代表当天fit_day会发出买入信号(不需要考虑skip_days)
+    """
+
     def buy_tomorrow(self):
         """
         明天进行买入操作，比如突破策略使用了今天收盘的价格做为参数，发出了买入信号，
@@ -332,11 +398,28 @@ class AbuFactorBuyBase(six.with_metaclass(ABCMeta, AbuParamBase)):
             :param today: 当前驱动的交易日金融时间序列数据
             :param past_day_cnt: int，获取今天之前过去past_day_cnt天的金融时间序列数据
         """
-        end_ind = self.combine_kl_pd[self.combine_kl_pd.date == today.date].key.values[0]
+        # 交易日date升序，二分查找今天在combine_kl_pd中的位置，替代每天对整个序列的布尔筛选
+        kl_date = self.combine_kl_pd.date.values
+        date_pos = np.searchsorted(kl_date, today.date)
+        if date_pos < kl_date.shape[0] and kl_date[date_pos] == today.date:
+            end_ind = self.combine_kl_pd.key.values[date_pos]
+        else:
+            end_ind = self.combine_kl_pd[self.combine_kl_pd.date == today.date].key.values[0]
         start_ind = end_ind - past_day_cnt if end_ind - past_day_cnt > 0 else 0
         # 根据当前的交易日，切片过去一段时间金融时间序列
         return self.combine_kl_pd.iloc[start_ind:end_ind]
 
+    def indicator(self, name, *args):
+        """
+        获取self.kl_pd上的技术指标序列，每一个kl_pd上相同名称及参数的指标只完整计算一次，
+        fit_day中通过self.today_ind读取今天的指标值，替代每天对周期切片重新计算
+        eg: self.indicator('rolling_max', self.xd)[self.today_ind]
+        :param name: 技术指标名称，eg：'rolling_max', 'rolling_min', 'rolling_mean', 'ema', 'macd', 'atr'
+        :param args: 技术指标参数，eg：rolling_max的周期xd
+        :return: np.array序列，macd等多序列指标返回np.array序列tuple
+        """
+        return ABuNDCache.kl_indicator(self.kl_pd, name, *args)
+
     def past_today_one_month(self, today):
         """套接past_today_kl，获取今天之前1个月交易日的金融时间序列数据"""
         # TODO 这里固定了值，最好使用env中的时间，如币类市场等特殊情况
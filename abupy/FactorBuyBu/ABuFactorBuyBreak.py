@@ -8,6 +8,7 @@ from __future__ import print_function
 from __future__ import division
 
 from .ABuFactorBuyBase import AbuFactorBuyBase, AbuFactorBuyXD, BuyCallMixin, BuyPutMixin
+from ..IndicatorBu.ABuNDCache import kl_indicator
 
 __author__ = '阿布'
 __weixin__ = 'abu_quant'
@@ -35,13 +36,22 @@ class AbuFactorBuyBreak(AbuFactorBuyBase, BuyCallMixin):
             return None
 
         # 今天的收盘价格达到xd天内最高价格则符合买入条件
-        if today.close == self.kl_pd.close[self.today_ind - self.xd + 1:self.today_ind + 1].max():
+        if today.close == self.indicator('rolling_max', self.xd)[self.today_ind]:
             # 把突破新高参数赋值skip_days，这里也可以考虑make_buy_order确定是否买单成立，但是如果停盘太长时间等也不好
             self.skip_days = self.xd
             # 生成买入订单, 由于使用了今天的收盘价格做为策略信号判断，所以信号发出后，只能明天买
             return self.buy_tomorrow()
         return None
 
+    def fit_signals(self, kl_pd):
+        """
+        向量化择时模式下一次性计算所有交易日的买入信号：今天的收盘价格达到xd天内最高价格，
+        统计周期内前xd天rolling结果为nan，比较结果即为False
+        :param kl_pd: 择时时段金融时间序列，pd.DataFrame对象
+        :return: bool序列，长度与kl_pd一致
+        """
+        return kl_pd.close.values == kl_indicator(kl_pd, 'rolling_max', self.xd)
+
 
 # noinspection PyAttributeOutsideInit
 class AbuFactorBuyXDBK(AbuFactorBuyXD, BuyCallMixin):
@@ -53,10 +63,14 @@ class AbuFactorBuyXDBK(AbuFactorBuyXD, BuyCallMixin):
         :return:
         """
         # 今天的收盘价格达到xd天内最高价格则符合买入条件
-        if today.close == self.xd_kl.close.max():
+        if today.close == self.indicator('rolling_max', self.xd)[self.today_ind]:
             return self.buy_tomorrow()
         return None
 
+    def fit_signals(self, kl_pd):
+        """向量化择时模式下一次性计算所有交易日的买入信号：今天的收盘价格达到xd天内最高价格"""
+        return kl_pd.close.values == kl_indicator(kl_pd, 'rolling_max', self.xd)
+
 
 # noinspection PyAttributeOutsideInit
 class AbuFactorBuyPutBreak(AbuFactorBuyBase, BuyPutMixin):
@@ -81,11 +95,15 @@ class AbuFactorBuyPutBreak(AbuFactorBuyBase, BuyPutMixin):
         """
             与AbuFactorBuyBreak区别就是买向下突破的，即min()
         """
-        if today.close == self.kl_pd.close[self.today_ind - self.xd + 1:self.today_ind + 1].min():
+        if today.close == self.indicator('rolling_min', self.xd)[self.today_ind]:
             self.skip_days = self.xd
             return self.buy_tomorrow()
         return None
 
+    def fit_signals(self, kl_pd):
+        """向量化择时模式下一次性计算所有交易日的买入信号：今天的收盘价格达到xd天内最低价格"""
+        return kl_pd.close.values == kl_indicator(kl_pd, 'rolling_min', self.xd)
+
 
 # noinspection PyAttributeOutsideInit
 class AbuFactorBuyPutXDBK(AbuFactorBuyXD, BuyPutMixin):
@@ -97,6 +115,10 @@ class AbuFactorBuyPutXDBK(AbuFactorBuyXD, BuyPutMixin):
         :return:
         """
         # 与AbuFactorBuyBreak区别就是买向下突破的，即min()
-        if today.close == self.xd_kl.close.min():
+        if today.close == self.indicator('rolling_min', self.xd)[self.today_ind]:
             return self.buy_tomorrow()
         return None
+
+    def fit_signals(self, kl_pd):
+        """向量化择时模式下一次性计算所有交易日的买入信号：今天的收盘价格达到xd天内最低价格"""
+        return kl_pd.close.values == kl_indicator(kl_pd, 'rolling_min', self.xd)
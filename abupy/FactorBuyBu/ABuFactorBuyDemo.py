@@ -68,7 +68,7 @@ class AbuSDBreak(AbuFactorBuyXD, BuyCallMixin):
             return None
 
         # 今天的收盘价格达到xd天内最高价格则符合买入条件
-        if today.close == self.xd_kl.close.max():
+        if today.close == self.indicator('rolling_max', self.xd)[self.today_ind]:
             return self.buy_tomorrow()
 
 
@@ -14,8 +14,10 @@ from ..CoreBu.ABuFixes import six
 # noinspection PyUnresolvedReferences
 from ..CoreBu.ABuFixes import filter
 from ..CoreBu.ABuBase import AbuParamBase
+from ..IndicatorBu import ABuNDCache
 from ..SlippageBu.ABuSlippageSellMean import AbuSlippageSellMean
 from ..TradeBu.ABuMLFeature import AbuMlFeature
+from ..TradeBu import ABuPickTimeMemo
 from ..UmpBu.ABuUmpManager import AbuUmpManager
 
 __author__ = '阿布'
@@ -108,6 +110,16 @@ class AbuFactorSellBase(six.with_metaclass(ABCMeta, AbuParamBase)):
         """
         order.fit_sell_order(self.today_ind - 1, self)
 
+    def indicator(self, name, *args):
+        """
+        获取self.kl_pd上的技术指标序列，每一个kl_pd上相同名称及参数的指标只完整计算一次
+        eg: self.indicator('rolling_min', self.xd)[self.today_ind]
+        :param name: 技术指标名称，eg：'rolling_max', 'rolling_min', 'rolling_mean', 'ema', 'macd', 'atr'
+        :param args: 技术指标参数，eg：rolling_min的周期xd
+        :return: np.array序列，macd等多序列指标返回np.array序列tuple
+        """
+        return ABuNDCache.kl_indicator(self.kl_pd, name, *args)
+
     @abstractmethod
     def _init_self(self, **kwargs):
         """子类因子针对可扩展参数的初始化"""
@@ -164,6 +176,11 @@ class AbuFactorSellBase(six.with_metaclass(ABCMeta, AbuParamBase)):
          :param day_ind: 交易发生的时间索引，对应self.kl_pd.key
          :return:
          """
+        memo = ABuPickTimeMemo.active_memo()
+        if memo is not None:
+            # 交易特征只与金融时间序列及交易日有关，择时共享缓存中不同的因子组合复用
+            return memo.ml_feature(self.kl_pd, day_ind, False, lambda: AbuMlFeature().make_feature_dict(
+                self.kl_pd, self.combine_kl_pd, day_ind, buy_feature=False))
         return AbuMlFeature().make_feature_dict(self.kl_pd, self.combine_kl_pd, day_ind, buy_feature=False)
 
     """TODO: 使用check support方式查询是否支持fit_week，fit_month，上层不再使用hasattr去判断"""
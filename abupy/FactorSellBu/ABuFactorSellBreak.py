@@ -35,7 +35,7 @@ class AbuFactorSellBreak(AbuFactorSellBase):
         :param orders: 买入择时策略中生成的订单序列
         """
         # 今天的收盘价格达到xd天内最低价格则符合条件
-        if today.close == self.kl_pd.close[self.today_ind - self.xd + 1:self.today_ind + 1].min():
+        if today.close == self.indicator('rolling_min', self.xd)[self.today_ind]:
             for order in orders:
                 self.sell_tomorrow(order)
 
@@ -54,6 +54,6 @@ class AbuFactorSellXDBK(AbuFactorSellXD):
         :param orders: 买入择时策略中生成的订单序列
         """
         # 今天的收盘价格达到xd天内最低价格则符合条件
-        if today.close == self.xd_kl.close.min():
+        if today.close == self.indicator('rolling_min', self.xd)[self.today_ind]:
             for order in orders:
                 self.sell_tomorrow(order)
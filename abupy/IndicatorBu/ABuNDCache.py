@@ -0,0 +1,189 @@
+# -*- encoding:utf-8 -*-
+"""
+    金融时间序列技术指标缓存模块，每一个kl_pd上的技术指标（rolling max/min/mean/deg/rank，ema，macd，atr）
+    只在第一次使用时完整计算一次，之后择时因子每天只需要通过交易日序号O(1)读取，避免因子在
+    fit_day中每天对周期切片重新计算max/min/macd等
+
+    eg:
+        class AbuFactorBuyBreak(AbuFactorBuyBase, BuyCallMixin):
+            def fit_day(self, today):
+                if today.close == self.indicator('rolling_max', self.xd)[self.today_ind]:
+                    return self.buy_tomorrow()
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import weakref
+
+import numpy as np
+from numpy.lib.stride_tricks import as_strided
+
+from ..CoreBu.ABuPdHelper import pd_rolling_max, pd_rolling_min, pd_rolling_mean, pd_ewm_mean
+
+__author__ = '阿布'
+__weixin__ = 'abu_quant'
+
+"""
+    是否开启技术指标缓存，默认开启，关闭后每一次indicator调用都完整计算
+    eg:
+        abupy.IndicatorBu.ABuNDCache.g_enable_indicator_cache = False
+"""
+g_enable_indicator_cache = True
+
+"""kl_pd id -> (kl_pd弱引用, 指标缓存字典)，kl_pd被回收后弱引用回调删除对应的缓存"""
+_g_indicator_cache = dict()
+
+
+def _rolling_max(kl_pd, window, col='close'):
+    """周期window内的最大值序列，统计周期内前window - 1天为nan"""
+    return pd_rolling_max(kl_pd[col], window=window).values
+
+
+def _rolling_min(kl_pd, window, col='close'):
+    """周期window内的最小值序列，统计周期内前window - 1天为nan"""
+    return pd_rolling_min(kl_pd[col], window=window).values
+
+
+def _rolling_mean(kl_pd, window, col='close'):
+    """周期window内的均值序列，统计周期内前window - 1天为nan"""
+    return pd_rolling_mean(kl_pd[col], window=window).values
+
+
+def _ema(kl_pd, span, col='close'):
+    """span周期的加权移动平均序列"""
+    return pd_ewm_mean(kl_pd[col], span=span).values
+
+
+def _macd(kl_pd, fast_period=12, slow_period=26, signal_period=9):
+    """完整金融时间序列上的macd，返回(dif, dea, bar)"""
+    # 局部引用，避免因子基础模块引入绘图模块
+    from .ABuNDMacd import calc_macd
+    return calc_macd(kl_pd.close, fast_period=fast_period, slow_period=slow_period, signal_period=signal_period)
+
+
+def _atr(kl_pd, time_period=14):
+    """完整金融时间序列上的atr序列"""
+    from .ABuNDAtr import calc_atr
+    return calc_atr(kl_pd.high, kl_pd.low, kl_pd.close, time_period=time_period)
+
+
+def _rolling_deg(kl_pd, window, col='close'):
+    """
+    周期window内的走势拟合角度序列，与ABuRegUtil.calc_regress_deg对每一个周期切片计算的结果一致，
+    通过累加和计算每一个周期的最小二乘斜率，统计周期内前window - 1天使用已有的数据计算
+    """
+    y = kl_pd[col].values.astype(np.float64)
+    ind = np.arange(y.shape[0])
+    start = np.maximum(ind - window + 1, 0)
+    cnt = (ind - start + 1).astype(np.float64)
+
+    y_nan = np.isnan(y)
+    # 斜率不受y平移影响，先减去均值，降低累加和的数值误差
+    y_shift = np.where(y_nan, 0, y - np.nanmean(y)) if not y_nan.all() else np.zeros_like(y)
+    cs_y = np.concatenate([[0.], np.cumsum(y_shift)])
+    cs_iy = np.concatenate([[0.], np.cumsum(ind * y_shift)])
+    cs_nan = np.concatenate([[0], np.cumsum(y_nan)])
+
+    sum_y = cs_y[ind + 1] - cs_y[start]
+    # 周期内的x为0, 1, 2...cnt - 1，即ind - start
+    sum_xy = cs_iy[ind + 1] - cs_iy[start] - start * sum_y
+    sum_x = cnt * (cnt - 1) / 2
+    sum_xx = (cnt - 1) * cnt * (2 * cnt - 1) / 6
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slope = (sum_xy - sum_x * sum_y / cnt) / (sum_xx - sum_x * sum_x / cnt)
+        # 与calc_regress_deg一致，将y值zoom到与x一个级别：x.max() / y.max()
+        zoom = (cnt - 1) / pd_rolling_max(kl_pd[col], window=window, min_periods=1).values
+    deg = np.rad2deg(slope * zoom)
+    # 周期内有nan的拟合结果为nan
+    deg[(cs_nan[ind + 1] - cs_nan[start]) > 0] = np.nan
+    return deg
+
+
+def _rolling_rank(kl_pd, window, col='close'):
+    """
+    周期window内最后一个值在周期中的排名比例，与pd.Series.rank()[-1] / len对每一个周期切片计算的结果一致，
+    统计周期内前window - 1天使用已有的数据计算
+    """
+    y = kl_pd[col].values.astype(np.float64)
+    n = y.shape[0]
+    # 前面补window - 1个nan，构建(n, window)的滑动窗口视图，nan不参与排名
+    pad = np.concatenate([np.full(window - 1, np.nan), y])
+    windows = as_strided(pad, shape=(n, window), strides=(pad.strides[0], pad.strides[0]))
+    last = y[:, np.newaxis]
+    less = (windows < last).sum(axis=1)
+    equal = (windows == last).sum(axis=1)
+    # rank默认method='average'，相等的值取平均排名
+    rank = (less + (equal + 1) / 2) / np.minimum(np.arange(1, n + 1), window)
+    rank[np.isnan(y)] = np.nan
+    return rank
+
+
+"""技术指标名称 -> 计算函数，计算函数第一个参数为kl_pd，返回与kl_pd长度一致的序列或者序列tuple"""
+K_INDICATOR_FUNC = {
+    'rolling_max': _rolling_max,
+    'rolling_min': _rolling_min,
+    'rolling_mean': _rolling_mean,
+    'ema': _ema,
+    'macd': _macd,
+    'atr': _atr,
+    'rolling_deg': _rolling_deg,
+    'rolling_rank': _rolling_rank,
+}
+
+
+def register_indicator(name, func):
+    """
+    注册自定义技术指标计算函数
+    :param name: 技术指标名称，str
+    :param func: 计算函数，func(kl_pd, *args)，返回与kl_pd长度一致的序列或者序列tuple
+    """
+    K_INDICATOR_FUNC[name] = func
+
+
+def _kl_cache(kl_pd):
+    """获取kl_pd对应的指标缓存字典，没有时创建"""
+    key = id(kl_pd)
+    cache = _g_indicator_cache.get(key)
+    # 弱引用校验，防止id被已经回收的kl_pd复用
+    if cache is not None and cache[0]() is kl_pd:
+        return cache[1]
+
+    def _clear(_, _key=key):
+        _g_indicator_cache.pop(_key, None)
+
+    indicator_dict = dict()
+    _g_indicator_cache[key] = (weakref.ref(kl_pd, _clear), indicator_dict)
+    return indicator_dict
+
+
+def kl_indicator(kl_pd, name, *args):
+    """
+    获取kl_pd上的技术指标序列，同一个kl_pd上相同名称及参数的指标只计算一次
+    :param kl_pd: 金融时间序列，pd.DataFrame对象
+    :param name: 技术指标名称，K_INDICATOR_FUNC中的key，eg：'rolling_max'
+    :param args: 技术指标参数，eg：rolling_max的周期xd
+    :return: np.array序列，macd等多序列指标返回np.array序列tuple
+    """
+    if name not in K_INDICATOR_FUNC:
+        raise ValueError('indicator {} not in {}!'.format(name, list(K_INDICATOR_FUNC.keys())))
+
+    if not g_enable_indicator_cache:
+        return K_INDICATOR_FUNC[name](kl_pd, *args)
+
+    indicator_dict = _kl_cache(kl_pd)
+    key = (name,) + args
+    if key not in indicator_dict:
+        indicator = K_INDICATOR_FUNC[name](kl_pd, *args)
+        if isinstance(indicator, tuple):
+            indicator = tuple(np.asarray(sub) for sub in indicator)
+        else:
+            indicator = np.asarray(indicator)
+        indicator_dict[key] = indicator
+    return indicator_dict[key]
+
+
+def clear_indicator_cache():
+    """清除所有kl_pd的技术指标缓存"""
+    _g_indicator_cache.clear()
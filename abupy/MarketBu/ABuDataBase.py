@@ -9,6 +9,7 @@ from __future__ import print_function
 
 from abc import ABCMeta, abstractmethod
 
+from ..MarketBu import ABuNetWork
 from ..MarketBu.ABuSymbol import Symbol
 from ..CoreBu.ABuEnv import EMarketTargetType
 from ..CoreBu.ABuFixes import six
@@ -82,6 +83,14 @@ class BaseMarket(object):
         tm = int(ABuDateUtil.time_seconds() * 1000)
         return tm
 
+    def _kline_from_requests(self, n_folds=2, start=None, end=None):
+        """
+        同步执行数据源kline_requests中的所有网络请求，之后使用kline_parse解析，
+        数据源实现kline_requests，kline_parse后，异步批量获取（ABuDataFeedAsync）与同步kline共用请求及解析逻辑
+        """
+        resps = [ABuNetWork.get(url, **kwargs) for url, kwargs in self.kline_requests(n_folds, start=start, end=end)]
+        return self.kline_parse(resps, n_folds, start=start, end=end)
+
     @classmethod
     def _fix_kline_pd_se(cls, kl_df, n_folds, start=None, end=None):
         """
@@ -18,6 +18,7 @@ from ..UtilBu.ABuFileUtil import load_df_csv, load_hdf5, ensure_dir, file_exist,
 # noinspection PyUnresolvedReferences
 from ..CoreBu.ABuFixes import xrange, range, filter
 from ..UtilBu.ABuProgress import AbuProgress
+from ..MarketBu.ABuDataColumnar import columnar_store
 
 try:
     from tables import HDF5ExtError
@@ -29,6 +30,9 @@ except ImportError:
 # 模块加载时统一确保文件夹存在，不在函数内部ensure_dir
 ensure_dir(ABuEnv.g_project_kl_df_data)
 
+# covert_csv_to_columnar每一批写入列式存储的symbol数量
+K_COLUMNAR_COVERT_BATCH = 200
+
 
 def _kl_unique_key(symbol, start, end):
     """
@@ -48,7 +52,12 @@ def rm_data_from_symbol(symbol):
     :return:
     """
 
-    # TODO 只实现了针对hdf5的数据删除，添加其它存储模式的数据删除
+    if ABuEnv.g_data_cache_type == EDataCacheType.E_DATA_CACHE_COLUMNAR:
+        # 列式存储只删除索引，列文件中的数据通过compact清理
+        columnar_store(ABuEnv.g_project_kl_df_data_columnar).remove(symbol.strip('/'))
+        return
+
+    # TODO 只实现了针对hdf5，列式存储的数据删除，添加其它存储模式的数据删除
     target_hdf5 = ABuEnv.g_project_kl_df_data
     with pd.HDFStore(target_hdf5) as h5s:
 
@@ -63,14 +72,45 @@ def rm_data_from_symbol(symbol):
 
 def load_all_kline(want_df=True, market=None, all_market=False):
     """
-    只针对hdf5模式下生效，根据参数want_df决定读取hdf5中所有的index symbol数据或者实体pd.DataFrame数据
+    只针对hdf5模式以及列式存储模式下生效，根据参数want_df决定读取所有的index symbol数据或者实体pd.DataFrame数据
     :param want_df: 是要实体pd.DataFrame数据还是索引symbol数据
     :param market: 默认None，如None则服从ABuEnv.g_market_target市场设置
     :param all_market: 默认False, 如果True则不过滤市场，即忽略market参数指定的市场
     :return:
     """
-    if ABuEnv.g_data_cache_type != EDataCacheType.E_DATA_CACHE_HDF5:
-        raise RuntimeError('only support hdf5 cache mode!')
+    if ABuEnv.g_data_cache_type not in (EDataCacheType.E_DATA_CACHE_HDF5, EDataCacheType.E_DATA_CACHE_COLUMNAR):
+        raise RuntimeError('only support hdf5 or columnar cache mode!')
+
+    def filter_market_keys(keys):
+        """非所有市场，即需要根据market再次过滤"""
+        if all_market:
+            return keys
+        _market = ABuEnv.g_market_target if market is None else market
+
+        k_market_map = {EMarketTargetType.E_MARKET_TARGET_US: [EMarketTargetType.E_MARKET_TARGET_US.value],
+                        EMarketTargetType.E_MARKET_TARGET_HK: [EMarketTargetType.E_MARKET_TARGET_HK.value],
+                        EMarketTargetType.E_MARKET_TARGET_CN: [EMarketSubType.SZ.value, EMarketSubType.SH.value]}
+
+        # 对应市场的head
+        market_head_list = k_market_map[_market]
+
+        def filter_market_key(p_key):
+            """检测p_key是否startswith对应市场market_head_list"""
+            for mh in market_head_list:
+                # key[0] = '/'
+                if p_key[1:].startswith(mh):
+                    return True
+            return False
+        # 筛选出指定市场的key
+        return list(filter(lambda p_key: filter_market_key(p_key), keys))
+
+    if ABuEnv.g_data_cache_type == EDataCacheType.E_DATA_CACHE_COLUMNAR:
+        store = columnar_store(ABuEnv.g_project_kl_df_data_columnar)
+        # 与hdf5模式的key保持一致，即'/' + symbol_key或者'/' + date_key
+        keys = filter_market_keys(['/' + symbol_key for symbol_key in store.keys()])
+        if want_df:
+            return [('/' + store.date_key(key[1:]), store.load(key[1:])) for key in keys]
+        return [(key, pd.Series(store.date_key(key[1:]))) for key in keys]
 
     # noinspection PyProtectedMember
     target_hdf5 = ABuEnv.g_project_kl_df_data
@@ -82,28 +122,7 @@ def load_all_kline(want_df=True, market=None, all_market=False):
         keys = list(filter(
             lambda p_key: len(p_key) >= k_min_index_key_len if want_df else len(p_key) < k_min_index_key_len,
             h5s.keys()))
-
-        if not all_market:
-            # 非所有市场，即需要根据market再次过滤
-            if market is None:
-                market = ABuEnv.g_market_target
-
-            k_market_map = {EMarketTargetType.E_MARKET_TARGET_US: [EMarketTargetType.E_MARKET_TARGET_US.value],
-                            EMarketTargetType.E_MARKET_TARGET_HK: [EMarketTargetType.E_MARKET_TARGET_HK.value],
-                            EMarketTargetType.E_MARKET_TARGET_CN: [EMarketSubType.SZ.value, EMarketSubType.SH.value]}
-
-            # 对应市场的head
-            market_head_list = k_market_map[market]
-
-            def filter_market_key(p_key):
-                """检测p_key是否startswith对应市场market_head_list"""
-                for mh in market_head_list:
-                    # key[0] = '/'
-                    if p_key[1:].startswith(mh):
-                        return True
-                return False
-            # 筛选出指定市场的key
-            keys = list(filter(lambda p_key: filter_market_key(p_key), keys))
+        keys = filter_market_keys(keys)
         # 结果返回序列，序列元素由（(key, h5s[key]) 构成
         return [(key, h5s[key]) for key in keys]
 
@@ -130,6 +149,25 @@ def covert_hdf_to_csv():
     ABuEnv.g_data_cache_type = tmp_cache
 
 
+def covert_csv_to_columnar():
+    """转换csv下的所有cache缓存至列式存储格式，转换后需要设置ABuEnv.g_data_cache_type为E_DATA_CACHE_COLUMNAR"""
+    csv_dir = ABuEnv.g_project_kl_df_data_csv
+    if not file_exist(csv_dir):
+        return
+
+    store = columnar_store(ABuEnv.g_project_kl_df_data_columnar)
+    date_keys = os.listdir(csv_dir)
+    with AbuProgress(len(date_keys), 0, 'columnar covert') as pg:
+        # 每K_COLUMNAR_COVERT_BATCH个symbol批量写入一次，避免每一个symbol都追加一次索引日志
+        for batch_start in range(0, len(date_keys), K_COLUMNAR_COVERT_BATCH):
+            batch = list()
+            for date_key in date_keys[batch_start:batch_start + K_COLUMNAR_COVERT_BATCH]:
+                pg.show()
+                # eg: usTSLA_20110808_20170808 -> usTSLA
+                batch.append((date_key[:-18], date_key, _load_kline_csv(date_key)))
+            store.dump_batch(batch)
+
+
 def load_kline_df(symbol_key):
     """
     封装不同存储模式，根据symbol_key读取对应的本地缓存金融时间序列对象数据
@@ -148,6 +186,11 @@ def load_kline_df(symbol_key):
         # 读取方式是HDF5，并且不是沙盒数据模式，切换load_kline_func，load_kline_key为HDF5读取函数
         load_kline_func = _load_kline_hdf5
         load_kline_key = _load_hdf5_key
+    elif ABuEnv.g_data_cache_type == EDataCacheType.E_DATA_CACHE_COLUMNAR and \
+            not ABuEnv._g_enable_example_env_ipython:
+        # 列式存储，沙盒数据模式下仍然读取沙盒csv
+        load_kline_func = _load_kline_columnar
+        load_kline_key = _load_columnar_key
 
     # noinspection PyUnusedLocal
     date_key = None
@@ -172,6 +215,33 @@ def load_kline_df(symbol_key):
     return None, 0, 0
 
 
+def kline_cache_stamps(symbol_keys):
+    """
+    不读取金融时间序列数据，获取symbol_keys本地缓存的版本标记，本地缓存重新写入后标记一定变化，
+    全市场涨跌幅矩阵更新时只重新读取标记变化的symbol
+    :param symbol_keys: 可迭代symbol_key序列，eg. ['usTSLA', 'usAAPL']
+    :return: dict，symbol_key -> 版本标记，没有本地缓存的为None，hdf5存储模式不支持版本标记返回None
+    """
+    # noinspection PyProtectedMember
+    if ABuEnv._g_enable_example_env_ipython or ABuEnv.g_data_cache_type == EDataCacheType.E_DATA_CACHE_CSV:
+        csv_dir = ABuEnv.g_project_kl_df_data_example if ABuEnv._g_enable_example_env_ipython \
+            else ABuEnv.g_project_kl_df_data_csv
+        # eg: usTSLA_20110808_20170808 -> usTSLA
+        csv_names = {name[:-18]: name for name in os.listdir(csv_dir)} if file_exist(csv_dir) else dict()
+        stamps = dict()
+        for symbol_key in symbol_keys:
+            name = csv_names.get(symbol_key)
+            if name is not None:
+                st = os.stat(os.path.join(csv_dir, name))
+                name = (name, st.st_mtime, st.st_size)
+            stamps[symbol_key] = name
+        return stamps
+    if ABuEnv.g_data_cache_type == EDataCacheType.E_DATA_CACHE_COLUMNAR:
+        store = columnar_store(ABuEnv.g_project_kl_df_data_columnar)
+        return {symbol_key: store.stamp(symbol_key) for symbol_key in symbol_keys}
+    return None
+
+
 def _load_kline_csv(date_key):
     """
     针对csv存储模式，读取本地cache金融时间序列
@@ -198,13 +268,30 @@ def _load_kline_hdf5(date_key):
     return load_hdf5(target_hdf5, date_key)
 
 
+def _load_kline_columnar(date_key):
+    """
+    针对列式存储模式，读取本地cache金融时间序列，数值列为内存映射列文件上的视图
+    :param date_key: 金融时间序列索引key，eg. usTSLA_20100214_20170214
+    """
+    # date_key最后为两个8位日期，eg. usTSLA_20100214_20170214 -> usTSLA
+    symbol_key = date_key[:-18]
+    store = columnar_store(ABuEnv.g_project_kl_df_data_columnar)
+    if store.date_key(symbol_key) != date_key:
+        return None
+    return store.load(symbol_key)
+
+
 def check_csv_local(symbol_key):
     """
     套结_load_csv_key，但不返回key具体值，只返回对应的symbol是否
-    存在csv缓存
+    存在csv缓存，列式存储模式下查询列式存储索引
     :param symbol_key: str对象，eg. usTSLA
     :return: bool, symbol是否存在csv缓存
     """
+    # noinspection PyProtectedMember
+    if ABuEnv.g_data_cache_type == EDataCacheType.E_DATA_CACHE_COLUMNAR and \
+            not ABuEnv._g_enable_example_env_ipython:
+        return _load_columnar_key(symbol_key) is not None
     return _load_csv_key(symbol_key) is not None
 
 
@@ -232,6 +319,16 @@ def _load_csv_key(symbol_key):
     return None
 
 
+def _load_columnar_key(symbol_key):
+    """
+    针对列式存储模式，通过symbol_key在索引中O(1)查询对应的date_key
+    :param symbol_key: str对象，eg. usTSLA
+    """
+    date_key = columnar_store(ABuEnv.g_project_kl_df_data_columnar).date_key(symbol_key)
+    # []只是为了配合外面针对不同store统一使用key[0]
+    return None if date_key is None else [date_key]
+
+
 def _load_hdf5_key(symbol_key):
     """
     针对hdf5存储模式，通过symbol_key字符串找到对应的在hdf5中的实体金融时间
@@ -264,6 +361,10 @@ def dump_kline_df(dump_df, symbol_key, date_key):
         load_kline_key = _load_hdf5_key
         dump_kline_func = _dump_kline_hdf5
         load_kline_func = _load_kline_hdf5
+    elif ABuEnv.g_data_cache_type == EDataCacheType.E_DATA_CACHE_COLUMNAR:
+        load_kline_key = _load_columnar_key
+        dump_kline_func = _dump_kline_columnar
+        load_kline_func = _load_kline_columnar
 
     _start = int(date_key[-17: -9])
     _end = int(date_key[-8:])
@@ -383,6 +484,18 @@ def _dump_kline_hdf5(symbol_key, date_key, dump_df, delete_key=None):
     dump_del_hdf5(ABuEnv.g_project_kl_df_data, dump_dict, del_array)
 
 
+# noinspection PyUnusedLocal
+def _dump_kline_columnar(symbol_key, date_key, dump_df, delete_key=None):
+    """
+    针对列式存储模式，根据symbol_key，date_key存储dump_df金融时间序列
+    :param symbol_key: str对象，eg. usTSLA，列式存储模式下为索引key
+    :param date_key: str对象，eg. usTSLA_20100214_20170214
+    :param dump_df: 需要存储的金融时间序列实体pd.DataFrame对象
+    :param delete_key: 列式存储模式下写入即覆盖symbol_key对应的索引，不需要删除，只为保持接口统一
+    """
+    columnar_store(ABuEnv.g_project_kl_df_data_columnar).dump(symbol_key, date_key, dump_df)
+
+
 def save_kline_df(df, temp_symbol, start_int, end_int):
     """
     独立对外的保存kl数据接口
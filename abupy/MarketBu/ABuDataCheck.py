@@ -17,6 +17,7 @@ from ..CoreBu.ABuFixes import filter, partial
 from ..MarketBu.ABuMarket import is_in_sand_box
 from ..UtilBu.ABuOsUtil import show_msg
 from ..MarketBu.ABuSymbolPd import check_symbol_in_local_csv
+from ..MarketBu.ABuDataColumnar import columnar_store
 
 __author__ = '阿布'
 __weixin__ = 'abu_quant'
@@ -104,6 +105,17 @@ def check_symbol_data_mode(choice_symbols):
                     u'请先使用\'数据下载界面操作\'进行数据更新！')
                 browser_down_csv_zip()
                 return False
+            elif ABuEnv.g_data_cache_type == EDataCacheType.E_DATA_CACHE_COLUMNAR \
+                    and len(columnar_store(ABuEnv.g_project_kl_df_data_columnar)) < 100:
+                # 列式存储模式下数据不足
+                logging.info(
+                    u'未选择任何回测目标且在非沙盒数据模式下，判定为进行全市场回测'
+                    u'为了提高运行效率, 只使用\'本地数据模式\'进行回测'
+                    u'列式存储模式下发现本地缓存数据不足，'
+                    u'如需要进行数据更新'
+                    u'请先使用\'数据下载界面操作\'进行数据更新！')
+                browser_down_csv_zip()
+                return False
     return True
 
 
@@ -153,6 +165,15 @@ def check_symbol_data(choice_symbols):
                 u'所以非沙盒模式需要先用\'数据下载界面操作\'进行数据下载')
             browser_down_csv_zip()
             return False
+        elif ABuEnv.g_data_cache_type == EDataCacheType.E_DATA_CACHE_COLUMNAR:
+            # 列式存储模式下，索引O(1)查询每一个symbol是否存在
+            not_in_local = list(filter(lambda symbol: not check_symbol_in_local_csv(symbol), choice_symbols))
+            if len(not_in_local) > math.ceil(len(choice_symbols) * 0.3):
+                logging.info(
+                    u'{}未发现本地缓存数据，最优参数grid search暂不支持实时网络数据模式！'
+                    u'需要先用\'数据下载界面操作\'进行数据下载'.format(not_in_local))
+                browser_down_csv_zip()
+                return False
     return True
 
 
@@ -193,4 +214,14 @@ def all_market_env_check():
             u'请先使用\'数据下载界面操作\'进行数据更新！')
         browser_down_csv_zip()
         return False
+    elif ABuEnv.g_data_cache_type == EDataCacheType.E_DATA_CACHE_COLUMNAR \
+            and len(columnar_store(ABuEnv.g_project_kl_df_data_columnar)) < 30:
+        # 列式存储模式下数据不足, 这里取30
+        logging.info(
+            u'全市场相关操作为了提高运行效率, 只使用\'本地数据模式\'进行回测'
+            u'列式存储模式下发现本地缓存数据不足，'
+            u'如需要进行数据更新'
+            u'请先使用\'数据下载界面操作\'进行数据更新！')
+        browser_down_csv_zip()
+        return False
     return True
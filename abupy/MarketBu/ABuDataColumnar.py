@@ -0,0 +1,349 @@
+# -*- encoding:utf-8 -*-
+"""
+    列式金融时间序列本地缓存模块，所有symbol的金融时间序列按列追加写入同一组列文件，
+    一个索引文件记录symbol -> (date_key, 每一列在列文件中的偏移, 长度)，读取时列文件内存映射，
+    通过索引O(1)定位后零拷贝切片构建金融时间序列，替代csv模式下每一次查询都listdir整个缓存文件夹，
+    以及每一次读取都重新解析csv文本
+
+    存储结构：
+        columnar/index.pkl          基准索引文件，{'gen': 代数, 'files': {列名: 列文件名}, 'symbols': {symbol_key: 索引信息}}
+        columnar/index.log          索引追加日志，每一次dump/remove追加一条(gen, symbol_key, 索引信息, files)记录，
+                                    读取时在基准索引上重放代数相同的记录，日志过大时合并写入新的基准索引
+        columnar/c0.bin, c1.bin...  列文件，每一个symbol的每一列按K_COLUMNAR_ALIGN字节对齐追加
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+from ..CoreBu.ABuFixes import pickle
+from ..UtilBu import ABuFileUtil
+
+try:
+    # 多进程同时写入时使用文件锁，windows下没有fcntl，不加锁
+    import fcntl
+except ImportError:
+    fcntl = None
+
+__author__ = '阿布'
+__weixin__ = 'abu_quant'
+
+# 列文件中每一段数据起始位置的字节对齐长度
+K_COLUMNAR_ALIGN = 8
+# 金融时间序列index在列文件中使用的列名，int64纳秒时间戳存储
+K_COLUMNAR_INDEX = '__index__'
+# 基准索引文件名称
+K_COLUMNAR_INDEX_FN = 'index.pkl'
+# 索引追加日志文件名称
+K_COLUMNAR_LOG_FN = 'index.log'
+# 索引追加日志超过这个字节数且大于基准索引时，合并写入新的基准索引
+K_COLUMNAR_LOG_MAX = 4 * 1024 * 1024
+
+
+def _align(offset):
+    """将偏移量按K_COLUMNAR_ALIGN字节对齐"""
+    return (offset + K_COLUMNAR_ALIGN - 1) // K_COLUMNAR_ALIGN * K_COLUMNAR_ALIGN
+
+
+def _file_stat(fn):
+    """文件的(inode, mtime, size)，os.replace替换后inode一定变化，文件不存在返回None"""
+    try:
+        st = os.stat(fn)
+    except OSError:
+        return None
+    return st.st_ino, st.st_mtime, st.st_size
+
+
+def _apply_record(index, symbol_key, entry, files):
+    """将一条索引日志记录应用到索引上，entry为None代表remove"""
+    index['files'].update(files)
+    if entry is None:
+        index['symbols'].pop(symbol_key, None)
+    else:
+        index['symbols'][symbol_key] = entry
+
+
+class AbuKLColumnarStore(object):
+    """列式金融时间序列存储类，同一个存储文件夹在一个进程中只使用一个实例，见columnar_store"""
+
+    def __init__(self, store_dir):
+        """
+        :param store_dir: 存储文件夹路径
+        """
+        self.store_dir = store_dir
+        self.index_fn = os.path.join(store_dir, K_COLUMNAR_INDEX_FN)
+        self.log_fn = os.path.join(store_dir, K_COLUMNAR_LOG_FN)
+        # 索引缓存以及缓存时基准索引文件的(inode, mtime, size)，其它进程替换基准索引后重新读取
+        self._index = None
+        self._index_stat = None
+        # 索引日志已经重放到的字节位置
+        self._log_pos = 0
+        # 列文件名 -> (映射时的文件大小, np.memmap)
+        self._mmaps = dict()
+
+    def __str__(self):
+        """打印对象显示：存储文件夹，symbol数量"""
+        return 'columnar store:{}, symbols:{}'.format(self.store_dir, len(self))
+
+    __repr__ = __str__
+
+    def __len__(self):
+        """对象长度：存储的symbol数量"""
+        return len(self._read_index()['symbols'])
+
+    def __contains__(self, symbol_key):
+        """成员测试：symbol是否在存储中"""
+        return symbol_key in self._read_index()['symbols']
+
+    def keys(self):
+        """存储中的所有symbol_key"""
+        return list(self._read_index()['symbols'].keys())
+
+    def _read_index(self):
+        """读取索引，基准索引文件没有变化时使用缓存，只重放索引日志中新追加的记录"""
+        index_stat = _file_stat(self.index_fn)
+        log_stat = _file_stat(self.log_fn)
+        log_size = 0
+        if log_stat is not None:
+            _, _, log_size = log_stat
+
+        if self._index is None or index_stat != self._index_stat or log_size < self._log_pos:
+            # 基准索引被替换，或者索引日志在合并后被截断，重新读取基准索引并从头重放日志
+            if index_stat is None:
+                self._index = {'gen': 0, 'files': dict(), 'symbols': dict()}
+            else:
+                with open(self.index_fn, 'rb') as index_file:
+                    self._index = pickle.load(index_file)
+                # 老版本的索引文件没有gen
+                self._index.setdefault('gen', 0)
+            self._index_stat = index_stat
+            self._log_pos = 0
+        if log_size > self._log_pos:
+            self._replay_log()
+        return self._index
+
+    def _replay_log(self):
+        """从上次读取的位置开始重放索引日志，只应用代数与基准索引相同的记录"""
+        index = self._index
+        with open(self.log_fn, 'rb') as log_file:
+            log_file.seek(self._log_pos)
+            while True:
+                try:
+                    gen, symbol_key, entry, files = pickle.load(log_file)
+                except Exception:
+                    # 日志末尾：正常结束，其它进程正在写入的记录，或者写入进程崩溃留下的不完整记录
+                    break
+                if gen == index['gen']:
+                    _apply_record(index, symbol_key, entry, files)
+                self._log_pos = log_file.tell()
+
+    def _write_log(self, records):
+        """
+        在写入锁内追加索引日志记录并应用到索引缓存，日志超过K_COLUMNAR_LOG_MAX时合并写入新的基准索引
+        :param records: [(gen, symbol_key, 索引信息，删除时为None, files)]
+        """
+        with open(self.log_fn, 'ab') as log_file:
+            if log_file.tell() > self._log_pos:
+                # 截断崩溃的写入进程留下的不完整记录
+                log_file.truncate(self._log_pos)
+            for record in records:
+                pickle.dump(record, log_file, pickle.HIGHEST_PROTOCOL)
+            log_file.flush()
+            self._log_pos = log_file.tell()
+        for _, symbol_key, entry, files in records:
+            _apply_record(self._index, symbol_key, entry, files)
+        index_size = 0 if self._index_stat is None else self._index_stat[2]
+        if self._log_pos > max(K_COLUMNAR_LOG_MAX, index_size):
+            self._write_index(dict(self._index, gen=self._index['gen'] + 1))
+
+    def _write_index(self, index):
+        """
+        写入新的基准索引，先写临时文件再替换，读取进程不会读到不完整的索引文件，index中的gen必须大于当前的gen，
+        替换后日志中的旧记录代数不同全部失效，之后再截断日志，任何时刻崩溃索引都是完整的
+        """
+        tmp_fn = '{}.{}.tmp'.format(self.index_fn, os.getpid())
+        with open(tmp_fn, 'wb') as index_file:
+            pickle.dump(index, index_file, pickle.HIGHEST_PROTOCOL)
+        getattr(os, 'replace', os.rename)(tmp_fn, self.index_fn)
+        with open(self.log_fn, 'wb'):
+            pass
+        self._index = index
+        self._index_stat = _file_stat(self.index_fn)
+        self._log_pos = 0
+
+    @contextmanager
+    def _write_lock(self):
+        """写入文件锁，保证多进程写入时索引文件以及列文件追加的一致性"""
+        ABuFileUtil.ensure_dir(self.index_fn)
+        if fcntl is None:
+            yield
+            return
+        with open(os.path.join(self.store_dir, '.lock'), 'a') as lock_file:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+    def _view(self, fn, offset, dtype, n):
+        """
+        列文件上的零拷贝视图，使用copy-on-write模式映射，修改返回的数据不会写回文件
+        :param fn: 列文件名
+        :param offset: 字节偏移
+        :param dtype: 数据类型str
+        :param n: 元素数量
+        """
+        dtype = np.dtype(dtype)
+        end = offset + n * dtype.itemsize
+        size, mmap = self._mmaps.get(fn, (0, None))
+        if end > size:
+            # 列文件追加写入后重新映射
+            mmap = np.memmap(os.path.join(self.store_dir, fn), dtype=np.uint8, mode='c')
+            self._mmaps[fn] = (mmap.shape[0], mmap)
+        # 转换为np.ndarray视图，不保留np.memmap子类
+        return np.asarray(mmap[offset:end]).view(dtype)
+
+    def date_key(self, symbol_key):
+        """
+        symbol_key对应的date_key
+        :param symbol_key: str对象，eg. usTSLA
+        :return: str对象，eg. usTSLA_20100214_20170214，不存在返回None
+        """
+        entry = self._read_index()['symbols'].get(symbol_key)
+        return None if entry is None else entry['date_key']
+
+    def stamp(self, symbol_key):
+        """
+        symbol_key当前数据的版本标记，每一次dump写入新的位置，标记一定变化
+        :param symbol_key: str对象，eg. usTSLA
+        :return: tuple对象，(date_key, index列文件名, index列偏移)，不存在返回None
+        """
+        index = self._read_index()
+        entry = index['symbols'].get(symbol_key)
+        return None if entry is None else (entry['date_key'], index['files'][K_COLUMNAR_INDEX], entry['index'])
+
+    def load(self, symbol_key):
+        """
+        读取symbol_key对应的金融时间序列，数值列为列文件上的零拷贝视图
+        :param symbol_key: str对象，eg. usTSLA
+        :return: 金融时间序列pd.DataFrame对象，不存在返回None
+        """
+        index = self._read_index()
+        entry = index['symbols'].get(symbol_key)
+        if entry is None:
+            return None
+        n = entry['n']
+        files = index['files']
+        kl_index = pd.DatetimeIndex(self._view(files[K_COLUMNAR_INDEX], entry['index'], np.int64, n).view(
+            'datetime64[ns]'), name=entry['index_name'])
+        data = dict(entry['obj_columns'])
+        for col, offset, dtype in entry['columns']:
+            data[col] = self._view(files[col], offset, dtype, n)
+        return pd.DataFrame(data, index=kl_index, columns=entry['col_order'], copy=False)
+
+    def _append_symbol(self, index, date_key, df):
+        """
+        将金融时间序列的每一列追加到index['files']对应的列文件末尾，新的列按index的代数命名列文件
+        :return: symbol的索引信息
+        """
+        files = index['files']
+
+        def _append(col, values):
+            """将values追加到col对应的列文件末尾，返回写入的字节偏移"""
+            if col not in files:
+                # 0代沿用老版本的列文件名，compact后的新代列文件名带上代数，不会覆盖旧代仍在使用的列文件
+                files[col] = 'c{}.bin'.format(len(files)) if index['gen'] == 0 else 'g{}_c{}.bin'.format(
+                    index['gen'], len(files))
+            col_fn = os.path.join(self.store_dir, files[col])
+            with open(col_fn, 'ab') as col_file:
+                offset = col_file.tell()
+                pad = _align(offset) - offset
+                if pad > 0:
+                    col_file.write(b'\0' * pad)
+                col_file.write(np.ascontiguousarray(values).tobytes())
+            return offset + pad
+
+        index_offset = _append(K_COLUMNAR_INDEX, pd.DatetimeIndex(df.index).values.astype(
+            'datetime64[ns]').view(np.int64))
+        columns = list()
+        obj_columns = dict()
+        for col in df.columns:
+            values = df[col].values
+            if values.dtype.kind in 'biuf':
+                columns.append((col, _append(col, values), values.dtype.str))
+            else:
+                obj_columns[col] = values
+        return {'date_key': date_key, 'n': df.shape[0], 'index': index_offset, 'index_name': df.index.name,
+                'columns': columns, 'obj_columns': obj_columns, 'col_order': list(df.columns)}
+
+    def dump(self, symbol_key, date_key, df):
+        """
+        写入symbol_key对应的金融时间序列，新数据追加在列文件末尾，索引指向新数据，原来的数据成为废弃数据，
+        通过compact清理，批量写入使用dump_batch
+        :param symbol_key: str对象，eg. usTSLA
+        :param date_key: str对象，eg. usTSLA_20100214_20170214
+        :param df: 金融时间序列pd.DataFrame对象
+        """
+        self.dump_batch([(symbol_key, date_key, df)])
+
+    def dump_batch(self, items):
+        """
+        批量写入金融时间序列，一次加锁，整个批次只追加一次索引日志，不重写基准索引
+        :param items: 可迭代序列，元素为(symbol_key, date_key, df)
+        """
+        with self._write_lock():
+            index = self._read_index()
+            records = list()
+            for symbol_key, date_key, df in items:
+                entry = self._append_symbol(index, date_key, df)
+                records.append((index['gen'], symbol_key, entry, dict(index['files'])))
+            if len(records) > 0:
+                self._write_log(records)
+
+    def remove(self, symbol_key):
+        """从索引中删除symbol_key，列文件中的数据通过compact清理"""
+        with self._write_lock():
+            index = self._read_index()
+            if symbol_key in index['symbols']:
+                self._write_log([(index['gen'], symbol_key, None, dict())])
+
+    def compact(self):
+        """
+        重写列文件，清理dump覆盖以及remove后列文件中的废弃数据，逐个symbol写入新一代的列文件，全部写完后原子替换
+        基准索引，替换前旧的索引以及列文件一直完整可用，替换后再删除旧代列文件
+        """
+        with self._write_lock():
+            index = self._read_index()
+            new_index = {'gen': index['gen'] + 1, 'files': dict(), 'symbols': dict()}
+            for fn in set(os.listdir(self.store_dir)):
+                # 清理之前compact中途崩溃留下的新代列文件
+                if fn.startswith('g{}_'.format(new_index['gen'])):
+                    ABuFileUtil.del_file(os.path.join(self.store_dir, fn))
+            for symbol_key, entry in index['symbols'].items():
+                new_index['symbols'][symbol_key] = self._append_symbol(new_index, entry['date_key'],
+                                                                       self.load(symbol_key))
+            self._write_index(new_index)
+            self._mmaps = dict()
+            for fn in set(index['files'].values()) - set(new_index['files'].values()):
+                ABuFileUtil.del_file(os.path.join(self.store_dir, fn))
+
+
+"""存储文件夹路径 -> AbuKLColumnarStore实例，同一进程中复用索引缓存以及内存映射"""
+_g_columnar_store = dict()
+
+
+def columnar_store(store_dir):
+    """
+    获取store_dir对应的列式存储对象
+    :param store_dir: 存储文件夹路径
+    :return: AbuKLColumnarStore实例
+    """
+    if store_dir not in _g_columnar_store:
+        _g_columnar_store[store_dir] = AbuKLColumnarStore(store_dir)
+    return _g_columnar_store[store_dir]
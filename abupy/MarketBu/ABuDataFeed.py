@@ -175,9 +175,15 @@ class TXApi(StockBaseMarket, SupportMixin):
         super(TXApi, self).__init__(symbol)
         # 设置数据源解析对象类
         self.data_parser_cls = TXParser
+        # kline_requests中请求的子市场，kline_parse解析时使用
+        self._sub_market = None
 
     def kline(self, n_folds=2, start=None, end=None):
         """日k线接口"""
+        return self._kline_from_requests(n_folds, start=start, end=end)
+
+    def kline_requests(self, n_folds=2, start=None, end=None):
+        """日k线接口需要的网络请求序列，序列元素为(url, 透传ABuNetWork.get的请求参数)"""
         cuid = ABuStrUtil.create_random_with_num_low(40)
         cuid_md5 = ABuMd5.md5_from_binary(cuid)
         random_suffix = ABuStrUtil.create_random_with_num(5)
@@ -223,9 +229,15 @@ class TXApi(StockBaseMarket, SupportMixin):
                 market, self._symbol.value, days,
                 dev_mod, cuid, cuid, cuid_md5, screen[0], screen[1], os_ver, int(random_suffix, 10))
 
-        data = ABuNetWork.get(url, timeout=K_TIME_OUT)
+        # 解析时需要使用请求的子市场
+        self._sub_market = sub_market
+        return [(url, {'timeout': K_TIME_OUT})]
+
+    def kline_parse(self, resps, n_folds=2, start=None, end=None):
+        """解析kline_requests对应的请求返回序列，请求失败的返回为None"""
+        data = resps[0]
         if data is not None:
-            kl_pd = self.data_parser_cls(self._symbol, sub_market, data.json()).df
+            kl_pd = self.data_parser_cls(self._symbol, self._sub_market, data.json()).df
         else:
             return None
 
@@ -267,7 +279,10 @@ class NTApi(StockBaseMarket, SupportMixin):
 
     def kline(self, n_folds=2, start=None, end=None):
         """日k线接口"""
-        kl_df = None
+        return self._kline_from_requests(n_folds, start=start, end=end)
+
+    def kline_requests(self, n_folds=2, start=None, end=None):
+        """日k线接口需要的网络请求序列，每一年一个请求，序列元素为(url, 透传ABuNetWork.get的请求参数)"""
         if start is None or end is None:
             end_year = int(ABuDateUtil.current_str_date()[:4])
             start_year = end_year - n_folds + 1
@@ -296,14 +311,18 @@ class NTApi(StockBaseMarket, SupportMixin):
         else:
             raise TypeError('NTApi dt support {}'.format(self._symbol.market))
 
-        for year in req_year:
-            url = NTApi.K_NET_BASE % (market, year, symbol)
-            data = ABuNetWork.get(url=url, retry=1, timeout=K_TIME_OUT)
+        return [(NTApi.K_NET_BASE % (market, year, symbol), {'retry': 1, 'timeout': K_TIME_OUT})
+                for year in req_year]
+
+    def kline_parse(self, resps, n_folds=2, start=None, end=None):
+        """解析kline_requests对应的请求返回序列，请求失败的返回为None"""
+        kl_df = None
+        for data in resps:
             temp_df = None
             if data is not None:
                 temp_df = self.data_parser_cls(self._symbol, data.json()).df
             if temp_df is not None:
-                kl_df = temp_df if kl_df is None else kl_df.append(temp_df)
+                kl_df = temp_df if kl_df is None else pd.concat([kl_df, temp_df])
         if kl_df is None:
             return None
         return StockBaseMarket._fix_kline_pd(kl_df, n_folds, start, end)
@@ -332,9 +351,17 @@ class SNUSApi(StockBaseMarket, SupportMixin):
 
     def kline(self, n_folds=2, start=None, end=None):
         """日k线接口"""
-        url = SNUSApi.K_NET_BASE % self._symbol.symbol_code
-        data = ABuNetWork.get(url=url, timeout=K_TIME_OUT).json()
-        kl_df = self.data_parser_cls(self._symbol, data).df
+        return self._kline_from_requests(n_folds, start=start, end=end)
+
+    def kline_requests(self, n_folds=2, start=None, end=None):
+        """日k线接口需要的网络请求序列，序列元素为(url, 透传ABuNetWork.get的请求参数)"""
+        return [(SNUSApi.K_NET_BASE % self._symbol.symbol_code, {'timeout': K_TIME_OUT})]
+
+    def kline_parse(self, resps, n_folds=2, start=None, end=None):
+        """解析kline_requests对应的请求返回序列，请求失败的返回为None"""
+        if resps[0] is None:
+            return None
+        kl_df = self.data_parser_cls(self._symbol, resps[0].json()).df
         if kl_df is None:
             return None
         return StockBaseMarket._fix_kline_pd(kl_df, n_folds, start, end)
@@ -364,9 +391,17 @@ class SNFuturesApi(FuturesBaseMarket, SupportMixin):
 
     def kline(self, n_folds=2, start=None, end=None):
         """日k线接口"""
-        url = SNFuturesApi.K_NET_BASE % self._symbol.symbol_code
-        data = ABuNetWork.get(url=url, timeout=K_TIME_OUT).json()
-        kl_df = self.data_parser_cls(self._symbol, data).df
+        return self._kline_from_requests(n_folds, start=start, end=end)
+
+    def kline_requests(self, n_folds=2, start=None, end=None):
+        """日k线接口需要的网络请求序列，序列元素为(url, 透传ABuNetWork.get的请求参数)"""
+        return [(SNFuturesApi.K_NET_BASE % self._symbol.symbol_code, {'timeout': K_TIME_OUT})]
+
+    def kline_parse(self, resps, n_folds=2, start=None, end=None):
+        """解析kline_requests对应的请求返回序列，请求失败的返回为None"""
+        if resps[0] is None:
+            return None
+        kl_df = self.data_parser_cls(self._symbol, resps[0].json()).df
         if kl_df is None:
             return None
         return FuturesBaseMarket._fix_kline_pd(kl_df, n_folds, start, end)
@@ -392,10 +427,19 @@ class SNFuturesGBApi(FuturesBaseMarket, SupportMixin):
 
     def kline(self, n_folds=2, start=None, end=None):
         """日k线接口"""
+        return self._kline_from_requests(n_folds, start=start, end=end)
+
+    def kline_requests(self, n_folds=2, start=None, end=None):
+        """日k线接口需要的网络请求序列，序列元素为(url, 透传ABuNetWork.get的请求参数)"""
         today = ABuDateUtil.current_str_date().replace('-', '_')
         url = SNFuturesGBApi.K_NET_BASE % (self._symbol.symbol_code, today, self._symbol.symbol_code, today)
-        data = ABuNetWork.get(url=url, timeout=(10, 60))
-        text = data.text
+        return [(url, {'timeout': (10, 60)})]
+
+    def kline_parse(self, resps, n_folds=2, start=None, end=None):
+        """解析kline_requests对应的请求返回序列，请求失败的返回为None"""
+        if resps[0] is None:
+            return None
+        text = resps[0].text
         # 返回的是Javascript字符串解析出dict
         js_dict = ABuNetWork.parse_js(text[text.find('=(') + 2:text.rfind(')')])
         kl_df = self.data_parser_cls(self._symbol, js_dict).df
@@ -423,6 +467,10 @@ class HBApi(TCBaseMarket, SupportMixin):
 
     def kline(self, n_folds=2, start=None, end=None):
         """日k线接口"""
+        return self._kline_from_requests(n_folds, start=start, end=end)
+
+    def kline_requests(self, n_folds=2, start=None, end=None):
+        """日k线接口需要的网络请求序列，序列元素为(url, 透传ABuNetWork.get的请求参数)"""
         req_cnt = n_folds * ABuEnv.g_market_trade_year
         if start is not None and end is not None:
             # 向上取整数，下面使用_fix_kline_pd再次进行剪裁, 要使用current_str_date不能是end
@@ -430,9 +478,13 @@ class HBApi(TCBaseMarket, SupportMixin):
                                                ABuDateUtil.current_str_date()) / 365)
             req_cnt = folds * ABuEnv.g_market_trade_year
 
-        url = HBApi.K_NET_BASE % (self._symbol.symbol_code, req_cnt)
-        data = ABuNetWork.get(url=url, timeout=K_TIME_OUT).json()
-        kl_df = self.data_parser_cls(self._symbol, data).df
+        return [(HBApi.K_NET_BASE % (self._symbol.symbol_code, req_cnt), {'timeout': K_TIME_OUT})]
+
+    def kline_parse(self, resps, n_folds=2, start=None, end=None):
+        """解析kline_requests对应的请求返回序列，请求失败的返回为None"""
+        if resps[0] is None:
+            return None
+        kl_df = self.data_parser_cls(self._symbol, resps[0].json()).df
         if kl_df is None:
             return None
         return TCBaseMarket._fix_kline_pd(kl_df, n_folds, start, end)
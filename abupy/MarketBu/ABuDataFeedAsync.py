@@ -0,0 +1,242 @@
+# -*- encoding:utf-8 -*-
+"""
+    金融时间序列异步批量获取模块，只支持python3，run_kl_update(how='async')使用：
+
+    1. 同一个数据源的所有请求共享一个http session，复用连接池
+    2. 每一个数据源独立限制同时进行的请求数量，以及每秒请求数量
+    3. 请求失败使用带随机抖动的指数退避重试
+
+    数据源实现kline_requests，kline_parse（见ABuDataFeed中的内置数据源）即可使用异步请求，
+    解析仍然使用数据源原有的ABuDataParser解析类，没有实现的数据源（如BDApi的分页请求，
+    以及私有数据源）在线程池中执行同步kline，同样受到数据源的并发数量及请求频率限制
+
+    存在aiohttp时使用aiohttp异步请求，否则使用requests.Session在线程池中请求
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import asyncio
+import json
+import logging
+import random
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from .ABuDataSource import kline_source, _calc_start_end_date
+from .ABuSymbol import Symbol, code_to_symbol
+from ..CoreBu.ABuFixes import partial, six
+from ..UtilBu import ABuDateUtil
+from ..UtilBu.ABuProgress import AbuProgress
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+__author__ = '阿布'
+__weixin__ = 'abu_quant'
+
+"""
+    每一个数据源同时进行的请求数量上限
+    eg:
+        abupy.MarketBu.ABuDataFeedAsync.g_async_max_concurrency = 32
+"""
+g_async_max_concurrency = 16
+
+"""
+    每一个数据源每秒请求数量上限，None即不限制
+    eg:
+        abupy.MarketBu.ABuDataFeedAsync.g_async_max_rate = 50
+"""
+g_async_max_rate = 20
+
+"""
+    针对某个数据源单独设置(同时请求数量上限, 每秒请求数量上限)，没有设置的数据源使用g_async_max_concurrency，g_async_max_rate
+    eg:
+        abupy.MarketBu.ABuDataFeedAsync.g_async_source_limit = {NTApi: (8, 10)}
+"""
+g_async_source_limit = dict()
+
+"""请求失败后指数退避重试的基础等待秒数，实际等待base * 2^n * [0.5, 1.5)随机抖动"""
+g_async_backoff = 0.5
+
+
+class AbuAsyncResponse(object):
+    """异步请求返回对象，提供数据源kline_parse需要的status_code，text，json()，与requests.Response一致"""
+
+    def __init__(self, status_code, text):
+        self.status_code = status_code
+        self.text = text
+
+    def json(self):
+        """返回内容json解析"""
+        return json.loads(self.text)
+
+
+class AbuAsyncRateLimiter(object):
+    """按照固定时间间隔发放请求许可的异步频率限制器"""
+
+    def __init__(self, rate):
+        """
+        :param rate: 每秒请求数量上限，None即不限制
+        """
+        self.interval = 0 if not rate else 1. / rate
+        self._next = 0
+
+    async def acquire(self):
+        """等待下一个请求许可"""
+        if self.interval <= 0:
+            return
+        now = asyncio.get_event_loop().time()
+        wait = max(self._next - now, 0)
+        self._next = now + wait + self.interval
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+class AbuAsyncSourceSession(object):
+    """一个数据源的共享http session，同时请求数量以及请求频率限制"""
+
+    def __init__(self, source, executor):
+        """
+        :param source: 数据源类，BaseMarket的子类，非实例化对象
+        :param executor: 同步请求以及同步kline使用的线程池
+        """
+        concurrency, rate = g_async_source_limit.get(source, (g_async_max_concurrency, g_async_max_rate))
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.limiter = AbuAsyncRateLimiter(rate)
+        self.executor = executor
+        if aiohttp is not None:
+            self.session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=concurrency))
+        else:
+            self.session = requests.Session()
+            # 连接池大小与同时请求数量一致，所有请求复用连接
+            adapter = requests.adapters.HTTPAdapter(pool_connections=concurrency, pool_maxsize=concurrency)
+            self.session.mount('http://', adapter)
+            self.session.mount('https://', adapter)
+
+    async def close(self):
+        """关闭session，释放连接池"""
+        if aiohttp is not None:
+            await self.session.close()
+        else:
+            self.session.close()
+
+    async def _request(self, url, timeout):
+        """执行一次请求，返回AbuAsyncResponse对象"""
+        if aiohttp is not None:
+            if isinstance(timeout, tuple):
+                timeout = aiohttp.ClientTimeout(sock_connect=timeout[0], sock_read=timeout[1])
+            else:
+                timeout = aiohttp.ClientTimeout(total=timeout)
+            async with self.session.get(url, timeout=timeout) as resp:
+                return AbuAsyncResponse(resp.status, await resp.text())
+
+        loop = asyncio.get_event_loop()
+        resp = await loop.run_in_executor(self.executor, partial(self.session.get, url, timeout=timeout))
+        return AbuAsyncResponse(resp.status_code, resp.text)
+
+    async def get(self, url, retry=3, timeout=None, **kwargs):
+        """
+        与ABuNetWork.get参数一致的异步请求，失败使用带随机抖动的指数退避重试
+        :param url: 请求url
+        :param retry: 重试次数，默认retry=3
+        :param timeout: 超时时间，(连接超时, 接收超时)或者总超时
+        :return: AbuAsyncResponse对象，retry次都失败返回None
+        """
+        for req_count in range(retry):
+            try:
+                async with self.semaphore:
+                    await self.limiter.acquire()
+                    resp = await self._request(url, timeout)
+                if resp.status_code == 200 or resp.status_code == 206:
+                    return resp
+            except Exception as e:
+                logging.debug('{} {}'.format(url, e))
+            if req_count < retry - 1:
+                await asyncio.sleep(g_async_backoff * (2 ** req_count) * random.uniform(0.5, 1.5))
+        return None
+
+    async def run_sync(self, func, *args, **kwargs):
+        """在线程池中执行没有实现异步请求的数据源同步方法，同样受到同时请求数量以及请求频率限制"""
+        async with self.semaphore:
+            await self.limiter.acquire()
+            loop = asyncio.get_event_loop()
+            return await loop.run_in_executor(self.executor, partial(func, *args, **kwargs))
+
+
+async def _fetch_kl_df(source_session, source, temp_symbol, n_folds, start, end):
+    """
+    获取一个symbol的金融时间序列，请求的开始结束日期与kline_pd强制网络模式下一致
+    :return: (save_kl_key: 提供外部进行保存, df: 金融时间序列pd.DataFrame对象)
+    """
+    temp_symbol.source = source
+    # 与kline_pd一致：标准化输入的start，end，之后计算需要请求的start，end
+    start = ABuDateUtil.fix_date(start)
+    end = ABuDateUtil.fix_date(end)
+    end, end_int, _, start, start_int, _ = _calc_start_end_date(None, False, n_folds, start, end)
+    save_kl_key = (temp_symbol, start_int, end_int)
+
+    df = None
+    try:
+        data_source = source(temp_symbol)
+        # 与kline_pd一致：数据源不支持symbol的市场时check_support抛出异常，记录日志后返回None
+        data_source.check_support()
+
+        if hasattr(data_source, 'kline_requests') and hasattr(data_source, 'kline_parse'):
+            requests_list = data_source.kline_requests(n_folds, start=start, end=end)
+            resps = await asyncio.gather(*[source_session.get(url, **kwargs) for url, kwargs in requests_list])
+            # 解析在事件循环线程中执行，使用数据源原有的解析类
+            df = data_source.kline_parse(list(resps), n_folds, start=start, end=end)
+        else:
+            df = await source_session.run_sync(data_source.kline, n_folds=n_folds, start=start, end=end)
+    except Exception as e:
+        logging.exception(e)
+    return save_kl_key, df
+
+
+async def _kl_df_dict_async(symbols, n_folds, start, end, n_jobs):
+    """异步批量获取的协程入口，返回值与ABuSymbolPd._kl_df_dict_parallel一致"""
+    source = kline_source()
+    with ThreadPoolExecutor(max_workers=n_jobs) as executor:
+        source_session = AbuAsyncSourceSession(source, executor)
+        try:
+            temp_symbols = list()
+            for symbol in symbols:
+                if isinstance(symbol, six.string_types):
+                    symbol = code_to_symbol(symbol, rs=False)
+                if isinstance(symbol, Symbol):
+                    temp_symbols.append(symbol)
+
+            df_dict = dict()
+            tasks = [_fetch_kl_df(source_session, source, temp_symbol, n_folds, start, end)
+                     for temp_symbol in temp_symbols]
+            with AbuProgress(len(tasks), 0, label='kl_df async') as progress:
+                for epoch, task in enumerate(asyncio.as_completed(tasks)):
+                    save_kl_key, df = await task
+                    # key=请求symbol的str对象，value＝(save_kl_key: 提供外部进行保存, df: 金融时间序列pd.DataFrame对象)
+                    df_dict[save_kl_key[0].value] = (save_kl_key, df)
+                    progress.show(epoch + 1)
+            return df_dict
+        finally:
+            await source_session.close()
+
+
+def kl_df_dict_async(symbols, n_folds=2, start=None, end=None, n_jobs=16):
+    """
+    异步批量从网络获取金融时间序列，不进行本地保存，由外部统一保存
+    :param symbols: symbol序列
+    :param n_folds: 请求几年的历史回测数据int
+    :param start: 请求的开始日期 str对象
+    :param end: 请求的结束日期 str对象
+    :param n_jobs: 同步请求以及同步kline使用的线程池线程数量
+    :return: df_dict字典中key=请求symbol的str对象，value＝(save_kl_key: 提供外部进行保存, df: 金融时间序列pd.DataFrame对象)
+    """
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(_kl_df_dict_async(symbols, n_folds, start, end, n_jobs))
+    finally:
+        loop.close()
@@ -40,6 +40,25 @@ source_dict = {EMarketSourceType.E_MARKET_SOURCE_bd.value: BDApi,
                EMarketSourceType.E_MARKET_SOURCE_hb_tc.value: HBApi}
 
 
+def kline_source():
+    """
+    当前env设置对应的数据源类，没有设置私有数据源使用内置示例测试源
+    :return: BaseMarket的子类，非实例化对象
+    """
+    if ABuEnv.g_private_data_source is None:
+        # 如果没有设置私有数据源，使用env中设置的内置示例测试源
+        return source_dict[ABuEnv.g_market_source.value]
+
+    # 有设置私有数据源
+    source = ABuEnv.g_private_data_source
+    # 私有源首先设置的需要是class类型，然后判断是BaseMarket的子类
+    if not isinstance(source, six.class_types):
+        raise TypeError('g_private_data_source must be a class type!!!')
+    if not issubclass(ABuEnv.g_private_data_source, BaseMarket):
+        raise TypeError('g_private_data_source must be a subclass of BaseMarket!!!')
+    return source
+
+
 def _calc_start_end_date(df, force_local, n_folds, start, end):
     """
     根据参数计算start，end
@@ -124,17 +143,7 @@ def kline_pd(symbol, data_mode, n_folds=2, start=None, end=None, save=True):
             temp_symbol = code_to_symbol(symbol)
         else:
             raise TypeError('symbol must like as "usTSLA" or "TSLA" or Symbol(MType.US, "TSLA")')
-        if ABuEnv.g_private_data_source is None:
-            # 如果没有设置私有数据源，使用env中设置的内置示例测试源
-            source = source_dict[ABuEnv.g_market_source.value]
-        else:
-            # 有设置私有数据源
-            source = ABuEnv.g_private_data_source
-            # 私有源首先设置的需要是class类型，然后判断是BaseMarket的子类
-            if not isinstance(source, six.class_types):
-                raise TypeError('g_private_data_source must be a class type!!!')
-            if not issubclass(ABuEnv.g_private_data_source, BaseMarket):
-                raise TypeError('g_private_data_source must be a subclass of BaseMarket!!!')
+        source = kline_source()
         temp_symbol.source = source
         # 如果外部负责保存，就需要save_kl_key中相关信息
         save_kl_key = (temp_symbol, None, None)
@@ -14,6 +14,7 @@ import pandas as pd
 
 from ..UtilBu import ABuFileUtil
 from ..CoreBu import ABuEnv
+from ..CoreBu import ABuParallel
 from ..CoreBu.ABuDeprecated import AbuDeprecated
 from ..CoreBu.ABuEnv import EMarketTargetType, EMarketSubType
 # noinspection PyUnresolvedReferences
@@ -102,6 +103,23 @@ def split_k_market(k_split, market_symbols=None, market=None):
     return symbols
 
 
+def split_k_task(n_process, market_symbols):
+    """
+    根据ABuParallel.g_task_split_k将market_symbols切分为并行任务序列，g_task_split_k=1时与split_k_market
+    切分为n_process份的方式一致，大于1时切分为更细粒度的任务，由进程池中的空闲进程动态获取执行
+    :param n_process: 并行进程数int
+    :param market_symbols: 待切割的原始symbols序列
+    :return: (实际需要启动的并行进程数, 切割好的任务序列)
+    """
+    task_split_k = max(int(ABuParallel.g_task_split_k), 1)
+    tasks = split_k_market(n_process * task_split_k, market_symbols=market_symbols)
+    if task_split_k == 1:
+        # 因为切割会有余数，所以将原始设置的进程数切换为分割好的个数, 即32 -> 33 16 -> 17
+        return len(tasks), tasks
+    # 细粒度任务切分时进程数不需要超过任务数
+    return min(n_process, len(tasks)), tasks
+
+
 def choice_symbols(count, market_symbols=None, market=None):
     """
     在market_symbols中随机选择count个symbol，不放回随机的抽取方式
@@ -16,7 +16,7 @@ from .ABuDataSource import kline_pd
 from ..MarketBu.ABuDataCache import save_kline_df, check_csv_local
 from ..MarketBu.ABuSymbol import code_to_symbol
 from .ABuSymbol import Symbol
-from .ABuMarket import split_k_market
+from .ABuMarket import split_k_task
 from ..CoreBu import ABuEnv
 from ..CoreBu.ABuEnv import EMarketDataFetchMode, EDataCacheType
 from ..CoreBu.ABuFixes import partial, ThreadPoolExecutor
@@ -119,6 +119,17 @@ def _make_kl_df(symbol, data_mode, n_folds, start, end, benchmark, save):
     :return: (df: 金融时间序列pd.DataFrame对象，save_kl_key: 提供外部进行保存)
     """
     df, save_kl_key = kline_pd(symbol, data_mode, n_folds=n_folds, start=start, end=end, save=save)
+    return _fix_kl_df(df, save_kl_key, benchmark), save_kl_key
+
+
+def _fix_kl_df(df, save_kl_key, benchmark):
+    """
+    对数据源或者本地缓存返回的金融时间序列进行标尺切割，去重，atr计算，key计算
+    :param df: 金融时间序列pd.DataFrame对象
+    :param save_kl_key: (Symbol对象, start_int, end_int)
+    :param benchmark: 资金回测时间标尺，AbuBenchmark实例对象
+    :return: 处理后的金融时间序列pd.DataFrame对象
+    """
     if df is not None and df.shape[0] == 0:
         # 把行数＝0的归结为＝None, 方便后续统一处理
         df = None
@@ -139,7 +150,7 @@ def _make_kl_df(symbol, data_mode, n_folds, start, end, benchmark, save):
         df['key'] = list(range(0, len(df)))
         temp_symbol = save_kl_key[0]
         df.name = temp_symbol.value
-    return df, save_kl_key
+    return df
 
 
 def _kl_df_dict_parallel(choice_symbols, data_mode, n_folds, start, end, benchmark):
@@ -182,20 +193,18 @@ def kl_df_dict_parallel(symbols, data_mode=ABuEnv.EMarketDataSplitMode.E_DATA_SP
     :param benchmark: 资金回测时间标尺，AbuBenchmark实例对象
     :param n_jobs: 并行的任务数，对于进程代表进程数，线程代表线程数
     :param save: 是否统一进行批量保存，即在批量获取金融时间序列后，统一进行批量保存，默认True
-    :param how: process：多进程，thread：多线程，main：单进程单线程
+    :param how: process：多进程，thread：多线程，main：单进程单线程，async：异步网络请求（只针对强制网络获取数据）
     """
 
     # TODO Iterable和six.string_types的判断抽出来放在一个模块，做为Iterable的判断来使用
     if not isinstance(symbols, Iterable) or isinstance(symbols, six.string_types):
         # symbols必须是可迭代的序列对象
         raise TypeError('symbols must a Iterable obj!')
-    # 可迭代的symbols序列分成n_jobs个子序列
-    parallel_symbols = split_k_market(n_jobs, market_symbols=symbols)
+    # 可迭代的symbols序列切分为子序列任务，默认n_jobs个子序列
+    n_jobs, parallel_symbols = split_k_task(n_jobs, symbols)
     # 使用partial对并行函数_kl_df_dict_parallel进行委托
     parallel_func = partial(_kl_df_dict_parallel, data_mode=data_mode, n_folds=n_folds, start=start, end=end,
                             benchmark=benchmark)
-    # 因为切割会有余数，所以将原始设置的进程数切换为分割好的个数, 即32 -> 33 16 -> 17
-    n_jobs = len(parallel_symbols)
     if how == 'process':
         """
             mac os 10.9 以后的并行加上numpy不是crash就是进程卡死，不要用，用thread
@@ -219,6 +228,15 @@ def kl_df_dict_parallel(symbols, data_mode=ABuEnv.EMarketDataSplitMode.E_DATA_SP
     elif how == 'main':
         # 单进程单线程
         df_dicts = [parallel_func(symbols) for symbols in parallel_symbols]
+    elif how == 'async':
+        if ABuEnv.g_data_fetch_mode != EMarketDataFetchMode.E_DATA_FETCH_FORCE_NET:
+            raise ValueError('async only support E_DATA_FETCH_FORCE_NET!')
+        # 异步模块只支持python3，局部引用
+        from .ABuDataFeedAsync import kl_df_dict_async
+        df_dict = kl_df_dict_async(symbols, n_folds=n_folds, start=start, end=end, n_jobs=n_jobs)
+        # 与_make_kl_df一致进行标尺切割，去重，atr等处理
+        df_dicts = [{symbol: (key_tuple, _fix_kl_df(df, key_tuple, benchmark))
+                     for symbol, (key_tuple, df) in df_dict.items()}]
     else:
         raise TypeError('ONLY process OR thread!')
 
@@ -16,21 +16,40 @@ import numpy as np
 from ..TradeBu.ABuBenchmark import AbuBenchmark
 from ..TradeBu.ABuCapital import AbuCapital
 from ..TradeBu.ABuKLManager import AbuKLManager
+from ..TradeBu.ABuPickTimeMemo import pick_time_memo
 from .ABuMetricsScore import AbuScoreTuple, WrsmScorer, make_scorer
 from ..AlphaBu.ABuPickStockMaster import AbuPickStockMaster
 from ..AlphaBu.ABuPickTimeMaster import AbuPickTimeMaster
+from ..AlphaBu.ABuPickTimeWorker import vectorized_task
 from ..CoreBu.ABuEnvProcess import add_process_env_sig, AbuEnvProcess
 from ..CoreBu.ABuParallel import delayed, Parallel
 from ..CoreBu import ABuEnv
 from ..CoreBu.ABuEnv import EMarketDataFetchMode
 from ..UtilBu.ABuProgress import AbuMulPidProgress
-from ..MarketBu.ABuMarket import split_k_market
+from ..MarketBu.ABuMarket import split_k_task, all_symbol
 from ..MarketBu.ABuDataCheck import check_symbol_data
 from ..UtilBu import ABuProgress
 
 __author__ = '阿布'
 __weixin__ = 'abu_quant'
 
+"""
+    grid search中是否开启择时共享缓存，默认开启，开启后同一个进程中的所有因子组合共享combine_kl_pd，
+    交易特征，以及向量化择时模式下相同参数买入因子的买入信号，详见ABuPickTimeMemo
+    eg:
+        abupy.MetricsBu.ABuGridSearch.g_enable_grid_memo = False
+"""
+g_enable_grid_memo = True
+
+"""
+    grid search中是否使用向量化择时模式，默认开启，与全局的ABuPickTimeWorker.g_vectorized_task设置无关，
+    买入信号只在向量化择时模式下计算，开启后择时共享缓存才能在因子组合之间复用买入信号，
+    关闭后使用全局的g_vectorized_task设置
+    eg:
+        abupy.MetricsBu.ABuGridSearch.g_grid_vectorized_task = False
+"""
+g_grid_vectorized_task = True
+
 
 class ParameterGrid(object):
     """参数进行product辅助生成类"""
@@ -125,6 +144,23 @@ def grid_search_mul_process(read_cash, benchmark, factors, choice_symbols, kl_pd
     :param kl_pd_manager: 金融时间序列管理对象，AbuKLManager实例
     :return: AbuScoreTuple对象
     """
+    if g_grid_vectorized_task:
+        with vectorized_task():
+            return _grid_search_memo(read_cash, benchmark, factors, choice_symbols, kl_pd_manager)
+    return _grid_search_memo(read_cash, benchmark, factors, choice_symbols, kl_pd_manager)
+
+
+def _grid_search_memo(read_cash, benchmark, factors, choice_symbols, kl_pd_manager):
+    """根据g_enable_grid_memo开启择时共享缓存，参数与grid_search_mul_process一致"""
+    if g_enable_grid_memo:
+        # 同一个进程中的所有因子组合共享择时缓存，退出时释放
+        with pick_time_memo():
+            return _grid_search_factors(read_cash, benchmark, factors, choice_symbols, kl_pd_manager)
+    return _grid_search_factors(read_cash, benchmark, factors, choice_symbols, kl_pd_manager)
+
+
+def _grid_search_factors(read_cash, benchmark, factors, choice_symbols, kl_pd_manager):
+    """grid_search_mul_process中依次对factors中的每一个因子组合进行回测，参数与grid_search_mul_process一致"""
     # 由于grid_search_mul_process以处于多任务运行环境，所以不内部不再启动多任务，使用1个进程选股
     n_process_pick_stock = 1
     # 由于grid_search_mul_process以处于多任务运行环境，所以不内部不再启动多任务，使用1个进程择时
@@ -284,7 +320,7 @@ class GridSearch(object):
 
     @classmethod
     def grid_search(cls, choice_symbols, buy_factors, sell_factors, read_cash=10000000,
-                    score_weights=None, metrics_class=None):
+                    score_weights=None, metrics_class=None, halving=False):
         """
         类方法: 不gird选股因子，只使用买入因子和卖出因子序列的gird product行为
         :param choice_symbols: 初始备选交易对象序列
@@ -293,6 +329,7 @@ class GridSearch(object):
         :param read_cash: 初始化资金数(int), 默认10000000
         :param score_weights: make_scorer中设置的评分权重
         :param metrics_class: make_scorer中设置的度量类
+        :param halving: 是否使用fit_halving逐轮减半寻找最优参数组合，默认False，即fit回测所有组合
         """
 
         scores = None
@@ -347,7 +384,11 @@ class GridSearch(object):
             gs = cls(read_cash, choice_symbols, buy_factors_product=buy_factors_product,
                      sell_factors_product=sell_factors_product, score_weights=score_weights,
                      metrics_class=metrics_class)
-            scores, score_tuple_array = gs.fit(n_jobs=-1)
+            if halving:
+                scores, score_tuple_array = gs.fit_halving(n_jobs=-1)
+                logging.info(u'逐轮减半节省交易对象回测{}次'.format(gs.saved_backtest_cnt))
+            else:
+                scores, score_tuple_array = gs.fit(n_jobs=-1)
             best_score_tuple_grid = gs.best_score_tuple_grid
             from ..MetricsBu.ABuMetricsBase import AbuMetricsBase
             logging.info(u'最佳买入因子参数组合：{}'.format(best_score_tuple_grid.buy_factors))
@@ -399,6 +440,107 @@ class GridSearch(object):
                                                          n_process=ABuEnv.g_cpu_cnt if len(need_batch_gen) > 40 else 1)
             pass_kl_pd_manager = self.kl_pd_manager
 
+        factors_product = self._factors_product()
+        score_tuple_array = self._fit_factors(factors_product, self.choice_symbols, pass_kl_pd_manager, n_jobs)
+        # 使用ABuMetricsScore中make_scorer对多个参数组合的交易结果进行评分，详情阅读ABuMetricsScore模块
+        scores = make_scorer(score_tuple_array, score_class, weights=self.score_weights,
+                             metrics_class=self.metrics_class)
+        # 评分结果最好的赋予best_score_tuple_grid
+        self.best_score_tuple_grid = score_tuple_array[scores.index[-1]]
+        return scores, score_tuple_array
+
+    def fit_halving(self, score_class=WrsmScorer, n_jobs=-1, eta=3, min_symbols=None, random_state=0):
+        """
+        逐轮减半方式寻找最优因子参数组合：第一轮所有因子组合只在少量交易对象上回测，按照评分保留前1/eta的组合，
+        下一轮交易对象数量扩大eta倍，直到最后一轮在全部交易对象上回测剩余的组合，相比fit节省大部分回测
+
+        :param score_class: 对回测结果进行评分的评分类，AbuBaseScorer类型，非对象，只传递类信息
+        :param n_jobs: 默认回测并行的任务数，默认-1, 即启动与cpu数量相同的进程数
+        :param eta: 每一轮保留1/eta的因子组合，交易对象数量扩大eta倍，默认3
+        :param min_symbols: 第一轮最少的交易对象数量，默认None，即使用eta
+        :param random_state: 每一轮交易对象子集的随机种子，子集为同一个随机排列的前n个交易对象，逐轮嵌套
+        :return: (scores: 最后一轮的评分结果，没有有效交易结果时为None， score_tuple_array: 最后一轮的因子组合序列)，
+                 每一轮的信息保存在self.halving_rounds，节省的交易对象回测数量self.saved_backtest_cnt
+        """
+        if eta < 2:
+            raise ValueError('eta must >= 2!')
+        # 与选股一致，choice_symbols为None时使用全市场symbol
+        symbols = list(all_symbol() if self.choice_symbols is None else self.choice_symbols)
+        min_symbols = eta if min_symbols is None else min_symbols
+        factors_product = self._factors_product()
+
+        # 减半轮数：因子组合数量和交易对象数量都需要能够支持每一轮eta倍的变化
+        n_rounds = 0
+        while eta ** (n_rounds + 1) <= len(factors_product) and \
+                len(symbols) / eta ** (n_rounds + 1) >= min_symbols:
+            n_rounds += 1
+
+        # 所有轮次使用同一个随机排列，每一轮的交易对象是下一轮的子集
+        symbols = list(np.random.RandomState(random_state).permutation(symbols))
+
+        pass_kl_pd_manager = None
+        if len(self.stock_pickers_product) == 1 and self.stock_pickers_product[0] is None:
+            # 与fit一致，没有设置选股因子时外层统一进行交易数据收集，所有轮次共享
+            need_batch_gen = self.kl_pd_manager.filter_pick_time_choice_symbols(symbols)
+            self.kl_pd_manager.batch_get_pick_time_kl_pd(need_batch_gen,
+                                                         n_process=ABuEnv.g_cpu_cnt if len(need_batch_gen) > 40 else 1)
+            pass_kl_pd_manager = self.kl_pd_manager
+
+        self.halving_rounds = list()
+        backtest_cnt = 0
+        scores = score_tuple_array = None
+        for round_ind in range(n_rounds + 1):
+            # 最后一轮使用全部交易对象
+            round_symbols = symbols[:int(np.ceil(len(symbols) / eta ** (n_rounds - round_ind)))]
+            score_tuple_array = self._fit_factors(factors_product, round_symbols, pass_kl_pd_manager, n_jobs)
+            backtest_cnt += len(factors_product) * len(round_symbols)
+            metrics_array = self._score_metrics(score_tuple_array)
+            # 所有因子组合在这一轮的交易对象上都没有可度量的交易结果时无法评分，make_scorer会失败，
+            # 度量对象传递给评分类使用，不再重复构造
+            scores = make_scorer(score_tuple_array, score_class, weights=self.score_weights,
+                                 metrics_class=self.metrics_class, metrics_array=metrics_array) \
+                if any(metrics.valid for metrics in metrics_array) else None
+            self.halving_rounds.append({'factors_cnt': len(factors_product), 'symbols_cnt': len(round_symbols),
+                                        'scores': scores})
+            logging.info(u'第{}轮: {}种因子组合, {}个交易对象'.format(round_ind + 1, len(factors_product),
+                                                             len(round_symbols)))
+            if round_ind == n_rounds:
+                break
+            if scores is None:
+                # 没有评分无法淘汰，保留全部因子组合进入交易对象更多的下一轮
+                logging.info(u'第{}轮没有有效交易结果, 保留全部因子组合'.format(round_ind + 1))
+                continue
+            # 没有有效交易结果的组合不在scores中，排在最后，保留评分最高的1/eta个组合
+            keep_cnt = max(int(np.ceil(len(factors_product) / eta)), 1)
+            no_score = [ind for ind in range(len(factors_product)) if ind not in scores.index]
+            rank_inds = list(scores.index[::-1]) + no_score
+            factors_product = [factors_product[ind] for ind in rank_inds[:keep_cnt]]
+
+        # 与fit在全部交易对象上回测所有因子组合相比节省的交易对象回测数量
+        self.saved_backtest_cnt = len(self._factors_product()) * len(symbols) - backtest_cnt
+        logging.info(u'逐轮减半共回测{}次, 节省{}次'.format(backtest_cnt, self.saved_backtest_cnt))
+        if scores is not None and len(scores) > 0:
+            self.best_score_tuple_grid = score_tuple_array[scores.index[-1]]
+        return scores, score_tuple_array
+
+    def _score_metrics(self, score_tuple_array):
+        """与AbuBaseScorer一致使用metrics_class构造score_tuple_array中每一个交易结果的度量对象"""
+        from ..MetricsBu.ABuMetricsBase import AbuMetricsBase
+        metrics_class = self.metrics_class if self.metrics_class is not None and issubclass(
+            self.metrics_class, AbuMetricsBase) else AbuMetricsBase
+        return [metrics_class(score_tuple.orders_pd, score_tuple.action_pd, score_tuple.capital,
+                              score_tuple.benchmark) for score_tuple in score_tuple_array]
+
+    def _factors_product(self):
+        """买入因子，卖出因子，选股因子的product组合序列"""
+        return [{'buy_factors': item[0], 'sell_factors': item[1], 'stock_pickers': item[2]} for item in
+                product(self.buy_factors_product, self.sell_factors_product, self.stock_pickers_product)]
+
+    def _fit_factors(self, factors_product, choice_symbols, pass_kl_pd_manager, n_jobs):
+        """
+        多任务对factors_product中的每一个因子组合在choice_symbols上进行回测
+        :return: AbuScoreTuple对象序列，与factors_product一一对应
+        """
         if n_jobs <= 0:
             # 因为下面要根据n_jobs来split_k_market
             n_jobs = ABuEnv.g_cpu_cnt
@@ -410,13 +552,8 @@ class GridSearch(object):
             logging.info('batch get only support E_DATA_FETCH_FORCE_LOCAL for Parallel!')
             n_jobs = 1
 
-        factors_product = [{'buy_factors': item[0], 'sell_factors': item[1], 'stock_pickers': item[2]} for item in
-                           product(self.buy_factors_product, self.sell_factors_product, self.stock_pickers_product)]
-
-        # 将factors切割为n_jobs个子序列，这样可以每个进程处理一个子序列
-        process_factors = split_k_market(n_jobs, market_symbols=factors_product)
-        # 因为切割会有余数，所以将原始设置的进程数切换为分割好的个数, 即32 -> 33 16 -> 17
-        n_jobs = len(process_factors)
+        # 将factors切割为子序列任务，默认n_jobs个子序列，这样可以每个进程处理一个子序列
+        n_jobs, process_factors = split_k_task(n_jobs, factors_product)
         parallel = Parallel(
             n_jobs=n_jobs, verbose=0, pre_dispatch='2*n_jobs')
         # 多任务环境下的内存环境拷贝对象AbuEnvProcess
@@ -424,16 +561,10 @@ class GridSearch(object):
         # 多层迭代各种类型因子，没一种因子组合作为参数启动一个新进程，运行grid_search_mul_process
         out_abu_score_tuple = parallel(
             delayed(grid_search_mul_process)(self.read_cash, self.benchmark, factors,
-                                             self.choice_symbols, pass_kl_pd_manager, env=p_nev)
+                                             choice_symbols, pass_kl_pd_manager, env=p_nev)
             for factors in process_factors)
 
         # 都完事时检测一下还有没有ui进度条
         ABuProgress.do_check_process_is_dead()
         # 返回的AbuScoreTuple序列转换score_tuple_array, 即摊开多个子结果序列eg: ([], [], [], [])->[]
-        score_tuple_array = list(chain.from_iterable(out_abu_score_tuple))
-        # 使用ABuMetricsScore中make_scorer对多个参数组合的交易结果进行评分，详情阅读ABuMetricsScore模块
-        scores = make_scorer(score_tuple_array, score_class, weights=self.score_weights,
-                             metrics_class=self.metrics_class)
-        # 评分结果最好的赋予best_score_tuple_grid
-        self.best_score_tuple_grid = score_tuple_array[scores.index[-1]]
-        return scores, score_tuple_array
+        return list(chain.from_iterable(out_abu_score_tuple))
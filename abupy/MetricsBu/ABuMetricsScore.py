@@ -44,7 +44,8 @@ class AbuBaseScorer(six.with_metaclass(ABCMeta, object)):
     def __init__(self, score_tuple_array, *arg, **kwargs):
         """
         :param score_tuple_array: 承接GridSearch返回的AbuScoreTuple对象序列
-        :param kwargs: 可选weights代表评分项权重， 可选metrics_class代表交易目标度量类
+        :param kwargs: 可选weights代表评分项权重， 可选metrics_class代表交易目标度量类，
+                       可选metrics_array代表与score_tuple_array一一对应的已经构造的度量对象，不再重复构造
         """
         self.score_tuple_array = score_tuple_array
         self.score_dict = {}
@@ -71,11 +72,12 @@ class AbuBaseScorer(six.with_metaclass(ABCMeta, object)):
         else:
             self.metrics_class = AbuMetricsBase
 
+        metrics_array = kwargs.get('metrics_array', None)
         valid_score_tuple_array = []
         for ind, score_tuple in enumerate(self.score_tuple_array):
             # 一个一个的进行度量
-            metrics = self.metrics_class(score_tuple.orders_pd, score_tuple.action_pd, score_tuple.capital,
-                                         score_tuple.benchmark)
+            metrics = metrics_array[ind] if metrics_array is not None else self.metrics_class(
+                score_tuple.orders_pd, score_tuple.action_pd, score_tuple.capital, score_tuple.benchmark)
             if metrics.valid:
                 metrics.fit_metrics()
                 # 使用子类_init_self_begin中设置的select_score_func方法选取
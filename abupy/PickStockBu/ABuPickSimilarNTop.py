@@ -87,9 +87,10 @@ class AbuPickSimilarNTop(AbuPickStockBase):
         # 选股阶段的金融时间序列第一个个日期作为similar_start
         similar_start = ABuDateUtil.timestamp_to_str(similar_kl_pd.index[0])
         # 通过ABuSimilar模块中的find_similar_with_se计算与交易目标的相似度rank dict
+        # 只需要n_top + 1个结果(第一个是自身)，使用top_cnt只取最相关的部分
         net_cg_ret = find_similar_with_se(self.similar_stock, similar_start, similar_end,
                                           rolling=self.rolling, show=False,
-                                          corr_type=self.corr_type)
+                                          corr_type=self.corr_type, top_cnt=self.n_top + 1)
         # 取相似度结果的n_top个，作为选股结果
         similar_top_choice = [ss[0] for ss in net_cg_ret[1:self.n_top + 1]]
         # 通过集合选取在初始备选交易对象序列和相似度选股序列中的子序列
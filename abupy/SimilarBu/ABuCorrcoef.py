@@ -15,7 +15,6 @@ from enum import Enum
 
 from ..UtilBu import ABuDTUtil
 from ..CoreBu.ABuFixes import rankdata
-from ..CoreBu.ABuPdHelper import pd_rolling_corr
 # noinspection PyUnresolvedReferences
 from ..CoreBu.ABuFixes import zip
 
@@ -42,6 +41,11 @@ class ECoreCorrType(Enum):
 """加权移动相关系数计算默认使用60d"""
 g_rolling_corr_window = 60
 
+# 加权移动相关系数方阵分块计算时每一块标准化窗口矩阵的元素数量上限，限制内存占用
+K_ROLLING_BLOCK_SIZE = 1 << 22
+# 窗口方差与窗口平方均值之比小于此值视为窗口内数值唯一
+K_ROLLING_VAR_EPS = 1e-10
+
 
 def corr_xy(x, y, similar_type=ECoreCorrType.E_CORE_TYPE_PEARS, **kwargs):
     """
@@ -119,7 +123,7 @@ def corr_matrix(df, similar_type=ECoreCorrType.E_CORE_TYPE_PEARS, **kwargs):
 
 
 @ABuDTUtil.consume_time
-def rolling_corr(df, ss=None, window=g_rolling_corr_window):
+def rolling_corr(df, ss=None, window=g_rolling_corr_window, cols=None):
     """
     滑动窗口按时间权重计算相关系数
 
@@ -143,7 +147,9 @@ def rolling_corr(df, ss=None, window=g_rolling_corr_window):
     2015/7/31	-0.05
     ......
     :param window: 窗口大小, 默认值g_rolling_corr_window，即60d
-    :return: 当ss为None时返回df.shape[1]大小的相关系数二维方阵，否则，返回长度为df.shape[1]的相关系数一维数组
+    :param cols: ss为None时可选参数，df中列的序号序列，只计算所有列与cols列的相关系数
+    :return: 当ss为None时返回df.shape[1]大小的相关系数二维方阵，指定cols时为shape(df.shape[1], len(cols))的矩阵，
+             否则，返回长度为df.shape[1]的相关系数一维数组
     """
     if window < 1 or window > df.shape[0]:
         raise TypeError('window out of index, must in [{},{}]'.format(1, df.shape[0]))
@@ -167,41 +173,100 @@ def rolling_corr(df, ss=None, window=g_rolling_corr_window):
         0.0044  0.0044  0.0044  0.0044  0.0044  0.0044  0.0044  0.0044  0.0045
         ........................................0.0045  0.0045  0.0045  0.0045]
     """
-    corr = 0
     if ss is None:
-        # 如果不使用pd_rolling_corr，需要copy，保证df == np.inf的会修改
-        df = df.copy()
-        df[df == np.inf] = 0
-        # 迭代rolling_window下的时间窗口，使用np.corrcoef，比使用pd_rolling_corr效果高很多
-        for (s, e) in rolling_window:
-            # eg. rolling_window第一个即为np.corrcoef(df.iloc[0:60].T)
-            window_corr = np.corrcoef(df.iloc[s:e].T)
-            window_corr[np.isinf(window_corr) | np.isnan(window_corr)] = 0
-            # 当前窗口下的相关系数乘以权重, window_corr * weights[s]为df.shape[1]大小的相关系数二维方阵
-            corr += window_corr * weights[s]
+        # 使用滑动窗口累加和计算每一个窗口的均值，标准差，分块批量计算所有窗口加权相关系数方阵
+        corr = _rolling_corr_matrix(df.values, window, weights, cols=cols)
     else:
-        # 针对两个输入序列使用pd_rolling_corr
-        window_corr = pd_rolling_corr(df, ss, window=window)
-        window_corr.dropna(inplace=True, how='all')
+        # 针对两个输入序列使用滑动窗口累加和一次计算所有窗口，所有列与ss的相关系数，O(T * N)
+        ss = ss.reindex(df.index) if isinstance(ss, pd.Series) else ss
+        x = df.values if df.ndim > 1 else df.values[:, np.newaxis]
+        window_corr = _rolling_corr_target(x, np.asarray(ss, dtype=np.float64), window)
+        # 与pd_rolling_corr(df, ss).dropna(how='all')一致，去掉所有列都是nan的窗口，之后的窗口依次使用weights
+        window_corr = window_corr[~np.all(np.isnan(window_corr), axis=1)]
         """
-            pd_rolling_corr返回的window_corr形如, 即每一个子窗口corr:
-
-            59     0.234309
-            60     0.237821
-            61     0.244905
-            62     0.242731
-            63     0.249227
-            ...............
-            499    0.154148
-            500    0.138837
-            501    0.133806
-            502    0.135788
-            503    0.138762
+            window_corr即每一个子窗口所有列与ss的corr，shape(窗口数量, df.shape[1])
         """
-        window_corr[window_corr == np.inf] = 0
-        for ind in np.arange(window_corr.shape[0]):
-            # 对应天的相关系数 ＊ 对应天的系统权重，长度为df.shape[1]的相关系数一维数组
-            corr += window_corr.iloc[ind] * weights[ind]
+        # 对应天的相关系数 ＊ 对应天的系统权重，长度为df.shape[1]的相关系数一维数组
+        corr = np.sum(window_corr * weights[:window_corr.shape[0], np.newaxis], axis=0)
+        corr = pd.Series(corr, index=df.columns) if df.ndim > 1 else corr[0]
+    return corr
+
+
+def _rolling_sum(x, window):
+    """沿axis=0的滑动窗口累加和，返回shape(x.shape[0] - window + 1, ...)"""
+    cs = np.cumsum(x, axis=0)
+    cs = np.concatenate([np.zeros((1,) + x.shape[1:]), cs], axis=0)
+    return cs[window:] - cs[:-window]
+
+
+def _rolling_moments(x, window):
+    """
+    滑动窗口累加和计算每一个窗口的均值以及方差
+    :param x: np.array，shape(T, N)
+    :param window: 窗口大小
+    :return: (减去整体均值，nan填充0后的x, 窗口均值, 窗口总体方差, 窗口是否数值退化) 后三者shape(T - window + 1, N)，
+             窗口内存在nan，或者方差为0(窗口内数值唯一)即为数值退化
+    """
+    x_nan = np.isnan(x)
+    # 先减去整体均值，降低累加和相减的数值误差，不影响相关系数
+    with np.errstate(invalid='ignore'):
+        col_mean = np.nanmean(x, axis=0) if x_nan.any() else x.mean(axis=0)
+    x = np.where(x_nan, 0, x - np.nan_to_num(col_mean))
+    sx = _rolling_sum(x, window)
+    sxx = _rolling_sum(np.square(x), window)
+    mean = sx / window
+    var = sxx / window - np.square(mean)
+    # 累加和相减后数值唯一的窗口方差为极小值，不一定为0，使用相对阀值判断
+    degenerate = (var <= K_ROLLING_VAR_EPS * sxx / window) | (_rolling_sum(x_nan, window) > 0)
+    return x, mean, var, degenerate
+
+
+def _rolling_corr_target(x, y, window):
+    """
+    滑动窗口累加和(x, y, x², y², xy)计算x的每一列与y在每一个窗口的皮尔逊相关系数
+    :param x: np.array，shape(T, N)
+    :param y: np.array，shape(T,)
+    :param window: 窗口大小
+    :return: np.array，shape(T - window + 1, N)，与pd_rolling_corr一致，窗口内存在nan或者数值唯一的为nan
+    """
+    x, x_mean, x_var, x_degenerate = _rolling_moments(np.asarray(x, dtype=np.float64), window)
+    y, y_mean, y_var, y_degenerate = _rolling_moments(y[:, np.newaxis], window)
+    cov = _rolling_sum(x * y, window) / window - x_mean * y_mean
+    with np.errstate(divide='ignore', invalid='ignore'):
+        window_corr = cov / np.sqrt(x_var * y_var)
+    window_corr[x_degenerate | y_degenerate] = np.nan
+    return window_corr
+
+
+def _rolling_corr_matrix(x, window, weights, cols=None):
+    """
+    分块计算所有窗口相关系数方阵的加权和，与逐个窗口np.corrcoef，inf，nan置0后加权求和一致：
+    每一个窗口使用滑动累加和得到的均值，标准差标准化并乘以sqrt(权重)，一块窗口在时间方向上拼接后
+    一次矩阵乘法得到这一块窗口相关系数方阵的加权和
+    :param x: np.array，shape(T, N)
+    :param window: 窗口大小
+    :param weights: 每一个窗口的权重，shape(T - window + 1,)
+    :param cols: 可选参数，列序号序列，只计算所有列与cols列的相关系数
+    :return: np.array，shape(N, N)，指定cols时shape(N, len(cols))
+    """
+    x = np.array(x, dtype=np.float64)
+    x[x == np.inf] = 0
+    x, mean, var, degenerate = _rolling_moments(x, window)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # 数值退化的窗口对应的相关系数为0，即标准化系数置0
+        scale = np.where(degenerate, 0, 1 / np.sqrt(var)) * np.sqrt(weights / window)[:, np.newaxis]
+
+    n_windows, n_cols = mean.shape
+    cols = np.arange(n_cols) if cols is None else np.asarray(cols)
+    corr = np.zeros((n_cols, len(cols)))
+    block = max(1, K_ROLLING_BLOCK_SIZE // (window * n_cols))
+    offset = np.arange(window)
+    for start in range(0, n_windows, block):
+        ws = np.arange(start, min(start + block, n_windows))
+        # shape(块窗口数量, window, N)，每一个窗口标准化并乘以sqrt(权重)
+        z = (x[ws[:, np.newaxis] + offset] - mean[ws][:, np.newaxis]) * scale[ws][:, np.newaxis]
+        z = z.reshape(-1, n_cols)
+        corr += np.dot(z.T, z[:, cols])
     return corr
 
 
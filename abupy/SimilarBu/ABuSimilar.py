@@ -17,6 +17,8 @@ import pandas as pd
 
 from . import ABuCorrcoef
 from . import ABuSimilarDrawing
+from . import ABuSimilarIndex
+from . import ABuSimilarMatrix
 from .ABuCorrcoef import ECoreCorrType
 from ..TradeBu import AbuBenchmark
 from ..CoreBu import ABuEnv
@@ -35,6 +37,13 @@ from ..UtilBu import ABuProgress
 """进行相似度数据收集并行进程数，IO操作偏多，所以分配多个，默认=cpu个数＊2, windows还是..."""
 g_process_panel_cnt = ABuEnv.g_cpu_cnt * 2 if ABuEnv.g_is_mac_os else ABuEnv.g_cpu_cnt
 
+"""
+    是否使用持久化的全市场涨跌幅矩阵，默认开启，关闭后每一次都多进程读取全市场数据组装涨跌幅pd.DataFrame对象
+    eg:
+        abupy.SimilarBu.ABuSimilar.g_enable_change_matrix = False
+"""
+g_enable_change_matrix = True
+
 
 def from_local(func):
     """
@@ -88,7 +97,7 @@ def from_net(func):
 
 @from_local
 def _find_similar(symbol, cmp_cnt=None, n_folds=2, start=None, end=None, show_cnt=None, rolling=False,
-                  show=True, corr_type=ECoreCorrType.E_CORE_TYPE_PEARS):
+                  show=True, corr_type=ECoreCorrType.E_CORE_TYPE_PEARS, top_cnt=None):
     """
     被from_local装饰器装饰 即强制走本地数据，获取全市场symbol涨跌幅度pd.DataFrame对象，
     使用symbol涨跌幅度与全市场symbol涨跌幅度进行相关对比，可视化结果及信息
@@ -101,6 +110,7 @@ def _find_similar(symbol, cmp_cnt=None, n_folds=2, start=None, end=None, show_cn
     :param rolling: 是否使用时间加权相关计算，与corr_type=ECoreCorrType.E_CORE_TYPE_ROLLING一样，单独拿出来了
     :param show: 是否可视化最终top最相关的股票
     :param corr_type: ECoreCorrType对象，暂时支持皮尔逊，斯皮尔曼，＋－符号相关系数，移动时间加权相关系数
+    :param top_cnt: 只返回最相关的top_cnt个结果(包括symbol自身)，默认None返回全市场排序结果
     """
     if isinstance(symbol, Symbol):
         # 如果传递的时Symbol对象，取value
@@ -118,12 +128,12 @@ def _find_similar(symbol, cmp_cnt=None, n_folds=2, start=None, end=None, show_cn
     do_clear_output()
     # 开始使用symbol涨跌幅度与全市场symbol涨跌幅度进行相关对比，可视化结果及信息
     sorted_corr = _handle_market_change_df(market_change_df, cmp_cnt, benchmark_df, show_cnt,
-                                           corr_type, rolling, show)
+                                           corr_type, rolling, show, top_cnt=top_cnt)
     return sorted_corr
 
 
 def find_similar_with_se(symbol, start, end, show_cnt=10, rolling=False, show=True,
-                         corr_type=ECoreCorrType.E_CORE_TYPE_PEARS):
+                         corr_type=ECoreCorrType.E_CORE_TYPE_PEARS, top_cnt=None):
     """
     固定参数使用start, end参数提供时间范围规则，套接_find_similar，为_find_similar提供时间范围规则
     :param symbol: 外部指定目标symbol，str对象
@@ -133,10 +143,11 @@ def find_similar_with_se(symbol, start, end, show_cnt=10, rolling=False, show=Tr
     :param rolling: 是否使用时间加权相关计算，与corr_type=ECoreCorrType.E_CORE_TYPE_ROLLING一样，单独拿出来了
     :param show: 是否可视化最终top最相关的股票
     :param corr_type: ECoreCorrType对象，暂时支持皮尔逊，斯皮尔曼，＋－符号相关系数，移动时间加权相关系数
+    :param top_cnt: 只返回最相关的top_cnt个结果(包括symbol自身)，默认None返回全市场排序结果
     :return:
     """
     return _find_similar(symbol, start=start, end=end, show_cnt=show_cnt, rolling=rolling, show=show,
-                         corr_type=corr_type)
+                         corr_type=corr_type, top_cnt=top_cnt)
 
 
 def find_similar_with_folds(symbol, n_folds=2, show_cnt=10, rolling=False, show=True,
@@ -237,6 +248,14 @@ def _net_cg_df_create(symbol, benchmark):
     :param benchmark: 进行数据收集使用的标尺对象，数据时间范围确定使用，AbuBenchmark实例对象
     :return: 全市场symbol涨跌幅度pd.DataFrame对象
     """
+    if g_enable_change_matrix:
+        # 使用标尺的交易日对全市场涨跌幅矩阵切片
+        matrix = ABuSimilarMatrix.market_change_matrix(benchmark)
+        change_df = matrix.change_df(benchmark)
+        if symbol not in matrix.meta['market_symbols']:
+            # 与下面一致，标尺symbol不在市场中单独组装
+            change_df = pd.concat([change_df, _make_benchmark_cg_df(symbol, benchmark)], axis=1)
+        return change_df
 
     # 获取全市场symbol，没有指定市场参数，即根据env中设置的市场来获取所有市场symbol
     choice_symbols = all_symbol()
@@ -307,7 +326,8 @@ def _all_market_cg(symbol, cmp_cnt=None, n_folds=2, start=None, end=None):
     return all_market_change_df
 
 
-def _handle_market_change_df(market_change_df, cmp_cnt, benchmark_df, show_cnt, corr_type, rolling=True, show=True):
+def _handle_market_change_df(market_change_df, cmp_cnt, benchmark_df, show_cnt, corr_type, rolling=True, show=True,
+                             top_cnt=None):
     """
     使用benchmark_df与全市场market_change_df进行相关系数计算，可视化结果及信息
     :param market_change_df: 全市场symbol涨跌幅度pd.DataFrame对象
@@ -317,6 +337,7 @@ def _handle_market_change_df(market_change_df, cmp_cnt, benchmark_df, show_cnt,
     :param corr_type: ECoreCorrType对象，暂时支持皮尔逊，斯皮尔曼，＋－符号相关系数，移动时间加权相关系数
     :param rolling: 是否使用时间加权相关计算，与corr_type = ECoreCorrType.E_CORE_TYPE_ROLLING一样，单独拿出来了
     :param show: 是否可视化最终top最相关的股票
+    :param top_cnt: 只返回最相关的top_cnt个结果，默认None返回全市场排序结果
     :return:
     """
     # 使用[-cmp_cnt:]再次确定时间序列周期
@@ -331,11 +352,18 @@ def _handle_market_change_df(market_change_df, cmp_cnt, benchmark_df, show_cnt,
         # 时间加权统一使用ABuCorrcoef.rolling_corr单独计算，即使用两个参数方式计算，详见ABuCorrcoef.rolling_corr
         corr_ret = ABuCorrcoef.rolling_corr(market_change_df, benchmark_df)
         corr_ret = pd.Series(corr_ret, index=market_change_df.columns, name=benchmark_df.name)
+        # 对结果进行zip排序，按照相关系统由正相关到负相关排序
+        sorted_ret = sorted(zip(corr_ret.index, corr_ret), key=operator.itemgetter(1), reverse=True)
+        sorted_ret = sorted_ret if top_cnt is None else sorted_ret[:top_cnt]
     else:
-        # 其它加权计算统一使用corr_df计算，即统一使用大矩阵计算相关系数后再拿出benchmark_df对应的相关系数列
-        corr_ret = ABuCorrcoef.corr_matrix(market_change_df, corr_type)[benchmark_df.name]
-    # 对结果进行zip排序，按照相关系统由正相关到负相关排序
-    sorted_ret = sorted(zip(corr_ret.index, corr_ret), key=operator.itemgetter(1), reverse=True)
+        # 其它加权计算统一使用相似度索引，只计算benchmark_df与全市场的相关系数，不计算全市场相关系数方阵
+        index = ABuSimilarIndex.similar_index(market_change_df, corr_type)
+        if top_cnt is not None:
+            sorted_ret = index.top_k(benchmark_df.name, top_cnt)
+        else:
+            corr_ret = index.corr(benchmark_df.name)
+            # 对结果进行zip排序，按照相关系统由正相关到负相关排序
+            sorted_ret = sorted(zip(corr_ret.index, corr_ret), key=operator.itemgetter(1), reverse=True)
     """
         最终sorted_ret为可迭代序列，形如：
         [('usTSLA', 1.0), ('usSINA', 0.45565379371028253), ('usWB', 0.44811939073120288),
@@ -355,7 +383,7 @@ def _handle_market_change_df(market_change_df, cmp_cnt, benchmark_df, show_cnt,
 
 @consume_time
 @from_local
-def multi_corr_df(corr_jobs, cmp_cnt=252, n_folds=None, start=None, end=None):
+def multi_corr_df(corr_jobs, cmp_cnt=252, n_folds=None, start=None, end=None, symbols=None):
     """
     被from_local装饰器装饰 即强制走本地数据，匹配市场对应的benchmark，根据参数
     使用_all_market_cg获取全市场symbol涨跌幅度pd.DataFrame对象change_df使用
@@ -365,6 +393,8 @@ def multi_corr_df(corr_jobs, cmp_cnt=252, n_folds=None, start=None, end=None):
     :param n_folds: 对比n_folds年，int，可选参数
     :param start: 请求的开始日期 str对象，可选参数
     :param end: 请求的结束日期 str对象，可选参数
+    :param symbols: 可选参数，symbol序列，只计算全市场与symbols的相关系数，字典中的相关系数矩阵只有symbols对应的列，
+                    使用相似度索引批量查询，不计算全市场相关系数方阵
     :return: 返回相关系数矩阵组成的字典对象，如下所示 eg：
 
             {'pears':
@@ -426,5 +456,9 @@ def multi_corr_df(corr_jobs, cmp_cnt=252, n_folds=None, start=None, end=None):
     # 根据参数使用_all_market_cg获取全市场symbol涨跌幅度pd.DataFrame对象change_df
     change_df = _all_market_cg(benchmark, cmp_cnt=cmp_cnt, n_folds=n_folds, start=start, end=end)
 
+    if symbols is not None:
+        # 使用相似度索引批量查询symbols对应的列
+        return {corr_job.value: ABuSimilarIndex.similar_index(change_df, corr_job).corr_batch(symbols)
+                for corr_job in corr_jobs}
     # 使用corr_jobs个相关系数计算方法分别计算change_df的相关系数，所有结果组成一个字典返回
     return {corr_job.value: ABuCorrcoef.corr_matrix(change_df, corr_job) for corr_job in corr_jobs}
@@ -0,0 +1,162 @@
+# -*- encoding:utf-8 -*-
+"""
+    相似度查询索引模块，全市场涨跌幅矩阵按相关系数计算方法一次变换并标准化：
+
+    1. 皮尔逊：每一个symbol的涨跌幅减去均值，除以标准差 * sqrt(交易日数量)
+    2. 斯皮尔曼：每一个symbol的涨跌幅先rank，再与皮尔逊一样标准化
+    3. ＋－符号：每一个symbol的涨跌幅先np.sign，再与皮尔逊一样标准化
+
+    标准化后一个symbol与全市场的相关系数即一次矩阵向量乘法，多个symbol批量查询即一次矩阵乘法，
+    top k使用np.argpartition，不需要计算全市场相关系数方阵后只取其中一列，再对整列排序，
+    移动时间加权相关系数使用ABuCorrcoef.rolling_corr只计算查询symbol对应的列
+"""
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from . import ABuCorrcoef
+from .ABuCorrcoef import ECoreCorrType
+from ..CoreBu.ABuFixes import rankdata
+
+__author__ = '阿布'
+__weixin__ = 'abu_quant'
+
+"""
+    缓存的相似度索引数量，key=(相关系数计算方法, 移动加权窗口, 涨跌幅矩阵的时间范围及symbol)
+    eg:
+        abupy.SimilarBu.ABuSimilarIndex.g_similar_index_cache_cnt = 16
+"""
+g_similar_index_cache_cnt = 8
+
+
+class AbuSimilarIndex(object):
+    """全市场相似度查询索引类，查询结果与ABuCorrcoef.corr_matrix(change_df, corr_type)中对应的列一致"""
+
+    def __init__(self, change_df, corr_type=ECoreCorrType.E_CORE_TYPE_PEARS, window=None):
+        """
+        :param change_df: 全市场symbol涨跌幅度pd.DataFrame对象，列为symbol
+        :param corr_type: ECoreCorrType对象，相关系数计算方法
+        :param window: 移动时间加权相关系数的窗口大小，默认ABuCorrcoef.g_rolling_corr_window
+        """
+        # 与corr_matrix一致兼容ECoreCorrType.value
+        self.corr_type = ECoreCorrType(corr_type)
+        self.window = ABuCorrcoef.g_rolling_corr_window if window is None else window
+        self.symbols = change_df.columns
+        self.change_df = change_df
+
+        x = change_df.values.astype(np.float64)
+        if self.corr_type == ECoreCorrType.E_CORE_TYPE_ROLLING:
+            # 移动时间加权相关系数不能变换为向量内积，查询时计算
+            self.norm_x = None
+            return
+        if self.corr_type == ECoreCorrType.E_CORE_TYPE_SPERM:
+            # 与ABuCorrcoef.spearmanr一致，每一列rank后计算皮尔逊相关系数
+            x = np.apply_along_axis(rankdata, 0, x)
+        elif self.corr_type == ECoreCorrType.E_CORE_TYPE_SIGN:
+            x = np.sign(x)
+        x = x - x.mean(axis=0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            # 与np.corrcoef一致，数值唯一的symbol相关系数为nan
+            self.norm_x = (x / np.sqrt(np.sum(np.square(x), axis=0))).T
+
+    def __str__(self):
+        """打印对象显示：相关系数计算方法，symbol数量，交易日数量"""
+        return 'similar index:{}, symbols:{}, days:{}'.format(self.corr_type.value, len(self.symbols),
+                                                             self.change_df.shape[0])
+
+    __repr__ = __str__
+
+    def __contains__(self, symbol):
+        """成员测试：symbol是否在索引中"""
+        return symbol in self.symbols
+
+    def corr_batch(self, symbols):
+        """
+        批量查询symbols与全市场的相关系数，不在索引中的symbol忽略
+        :param symbols: symbol序列，序列中的元素为str对象
+        :return: pd.DataFrame对象，行为全市场symbol，列为查询的symbols
+        """
+        symbols = [symbol for symbol in symbols if symbol in self.symbols]
+        cols = self.symbols.get_indexer(symbols)
+        if self.norm_x is None:
+            corr = ABuCorrcoef.rolling_corr(self.change_df, window=self.window, cols=cols)
+        else:
+            # 一次矩阵乘法，shape(全市场symbol数量, 查询symbol数量)
+            corr = np.clip(np.dot(self.norm_x, self.norm_x[cols].T), -1, 1)
+        return pd.DataFrame(corr, index=self.symbols, columns=symbols)
+
+    def corr(self, symbol):
+        """
+        查询symbol与全市场的相关系数
+        :param symbol: str对象，eg. usTSLA
+        :return: pd.Series对象，index为全市场symbol
+        """
+        return self.corr_batch([symbol])[symbol]
+
+    def top_k_batch(self, symbols, k):
+        """
+        批量查询symbols与全市场相关系数最大的k个symbol(包括symbol自身)
+        :param symbols: symbol序列，序列中的元素为str对象
+        :param k: 返回的symbol数量
+        :return: dict对象，key为查询symbol，value为[(symbol, 相关系数)...]，按相关系数由大到小排序
+        """
+        corr_df = self.corr_batch(symbols)
+        corr = corr_df.values
+        # nan排在最后
+        corr = np.where(np.isnan(corr), -np.inf, corr)
+        k = min(k, corr.shape[0])
+        if k <= 0:
+            return {symbol: list() for symbol in corr_df.columns}
+        top_ind = np.argpartition(-corr, k - 1, axis=0)[:k]
+        top_corr = np.take_along_axis(corr, top_ind, axis=0)
+        # 只对k个结果排序，相关系数相同时按照symbol在市场中的顺序
+        order = np.lexsort((top_ind, -top_corr), axis=0)
+        top_ind = np.take_along_axis(top_ind, order, axis=0)
+
+        ret = dict()
+        for ind, symbol in enumerate(corr_df.columns):
+            ret[symbol] = list(zip(self.symbols[top_ind[:, ind]], corr_df.values[top_ind[:, ind], ind]))
+        return ret
+
+    def top_k(self, symbol, k):
+        """
+        查询symbol与全市场相关系数最大的k个symbol(包括symbol自身)
+        :param symbol: str对象，eg. usTSLA
+        :param k: 返回的symbol数量
+        :return: [(symbol, 相关系数)...]，按相关系数由大到小排序
+        """
+        return self.top_k_batch([symbol], k)[symbol]
+
+
+"""缓存的相似度索引，OrderedDict，最近使用的在最后"""
+_g_similar_index = OrderedDict()
+
+
+def similar_index(change_df, corr_type=ECoreCorrType.E_CORE_TYPE_PEARS, window=None):
+    """
+    获取change_df对应的相似度索引，相同的(相关系数计算方法, 移动加权窗口, 涨跌幅矩阵)复用缓存
+    :param change_df: 全市场symbol涨跌幅度pd.DataFrame对象
+    :param corr_type: ECoreCorrType对象，相关系数计算方法
+    :param window: 移动时间加权相关系数的窗口大小，默认ABuCorrcoef.g_rolling_corr_window
+    :return: AbuSimilarIndex实例
+    """
+    corr_type = ECoreCorrType(corr_type)
+    window = ABuCorrcoef.g_rolling_corr_window if window is None else window
+    key = (corr_type, window, change_df.shape, change_df.index[0], change_df.index[-1],
+           hash(tuple(change_df.columns)))
+    index = _g_similar_index.get(key)
+    # 同样的时间范围及symbol，但涨跌幅数据对象不同，如数据更新后，重新构建
+    if index is None or not (index.change_df is change_df or index.change_df.equals(change_df)):
+        index = AbuSimilarIndex(change_df, corr_type, window)
+        _g_similar_index[key] = index
+    _g_similar_index.pop(key)
+    _g_similar_index[key] = index
+    while len(_g_similar_index) > g_similar_index_cache_cnt:
+        _g_similar_index.popitem(last=False)
+    return index
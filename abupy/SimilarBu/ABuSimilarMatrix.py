@@ -0,0 +1,331 @@
+# -*- encoding:utf-8 -*-
+"""
+    全市场涨跌幅矩阵模块，将市场中所有symbol的p_change按照(交易日, symbol)保存为float32稠密矩阵，
+    读取时内存映射，之后的相似度，相关系数计算只需要使用标尺的交易日对矩阵切片，不需要每一次都
+    多进程读取全市场金融时间序列再pd.concat组装全市场涨跌幅pd.DataFrame对象
+
+    本地数据更新后，通过本地缓存的版本标记只重新读取发生变化的symbol，已有交易日的数据变化时原地重写对应的列，
+    新的交易日追加在矩阵末尾，市场symbol或者symbol数据的开始日期发生变化时才重新生成
+
+    存储结构：
+        market_change/{市场}/p_change.bin   float32涨跌幅矩阵，shape(交易日数量, symbol数量)，没有数据的位置为0
+        market_change/{市场}/valid.bin      uint8矩阵，交易日symbol是否有数据，标尺切割时计算缺失数量使用
+        market_change/{市场}/meta.pkl       交易日序列，symbol序列，每一个symbol数据的开始，结束交易日，本地缓存版本标记等，
+                                            矩阵文件中超出meta交易日数量的数据为中断写入留下的废弃数据
+"""
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+
+from ..CoreBu import ABuEnv
+from ..CoreBu.ABuEnv import EMarketDataSplitMode
+from ..CoreBu.ABuEnvProcess import add_process_env_sig, AbuEnvProcess
+from ..CoreBu.ABuFixes import pickle
+from ..CoreBu.ABuParallel import delayed, Parallel
+from ..MarketBu import ABuSymbolPd
+from ..MarketBu.ABuDataCache import kline_cache_stamps
+from ..MarketBu.ABuMarket import split_k_market, all_symbol
+from ..MarketBu.ABuSymbol import code_to_symbol
+from ..UtilBu import ABuFileUtil, ABuProgress
+
+__author__ = '阿布'
+__weixin__ = 'abu_quant'
+
+# 涨跌幅矩阵文件名称
+K_CHANGE_FN = 'p_change.bin'
+# 数据有效矩阵文件名称
+K_VALID_FN = 'valid.bin'
+# 矩阵信息文件名称
+K_META_FN = 'meta.pkl'
+
+
+@add_process_env_sig
+def _make_symbols_change(symbols):
+    """
+    子进程委托函数，读取symbols中每一个symbol本地缓存的完整金融时间序列
+    :param symbols: 可迭代symbols序列，序列中的元素为str对象
+    :return: dict，symbol -> (交易日序列datetime64[ns], p_change序列, 是否a股)
+    """
+    change_dict = dict()
+    for symbol in symbols:
+        kl_pd = ABuSymbolPd.make_kl_df(symbol, data_mode=EMarketDataSplitMode.E_DATA_SPLIT_UNDO)
+        if kl_pd is None or kl_pd.empty:
+            continue
+        temp_symbol = code_to_symbol(symbol, rs=False)
+        a_stock = temp_symbol is not None and temp_symbol.is_a_stock()
+        change_dict[symbol] = (kl_pd.index.values.astype('datetime64[ns]'),
+                               kl_pd['p_change'].values.astype(np.float32), a_stock)
+    return change_dict
+
+
+class AbuMarketChangeMatrix(object):
+    """全市场涨跌幅矩阵类，一个市场对应一个矩阵文件夹"""
+
+    def __init__(self, matrix_dir):
+        """
+        :param matrix_dir: 矩阵文件夹路径
+        """
+        self.matrix_dir = matrix_dir
+        self.meta = None
+        self.change = None
+        self.valid = None
+        # 本进程中已经检查更新到的交易日，避免标尺交易日超出全市场数据时每一次都重新检查更新
+        self.checked_date = None
+
+    def __str__(self):
+        """打印对象显示：矩阵文件夹，交易日数量，symbol数量"""
+        if self.meta is None:
+            return 'matrix_dir:{}, not load'.format(self.matrix_dir)
+        return 'matrix_dir:{}, shape:({}, {})'.format(self.matrix_dir, self.meta['dates'].shape[0],
+                                                      len(self.meta['symbols']))
+
+    __repr__ = __str__
+
+    def _path(self, fn):
+        """矩阵文件夹中的文件路径"""
+        return os.path.join(self.matrix_dir, fn)
+
+    def load(self):
+        """
+        内存映射方式读取矩阵
+        :return: 矩阵文件存在返回True，否则False
+        """
+        if not ABuFileUtil.file_exist(self._path(K_META_FN)):
+            return False
+        with open(self._path(K_META_FN), 'rb') as meta_file:
+            self.meta = pickle.load(meta_file)
+        shape = (self.meta['dates'].shape[0], len(self.meta['symbols']))
+        if shape[0] * shape[1] == 0:
+            self.change = np.zeros(shape, dtype=np.float32)
+            self.valid = np.zeros(shape, dtype=np.bool_)
+        else:
+            self.change = np.memmap(self._path(K_CHANGE_FN), dtype=np.float32, mode='r', shape=shape)
+            self.valid = np.memmap(self._path(K_VALID_FN), dtype=np.bool_, mode='r', shape=shape)
+        return True
+
+    @staticmethod
+    def _collect_change(symbols):
+        """多进程读取symbols本地缓存的涨跌幅，与ABuSimilar._net_cg_df_create的任务分配一致"""
+        # 局部引用，ABuSimilar中引用本模块
+        from .ABuSimilar import g_process_panel_cnt
+        process_symbols = split_k_market(g_process_panel_cnt, market_symbols=symbols)
+        parallel = Parallel(n_jobs=len(process_symbols), verbose=0, pre_dispatch='2*n_jobs')
+        p_nev = AbuEnvProcess()
+        change_dict_array = parallel(
+            delayed(_make_symbols_change)(choice_symbols, env=p_nev) for choice_symbols in process_symbols)
+        ABuProgress.do_check_process_is_dead()
+
+        change_dict = dict()
+        for sub_dict in change_dict_array:
+            change_dict.update(sub_dict)
+        return change_dict
+
+    def _dump(self, meta, change, valid, append=False):
+        """写入矩阵，append=True时将change，valid作为新的交易日追加在矩阵文件末尾"""
+        ABuFileUtil.ensure_dir(self._path(K_META_FN))
+        # 释放内存映射后再写入
+        self.change = self.valid = None
+        # 追加前的交易日数量，之前追加写入后meta替换前中断，矩阵文件中会有多出的数据，追加前先截断
+        keep_rows = meta['dates'].shape[0] - change.shape[0]
+        for fn, values in ((K_CHANGE_FN, np.ascontiguousarray(change, dtype=np.float32)),
+                           (K_VALID_FN, np.ascontiguousarray(valid, dtype=np.bool_))):
+            with open(self._path(fn), 'r+b' if append else 'wb') as matrix_file:
+                if append:
+                    matrix_file.truncate(keep_rows * len(meta['symbols']) * values.itemsize)
+                    matrix_file.seek(0, os.SEEK_END)
+                matrix_file.write(values.tobytes())
+        # meta最后写入，中断后meta中的交易日数量与矩阵文件不一致时以meta为准
+        tmp_fn = '{}.{}.tmp'.format(self._path(K_META_FN), os.getpid())
+        with open(tmp_fn, 'wb') as meta_file:
+            pickle.dump(meta, meta_file, pickle.HIGHEST_PROTOCOL)
+        getattr(os, 'replace', os.rename)(tmp_fn, self._path(K_META_FN))
+        self.load()
+
+    def _rewrite_columns(self, columns):
+        """
+        原地重写已有交易日中的symbol列，中断后meta中的版本标记没有更新，下一次update会重新读取这些symbol再次重写
+        :param columns: dict，列序号 -> (涨跌幅列, 数据有效列)
+        """
+        shape = (self.meta['dates'].shape[0], len(self.meta['symbols']))
+        self.change = self.valid = None
+        change = np.memmap(self._path(K_CHANGE_FN), dtype=np.float32, mode='r+', shape=shape)
+        valid = np.memmap(self._path(K_VALID_FN), dtype=np.bool_, mode='r+', shape=shape)
+        for col, (change_col, valid_col) in columns.items():
+            change[:, col] = change_col
+            valid[:, col] = valid_col
+        change.flush()
+        valid.flush()
+        del change, valid
+
+    def build(self, symbols=None):
+        """
+        读取全市场本地缓存数据完整生成矩阵
+        :param symbols: 矩阵symbol序列，默认None，即all_symbol()
+        """
+        market_symbols = all_symbol() if symbols is None else list(symbols)
+        # 读取数据之前获取版本标记，读取过程中发生变化的symbol下一次update时重新读取
+        stamps = kline_cache_stamps(market_symbols)
+        change_dict = self._collect_change(market_symbols)
+        symbols = list(change_dict.keys())
+        dates = np.unique(np.concatenate([change_dict[symbol][0] for symbol in symbols])) if len(symbols) > 0 \
+            else np.array([], dtype='datetime64[ns]')
+
+        change = np.zeros((dates.shape[0], len(symbols)), dtype=np.float32)
+        valid = np.zeros((dates.shape[0], len(symbols)), dtype=np.bool_)
+        first = np.empty(len(symbols), dtype='datetime64[ns]')
+        last = np.empty(len(symbols), dtype='datetime64[ns]')
+        for col, symbol in enumerate(symbols):
+            symbol_dates, p_change, _ = change_dict[symbol]
+            rows = np.searchsorted(dates, symbol_dates)
+            # 与AbuSymbolPd._benchmark一致，nan的p_change为0
+            change[rows, col] = np.nan_to_num(p_change)
+            valid[rows, col] = True
+            first[col] = symbol_dates[0]
+            last[col] = symbol_dates[-1]
+
+        meta = {'dates': dates, 'symbols': symbols, 'market_symbols': market_symbols, 'first': first, 'last': last,
+                'a_stock': np.array([change_dict[symbol][2] for symbol in symbols], dtype=np.bool_),
+                'stamps': stamps}
+        self._dump(meta, change, valid)
+
+    def update(self):
+        """
+        本地缓存数据更新后只重新读取版本标记变化的symbol，已有交易日的数据发生变化时原地重写对应的列，
+        新的交易日追加在矩阵末尾，市场symbol，有数据的symbol，或者symbol数据的开始日期发生变化时重新生成，
+        存储模式不支持版本标记时（hdf5）重新读取全部symbol
+        """
+        if not self.load() or self.meta['dates'].shape[0] == 0:
+            self.build()
+            return
+
+        market_symbols = all_symbol()
+        if set(market_symbols) != set(self.meta['market_symbols']):
+            self.build(market_symbols)
+            return
+
+        stamps = kline_cache_stamps(market_symbols)
+        old_stamps = self.meta.get('stamps')
+        if stamps is None or old_stamps is None:
+            update_symbols = market_symbols
+        else:
+            update_symbols = [symbol for symbol in market_symbols if stamps[symbol] != old_stamps.get(symbol)]
+        if len(update_symbols) == 0:
+            return
+
+        change_dict = self._collect_change(update_symbols)
+        symbol_col = {symbol: col for col, symbol in enumerate(self.meta['symbols'])}
+        dates = self.meta['dates']
+        last_date = dates[-1]
+        meta = dict(self.meta)
+        meta['stamps'] = stamps
+        meta['last'] = self.meta['last'].copy()
+        columns = dict()
+        for symbol in update_symbols:
+            if (symbol in symbol_col) != (symbol in change_dict):
+                # 有数据的symbol发生变化，重新生成
+                self.build(market_symbols)
+                return
+            if symbol not in change_dict:
+                continue
+            col = symbol_col[symbol]
+            symbol_dates, p_change, _ = change_dict[symbol]
+            old_mask = symbol_dates <= last_date
+            rows = np.searchsorted(dates, symbol_dates[old_mask])
+            if symbol_dates[0] != self.meta['first'][col] or np.any(dates[rows] != symbol_dates[old_mask]):
+                # 数据开始日期变化，或者已有交易日范围内出现了矩阵中没有的交易日，重新生成
+                self.build(market_symbols)
+                return
+            change_col = np.zeros(dates.shape[0], dtype=np.float32)
+            valid_col = np.zeros(dates.shape[0], dtype=np.bool_)
+            change_col[rows] = np.nan_to_num(p_change[old_mask])
+            valid_col[rows] = True
+            if not np.array_equal(change_col, self.change[:, col]) or not np.array_equal(valid_col,
+                                                                                       self.valid[:, col]):
+                columns[col] = (change_col, valid_col)
+            meta['last'][col] = symbol_dates[-1]
+
+        if len(columns) > 0:
+            self._rewrite_columns(columns)
+
+        new_dates = [symbol_dates[symbol_dates > last_date] for symbol_dates, _, _ in change_dict.values()]
+        new_dates = np.unique(np.concatenate(new_dates)) if len(new_dates) > 0 \
+            else np.array([], dtype='datetime64[ns]')
+        change = np.zeros((new_dates.shape[0], len(symbol_col)), dtype=np.float32)
+        valid = np.zeros((new_dates.shape[0], len(symbol_col)), dtype=np.bool_)
+        for symbol, (symbol_dates, p_change, _) in change_dict.items():
+            new_mask = symbol_dates > last_date
+            if not new_mask.any():
+                continue
+            rows = np.searchsorted(new_dates, symbol_dates[new_mask])
+            change[rows, symbol_col[symbol]] = np.nan_to_num(p_change[new_mask])
+            valid[rows, symbol_col[symbol]] = True
+        meta['dates'] = np.concatenate([self.meta['dates'], new_dates])
+        # 没有新的交易日时只更新meta中的版本标记以及结束交易日
+        self._dump(meta, change, valid, append=True)
+
+    def change_df(self, benchmark):
+        """
+        使用标尺的交易日对矩阵切片，结果与ABuSimilar中使用标尺切割的全市场涨跌幅pd.DataFrame对象一致，
+        即缺失数据过多的symbol被丢弃，缺失的交易日涨跌幅为0
+        :param benchmark: 进行数据收集使用的标尺对象，AbuBenchmark实例对象
+        :return: 全市场symbol涨跌幅度pd.DataFrame对象，float32
+        """
+        bench_index = benchmark.kl_pd.index
+        bench_dates = bench_index.values.astype('datetime64[ns]')
+        dates = self.meta['dates']
+        rows = np.searchsorted(dates, bench_dates)
+        rows = np.minimum(rows, max(dates.shape[0] - 1, 0))
+        # 标尺中矩阵没有的交易日，全部symbol都作为缺失数据
+        in_matrix = dates[rows] == bench_dates if dates.shape[0] > 0 else np.zeros(bench_dates.shape[0], dtype=bool)
+
+        valid = self.valid[rows] & in_matrix[:, np.newaxis]
+        change = np.where(valid, self.change[rows], np.float32(0))
+
+        # 与ABuSymbolPd._benchmark一致的缺失数据丢弃规则
+        bench_cnt = bench_dates.shape[0]
+        nan_cnt = bench_cnt - valid.sum(axis=0)
+        same_end = self.meta['last'] == bench_dates[-1]
+        same_head = self.meta['first'] == bench_dates[0]
+        base_keep_div = np.where(same_end | same_head, 2., 3.)
+        base_keep_div[same_end & same_head] = 1.
+        base_keep_div[self.meta['a_stock']] *= 0.7
+        keep = (nan_cnt < bench_cnt) & ~((nan_cnt > 0) & (nan_cnt > bench_cnt / base_keep_div))
+
+        symbols = np.array(self.meta['symbols'], dtype=object)
+        return pd.DataFrame(change[:, keep], index=bench_index, columns=symbols[keep])
+
+
+"""市场矩阵文件夹路径 -> AbuMarketChangeMatrix实例，同一进程中复用内存映射"""
+_g_change_matrix = dict()
+
+
+def market_change_matrix(benchmark=None):
+    """
+    获取env中设置市场对应的全市场涨跌幅矩阵，矩阵不存在时生成，标尺的最后交易日在矩阵之后时追加更新
+    :param benchmark: 进行数据收集使用的标尺对象，AbuBenchmark实例对象，可选参数
+    :return: AbuMarketChangeMatrix实例
+    """
+    # noinspection PyProtectedMember
+    market = ABuEnv.g_market_target.value if not ABuEnv._g_enable_example_env_ipython \
+        else '{}_example'.format(ABuEnv.g_market_target.value)
+    matrix_dir = os.path.join(ABuEnv.g_project_cache_dir, 'market_change', market)
+    if matrix_dir not in _g_change_matrix:
+        _g_change_matrix[matrix_dir] = AbuMarketChangeMatrix(matrix_dir)
+    matrix = _g_change_matrix[matrix_dir]
+
+    if matrix.meta is None and not matrix.load():
+        logging.info('build market change matrix {}'.format(matrix_dir))
+        matrix.build()
+    elif benchmark is not None and matrix.meta['dates'].shape[0] > 0:
+        bench_end = benchmark.kl_pd.index.values[-1]
+        if bench_end > matrix.meta['dates'][-1] and (matrix.checked_date is None or bench_end > matrix.checked_date):
+            matrix.update()
+            matrix.checked_date = bench_end
+    return matrix
@@ -177,7 +177,8 @@ def calc_similar(symbol, cmp_symbol, sum_rank=None, corr_jobs=(ECoreCorrType.E_C
         tmp_market = ABuEnv.g_market_target
         # 强制把市场设置为一样的
         ABuEnv.g_market_target = cs_symbol.market
-        corr_df_dict = ABuSimilar.multi_corr_df(corr_jobs)
+        # 只需要symbol对应的相关系数列，使用相似度索引查询
+        corr_df_dict = ABuSimilar.multi_corr_df(corr_jobs, symbols=[symbol])
         # 恢复之前的市场
         ABuEnv.g_market_target = tmp_market
         """
@@ -319,7 +320,8 @@ def calc_similar_top(symbol, sum_rank=None, corr_jobs=(ECoreCorrType.E_CORE_TYPE
         tmp_market = ABuEnv.g_market_target
         # 强制把市场设置为一样的
         ABuEnv.g_market_target = cs.market
-        corr_df_dict = ABuSimilar.multi_corr_df(corr_jobs)
+        # 只需要symbol对应的相关系数列，使用相似度索引查询
+        corr_df_dict = ABuSimilar.multi_corr_df(corr_jobs, symbols=[symbol])
         # 恢复之前的市场
         ABuEnv.g_market_target = tmp_market
         """
@@ -429,7 +431,8 @@ def coint_similar(symbol, sum_rank=None, corr_jobs=(ECoreCorrType.E_CORE_TYPE_PE
         tmp_market = ABuEnv.g_market_target
         # 强制把市场设置为一样的
         ABuEnv.g_market_target = cs.market
-        corr_df_dict = ABuSimilar.multi_corr_df(corr_jobs)
+        # 只需要symbol对应的相关系数列，使用相似度索引查询
+        corr_df_dict = ABuSimilar.multi_corr_df(corr_jobs, symbols=[symbol])
         # 恢复之前的市场
         ABuEnv.g_market_target = tmp_market
         """
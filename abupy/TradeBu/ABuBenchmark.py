@@ -8,6 +8,8 @@ from __future__ import print_function
 from __future__ import absolute_import
 from __future__ import division
 
+import copy
+
 from ..CoreBu.ABuEnv import EMarketDataSplitMode, EMarketTargetType
 from ..MarketBu import ABuSymbolPd
 from ..MarketBu.ABuSymbol import IndexSymbol, Symbol
@@ -18,6 +20,9 @@ from ..CoreBu.ABuFixes import six
 __author__ = '阿布'
 __weixin__ = 'abu_quant'
 
+# 基准金融时间序列在共享内存AbuKLArena中的key
+K_BENCHMARK_ARENA_KEY = '__benchmark__'
+
 
 class AbuBenchmark(PickleStateMixin):
     """基准类，混入PickleStateMixin，因为在abu.store_abu_result_tuple会进行对象本地序列化"""
@@ -70,8 +75,28 @@ class AbuBenchmark(PickleStateMixin):
             # 如果基准时间序列都是none，就不要再向下运行了
             raise ValueError('CapitalClass init benchmark kl_pd is None')
 
+    def make_shared_benchmark(self, kl_arena):
+        """
+        构造多进程传递使用的基准对象，序列化时不拷贝kl_pd，子进程unpick时从共享内存kl_arena零拷贝构建
+        :param kl_arena: AbuKLArena实例对象，需要以K_BENCHMARK_ARENA_KEY装载了基准金融时间序列
+        :return: AbuBenchmark实例对象
+        """
+        shared_benchmark = copy.copy(self)
+        shared_benchmark.kl_arena = kl_arena
+        return shared_benchmark
+
+    def __getstate__(self):
+        """共享内存模式下序列化不拷贝kl_pd"""
+        state = super(AbuBenchmark, self).__getstate__()
+        if state.get('kl_arena') is not None:
+            state.pop('kl_pd', None)
+        return state
+
     def unpick_extend_work(self, state):
         """完成 PickleStateMixin中__setstate__结束之前的工作，为kl_pd.name赋予准确的benchmark"""
+        if getattr(self, 'kl_arena', None) is not None and 'kl_pd' not in state:
+            # 共享内存模式下从kl_arena中零拷贝构建基准金融时间序列
+            self.kl_pd = self.kl_arena.get_kl_pd(K_BENCHMARK_ARENA_KEY)
         if isinstance(self.benchmark, Symbol):
             self.kl_pd.name = self.benchmark.value
         elif isinstance(self.benchmark, six.string_types):
@@ -66,82 +66,37 @@ class AbuCapital(PickleStateMixin):
         """对象长度：时序资金对象capital_pd的行数，即self.capital_pd.shape[0]"""
         return self.capital_pd.shape[0]
 
-    def init_k_line(self, a_symbol):
-        """
-        每一个交易对象在时序资金对象capital_pd上都添加对应的call keep（买涨持仓量），call worth（买涨总价值），
-        put keep（买跌持仓量），put worth（买跌总价值）
-        :param a_symbol: symbol str对象
-        """
-
-        # 买涨持仓量
-        call_keep = '_call_keep'
-        if self.capital_pd.columns.tolist().count(a_symbol + call_keep) == 0:
-            self.capital_pd[a_symbol + call_keep] = np.NAN * \
-                                                    self.capital_pd.shape[0]
-        # 买跌持仓量
-        put_keep = '_put_keep'
-        if self.capital_pd.columns.tolist().count(a_symbol + put_keep) == 0:
-            self.capital_pd[a_symbol + put_keep] = np.NAN * \
-                                                   self.capital_pd.shape[0]
-        # 买涨总价值
-        call_worth = '_call_worth'
-        if self.capital_pd.columns.tolist().count(a_symbol + call_worth) == 0:
-            self.capital_pd[a_symbol + call_worth] = np.NAN * \
-                                                     self.capital_pd.shape[0]
-
-        # 买跌总价值
-        put_worth = '_put_worth'
-        if self.capital_pd.columns.tolist().count(a_symbol + put_worth) == 0:
-            self.capital_pd[a_symbol + put_worth] = np.NAN * \
-                                                    self.capital_pd.shape[0]
-
     def apply_init_kl(self, action_pd, show_progress):
         """
-        根据回测交易在时序资金对象capital_pd上新建对应的call，put列
+        根据回测交易在时序资金对象capital_pd上新建对应的call，put列，所有需要新建的列
+        收集后一次性添加，避免逐列插入capital_pd
         :param action_pd: 回测交易行为对象，pd.DataFrame对象
         :param show_progress: 外部设置是否需要显示进度条
         """
         # 使用set筛选唯一的symbol交易序列
         symbols = set(action_pd.symbol)
+        exist_cols = set(self.capital_pd.columns)
+        new_cols = list()
         # 单进程进度条
         with AbuProgress(len(symbols), 0, label='apply_init_kl...') as progress:
             for pos, symbol in enumerate(symbols):
                 if show_progress:
                     progress.show(a_progress=pos + 1)
-                # 迭代symbols，新建对应的call，put列
-                self.init_k_line(symbol)
-
-    def apply_k_line(self, a_k_day, kl_pd, buy_type_head):
-        """
-        在apply_kl中的do_apply_kl方法中时序资金对象capital进行apply的对应方法，
-        即迭代金融时间序列的每一个交易日，根据持仓量计算每一个交易日的市场价值
-        :param a_k_day: 每一个被迭代中的时间，即每一个交易日数据
-        :param kl_pd: 正在被apply迭代的金融时间序列本体，pd.DataFrame对象
-        :param buy_type_head: 代表交易类型，范围（_call，_put）
-        :return:
-        """
-        if a_k_day[kl_pd.name + buy_type_head + '_keep'] > 0:
-            kl = kl_pd[kl_pd['date'] == a_k_day['date']]
-            if kl is None or kl.shape[0] == 0:
-                # 前提是当前交易日有对应的持仓
-                return
-
-            # 今天的收盘价格
-            td_close = kl['close'].values[0]
-            if buy_type_head == '_put':
-                # 针对buy put对价格进行转换，主要是针对put特殊处理
-                today_key = kl.key.values[0]
-                if today_key > 0:
-                    yd_close = kl_pd.iloc[today_key - 1].close
-                    # 如果是买跌，实时市场收益以昨天为基础进行计算，即＊－1进行方向计算，以收益来映射重新定义今天的收盘价格
-                    td_close = (td_close - yd_close) * -1 + yd_close
-            # 根据持仓量即处理后的今日收盘价格，进行今日价值计算
-            self.capital_pd.loc[kl.index, [kl_pd.name + buy_type_head + '_worth']] \
-                = np.round(td_close * a_k_day[kl_pd.name + buy_type_head + '_keep'], 3)
+                # 迭代symbols，收集对应的call，put列
+                for col_tail in ('_call_keep', '_put_keep', '_call_worth', '_put_worth'):
+                    if symbol + col_tail not in exist_cols:
+                        exist_cols.add(symbol + col_tail)
+                        new_cols.append(symbol + col_tail)
+        if len(new_cols) > 0:
+            new_pd = pd.DataFrame(np.full((self.capital_pd.shape[0], len(new_cols)), np.nan),
+                                  index=self.capital_pd.index, columns=new_cols)
+            self.capital_pd = pd.concat([self.capital_pd, new_pd], axis=1)
 
     def apply_kl(self, action_pd, kl_pd_manager, show_progress):
         """
-        apply_action之后对实际成交的交易分别迭代更新时序资金对象capital_pd上每一个交易日的实时价值
+        apply_action之后对实际成交的交易分别迭代更新时序资金对象capital_pd上每一个交易日的实时价值,
+        所有成交symbol的call，put持仓量及市场价值在一个与资金时间序列对齐的二维numpy矩阵中完成计算，
+        每一个symbol只需要一次向量化计算，最后一次性写回capital_pd
         :param action_pd: 回测结果生成的交易行为构成的pd.DataFrame对象
         :param kl_pd_manager: 金融时间序列管理对象，AbuKLManager实例
         :param show_progress: 是否显示进度条
@@ -149,36 +104,17 @@ class AbuCapital(PickleStateMixin):
 
         # 在apply_action之后形成deal列后，set出考虑资金下成交了的交易序列
         deal_symbols_set = set(action_pd[action_pd['deal'] == 1].symbol)
+        if len(deal_symbols_set) == 0:
+            return
+
+        # cash_blance对na进行pad处理
+        self.capital_pd['cash_blance'] = self.capital_pd['cash_blance'].ffill()
+        # 资金时间序列的交易日，所有symbol的金融时间序列都对齐到这个时间标尺上
+        capital_date_index = pd.Index(self.capital_pd['date'].values)
 
-        def do_apply_kl(kl_pd, buy_type_head):
-            """
-            根据金融时间序列在时序资金对象capital_pd上进行call（买涨），put（买跌）的交易日实时价值更新
-            :param kl_pd: 金融时间序列，pd.DataFrame对象
-            :param buy_type_head: 代表交易类型，范围（_call，_put）
-            """
-            # cash_blance对na进行pad处理
-            self.capital_pd['cash_blance'] = self.capital_pd['cash_blance'].ffill()
-            # symbol对应列持仓量对na进行处理
-            keep_col = kl_pd.name + buy_type_head + '_keep'
-            self.capital_pd[keep_col] = self.capital_pd[keep_col].ffill()
-            self.capital_pd[keep_col] = self.capital_pd[keep_col].fillna(0)
-
-            # 使用apply在axis＝1上，即每一个交易日上对持仓量及市场价值进行更新
-            self.capital_pd.apply(self.apply_k_line, axis=1, args=(kl_pd, buy_type_head))
-
-            # symbol对应列市场价值对na进行处理
-            worth_col = kl_pd.name + buy_type_head + '_worth'
-            self.capital_pd[worth_col] = self.capital_pd[worth_col].ffill()
-            self.capital_pd[worth_col] = self.capital_pd[worth_col].fillna(0)
-
-            # 纠错处理把keep=0但是worth被pad的进行二次修正
-            fe_mask = (self.capital_pd[kl_pd.name + buy_type_head + '_keep'] == 0) & (
-                self.capital_pd[kl_pd.name + buy_type_head + '_worth'] > 0)
-            # 筛出需要纠错的index
-            fe_index = self.capital_pd[fe_mask].index
-            # 将需要纠错的对应index上市场价值进行归零处理
-            cp_w = self.capital_pd[kl_pd.name + buy_type_head + '_worth']
-            cp_w.loc[fe_index] = 0
+        keep_worth_cols = list()
+        # 二维矩阵每一个symbol占4列，依次为call keep，put keep，call worth，put worth
+        keep_worth_matrix = np.empty((self.capital_pd.shape[0], len(deal_symbols_set) * 4))
 
         # 单进程进度条
         with AbuProgress(len(deal_symbols_set), 0, label='apply_kl...') as progress:
@@ -187,10 +123,59 @@ class AbuCapital(PickleStateMixin):
                     progress.show(a_progress=pos + 1)
                 # 从kl_pd_manager中获取对应的金融时间序列kl，每一个kl分别进行call（买涨），put（买跌）的交易日实时价值更新
                 kl = kl_pd_manager.get_pick_time_kl_pd(deal_symbol)
-                # 进行call（买涨）的交易日实时价值更新
-                do_apply_kl(kl, '_call')
-                # 进行put（买跌）的交易日实时价值更新
-                do_apply_kl(kl, '_put')
+                call_close, put_close = self._aligned_kl_close(kl, capital_date_index)
+                for type_pos, (buy_type_head, td_close) in enumerate((('_call', call_close), ('_put', put_close))):
+                    keep_col = kl.name + buy_type_head + '_keep'
+                    keep, worth = self._calc_keep_worth(self.capital_pd[keep_col], td_close)
+                    keep_worth_matrix[:, pos * 4 + type_pos] = keep
+                    keep_worth_matrix[:, pos * 4 + type_pos + 2] = worth
+                keep_worth_cols.extend([kl.name + '_call_keep', kl.name + '_put_keep',
+                                        kl.name + '_call_worth', kl.name + '_put_worth'])
+
+        # 一次性写回时序资金对象capital_pd上对应的持仓量，市场价值列
+        self.capital_pd[keep_worth_cols] = keep_worth_matrix
+
+    @staticmethod
+    def _aligned_kl_close(kl_pd, capital_date_index):
+        """
+        将金融时间序列的收盘价格对齐到资金时间序列的每一个交易日上，没有对应交易日的为nan
+        :param kl_pd: 金融时间序列，pd.DataFrame对象
+        :param capital_date_index: 资金时间序列的交易日构成的pd.Index对象
+        :return: (call收盘价格序列, put收盘价格序列)，都为np.array，长度与资金时间序列一致
+        """
+        close = kl_pd['close'].values
+        kl_date_index = pd.Index(kl_pd['date'].values)
+        # 金融时间序列中重复的交易日只使用第一条数据，get_indexer需要唯一的索引
+        first_pos = np.flatnonzero(~kl_date_index.duplicated(keep='first'))
+        # 资金时间序列上每一个交易日在金融时间序列中的位置，-1即没有这个交易日
+        kl_pos = kl_date_index[first_pos].get_indexer(capital_date_index)
+        kl_pos = np.where(kl_pos >= 0, first_pos[kl_pos], -1)
+        has_kl = kl_pos >= 0
+        today_key = np.where(has_kl, kl_pd['key'].values[kl_pos], 0)
+
+        call_close = np.where(has_kl, close[kl_pos], np.nan)
+        # 如果是买跌，实时市场收益以昨天为基础进行计算，即＊－1进行方向计算，以收益来映射重新定义今天的收盘价格
+        yd_close = close[np.maximum(today_key - 1, 0)]
+        put_close = np.where(today_key > 0, (call_close - yd_close) * -1 + yd_close, call_close)
+        return call_close, put_close
+
+    @staticmethod
+    def _calc_keep_worth(keep_series, td_close):
+        """
+        根据持仓量列及对齐后的收盘价格计算每一个交易日的持仓量及市场价值
+        :param keep_series: 资金时间序列中symbol对应的持仓量列，pd.Series对象
+        :param td_close: 对齐到资金时间序列上的收盘价格，np.array
+        :return: (持仓量np.array, 市场价值np.array)
+        """
+        # symbol对应列持仓量对na进行处理
+        keep = keep_series.ffill().fillna(0).values
+        # 前提是当前交易日有对应的持仓，且有对应的交易数据，根据持仓量即处理后的今日收盘价格，进行今日价值计算
+        worth = np.where((keep > 0) & ~np.isnan(td_close), np.round(td_close * keep, 3), np.nan)
+        # symbol对应列市场价值对na进行处理
+        worth = pd.Series(worth).ffill().fillna(0).values
+        # 纠错处理把keep=0但是worth被pad的进行二次修正
+        worth[(keep == 0) & (worth > 0)] = 0
+        return keep, worth
 
     def apply_action(self, a_action, progress):
         """
@@ -247,7 +232,7 @@ class AbuCapital(PickleStateMixin):
         # 买单时间转换成pd时间日期对象
         time_ind = pd.to_datetime(ABuDateUtil.fmt_date(a_order.buy_date))
         # pd时间日期对象置换出对应的index number
-        num_index = self.capital_pd.index.tolist().index(time_ind)
+        num_index = self.capital_pd.index.get_loc(time_ind)
 
         # cash_blance初始化init中除了第一个其它都是nan
         cash_blance = self.capital_pd['cash_blance'].dropna()
@@ -310,7 +295,7 @@ class AbuCapital(PickleStateMixin):
         # 卖单时间转换成pd时间日期对象
         time_ind = pd.to_datetime(ABuDateUtil.fmt_date(a_order.sell_date))
         # # pd时间日期对象置换出对应的index number
-        num_index = self.capital_pd.index.tolist().index(time_ind)
+        num_index = self.capital_pd.index.get_loc(time_ind)
         # 根据a_order.expect_direction确定是要更新call的持仓量还是put的持仓量
         buy_type_keep = '_call_keep' if a_order.expect_direction == 1.0 else '_put_keep'
         # 前提1: 资金时间序列中有这个a_order.buy_symbol + buy_type_keep列
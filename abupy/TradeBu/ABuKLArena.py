@@ -0,0 +1,158 @@
+# -*- encoding:utf-8 -*-
+"""
+    多进程共享内存金融时间序列模块，主进程将所有择时金融时间序列按列一次性写入
+    共享内存区，子进程unpick时只获取共享内存名称及列偏移信息，通过numpy零拷贝
+    视图构建金融时间序列，避免每一个子进程都拷贝一份完整的择时金融时间序列字典
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import logging
+
+import numpy as np
+import pandas as pd
+
+__author__ = '阿布'
+__weixin__ = 'abu_quant'
+
+try:
+    # noinspection PyCompatibility
+    from multiprocessing import shared_memory
+    # python3.8之后才支持multiprocessing.shared_memory
+    g_shared_memory_enable = True
+except ImportError:
+    shared_memory = None
+    g_shared_memory_enable = False
+
+# 共享内存中每一列数据起始位置的字节对齐长度
+K_ARENA_ALIGN = 8
+
+
+def _align(offset):
+    """将偏移量按K_ARENA_ALIGN字节对齐"""
+    return (offset + K_ARENA_ALIGN - 1) // K_ARENA_ALIGN * K_ARENA_ALIGN
+
+
+class AbuKLArena(object):
+    """共享内存金融时间序列存储类，主进程构建，子进程只读零拷贝使用"""
+
+    def __init__(self, kl_pd_dict):
+        """
+        :param kl_pd_dict: 需要放入共享内存的金融时间序列字典，key为symbol，value为kl_pd或者None
+        """
+        if not g_shared_memory_enable:
+            raise RuntimeError('AbuKLArena need multiprocessing.shared_memory (python3.8+)!')
+
+        # 每一个金融时间序列在共享内存中的描述信息字典
+        self.meta = dict()
+        # 先计算需要的共享内存总长度，只有数值类型的列放入共享内存，其它类型的列直接放在meta中
+        offset = 0
+        for key, kl_pd in kl_pd_dict.items():
+            if kl_pd is None:
+                self.meta[key] = None
+                continue
+            n = kl_pd.shape[0]
+            # index统一转换为int64纳秒时间戳存储
+            index_offset = offset
+            offset = _align(offset + n * 8)
+            columns = list()
+            obj_columns = dict()
+            for col in kl_pd.columns:
+                values = kl_pd[col].values
+                if values.dtype.kind in 'biuf':
+                    columns.append((col, offset, values.dtype.str))
+                    offset = _align(offset + n * values.dtype.itemsize)
+                else:
+                    obj_columns[col] = values
+            self.meta[key] = {'n': n, 'index': index_offset, 'index_name': kl_pd.index.name,
+                              'columns': columns, 'obj_columns': obj_columns, 'col_order': list(kl_pd.columns),
+                              'name': getattr(kl_pd, 'name', key)}
+
+        # size=0的共享内存不能创建，所以最少1个字节
+        self._shm = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+        self.shm_name = self._shm.name
+        # 主进程是否拥有共享内存，拥有者负责最后的unlink
+        self._owner = True
+
+        # 再将数据逐列拷贝进共享内存
+        for key, kl_pd in kl_pd_dict.items():
+            kl_meta = self.meta[key]
+            if kl_meta is None:
+                continue
+            n = kl_meta['n']
+            self._view(kl_meta['index'], np.int64, n, writeable=True)[:] = \
+                kl_pd.index.values.astype('datetime64[ns]').view(np.int64)
+            for col, col_offset, dtype in kl_meta['columns']:
+                self._view(col_offset, dtype, n, writeable=True)[:] = kl_pd[col].values
+
+        # 子进程中已经构建的kl_pd缓存
+        self._kl_cache = dict()
+
+    def __getstate__(self):
+        """只序列化共享内存名称以及描述信息，不序列化数据本身"""
+        return {'shm_name': self.shm_name, 'meta': self.meta}
+
+    def __setstate__(self, state):
+        """子进程unpick时根据名称连接共享内存"""
+        self.shm_name = state['shm_name']
+        self.meta = state['meta']
+        self._shm = shared_memory.SharedMemory(name=self.shm_name)
+        self._owner = False
+        self._kl_cache = dict()
+
+    def __contains__(self, item):
+        """成员测试：symbol是否在共享内存中"""
+        return item in self.meta
+
+    def __len__(self):
+        """对象长度：共享内存中金融时间序列的数量"""
+        return len(self.meta)
+
+    def __str__(self):
+        """打印对象显示：共享内存名称，大小，金融时间序列数量"""
+        return 'shm:{}, size:{}, kl count:{}'.format(self.shm_name, self._shm.size, len(self.meta))
+
+    __repr__ = __str__
+
+    def _view(self, offset, dtype, n, writeable=False):
+        """在共享内存上构建numpy视图，默认只读，避免某一个子进程修改数据影响其它子进程"""
+        arr = np.ndarray((n,), dtype=dtype, buffer=self._shm.buf, offset=offset)
+        arr.flags.writeable = writeable
+        return arr
+
+    def get_kl_pd(self, key):
+        """
+        通过共享内存零拷贝构建金融时间序列，内部数值列全部为只读视图，新增列不受影响
+        :param key: symbol
+        :return: 金融时间序列pd.DataFrame对象或者None
+        """
+        if key in self._kl_cache:
+            return self._kl_cache[key]
+
+        kl_meta = self.meta[key]
+        if kl_meta is None:
+            return None
+
+        n = kl_meta['n']
+        index = pd.DatetimeIndex(self._view(kl_meta['index'], np.int64, n).view('datetime64[ns]'),
+                                 name=kl_meta['index_name'])
+        data = dict(kl_meta['obj_columns'])
+        for col, col_offset, dtype in kl_meta['columns']:
+            data[col] = self._view(col_offset, dtype, n)
+        # 保持与原始kl_pd相同的列顺序
+        kl_pd = pd.DataFrame(data, index=index, columns=kl_meta['col_order'], copy=False)
+        kl_pd.name = kl_meta['name']
+        self._kl_cache[key] = kl_pd
+        return kl_pd
+
+    def close(self):
+        """关闭共享内存，主进程拥有者同时进行unlink释放共享内存"""
+        self._kl_cache = dict()
+        try:
+            self._shm.close()
+            if self._owner:
+                self._shm.unlink()
+        except Exception as e:
+            logging.info('AbuKLArena close {}:{}'.format(self.shm_name, e))
@@ -10,6 +10,8 @@ from __future__ import division
 import logging
 
 from ..TradeBu import AbuBenchmark
+from ..TradeBu.ABuBenchmark import K_BENCHMARK_ARENA_KEY
+from ..TradeBu.ABuKLArena import AbuKLArena
 from ..UtilBu import ABuDateUtil
 from ..CoreBu.ABuEnv import EMarketDataSplitMode, EMarketDataFetchMode
 from ..MarketBu import ABuSymbolPd
@@ -80,6 +82,8 @@ class AbuKLManager(object):
         pick_time_kl_pd_dict = dict()
         # 类字典pick_kl_pd_dict将选股和择时字典包起来
         self.pick_kl_pd_dict = {'pick_stock': pick_stock_kl_pd_dict, 'pick_time': pick_time_kl_pd_dict}
+        # 多进程共享内存择时金融时间序列，AbuKLArena实例对象，默认None，即不使用共享内存
+        self.kl_arena = None
 
     def __str__(self):
         """打印对象显示：pick_stock + pick_time keys, 即所有symbol信息"""
@@ -93,8 +97,9 @@ class AbuKLManager(object):
         return len(self.pick_kl_pd_dict['pick_stock']) + len(self.pick_kl_pd_dict['pick_time'])
 
     def __contains__(self, item):
-        """成员测试：在择时字典中或者在选股字典中"""
-        return item in self.pick_kl_pd_dict['pick_stock'] or item in self.pick_kl_pd_dict['pick_time']
+        """成员测试：在择时字典中或者在选股字典中或者在共享内存中"""
+        return item in self.pick_kl_pd_dict['pick_stock'] or item in self.pick_kl_pd_dict['pick_time'] or \
+            (self.kl_arena is not None and item in self.kl_arena)
 
     def __missing__(self, key):
         """对象缺失：需要根据key使用code_to_symbol进行fetch数据，暂未实现"""
@@ -165,6 +170,11 @@ class AbuKLManager(object):
                 # 因为在多进程的时候拷贝会丢失name信息
                 kl_pd.name = target_symbol
             return kl_pd
+        if self.kl_arena is not None and target_symbol in self.kl_arena:
+            # 共享内存中零拷贝构建，同样保存在择时字典中
+            kl_pd = self.kl_arena.get_kl_pd(target_symbol)
+            self.pick_kl_pd_dict['pick_time'][target_symbol] = kl_pd
+            return kl_pd
         # 字典中每找到，进行fetch，获取后保存在择时字典中
         kl_pd = self._fetch_pick_time_kl_pd(target_symbol)
         self.pick_kl_pd_dict['pick_time'][target_symbol] = kl_pd
@@ -223,6 +233,23 @@ class AbuKLManager(object):
             # 迭代多任务组成的out_pick_kl_pd_dict，分别更新保存在内部的择时字典中
             self.pick_kl_pd_dict['pick_time'].update(pick_kl_pd_dict)
 
+    def make_shared_manager(self):
+        """
+        构造多进程传递使用的AbuKLManager，将择时字典中所有金融时间序列以及基准金融时间序列一次性写入
+        共享内存AbuKLArena，返回的AbuKLManager择时字典为空，子进程unpick时只需要连接共享内存，
+        通过零拷贝视图构建金融时间序列，不再需要每个子进程拷贝整个择时字典以及基准
+        注意使用结束后需要主进程调用shared_manager.kl_arena.close()释放共享内存
+        :return: AbuKLManager实例对象
+        """
+        kl_pd_dict = dict(self.pick_kl_pd_dict['pick_time'])
+        kl_pd_dict[K_BENCHMARK_ARENA_KEY] = self.benchmark.kl_pd
+        kl_arena = AbuKLArena(kl_pd_dict)
+
+        shared_manager = AbuKLManager(self.benchmark.make_shared_benchmark(kl_arena), self.capital)
+        shared_manager.pick_kl_pd_dict['pick_stock'] = self.pick_kl_pd_dict['pick_stock']
+        shared_manager.kl_arena = kl_arena
+        return shared_manager
+
     def get_pick_stock_kl_pd(self, target_symbol, xd=ABuEnv.g_market_trade_year,
                              min_xd=int(ABuEnv.g_market_trade_year / 2)):
         """
@@ -16,6 +16,7 @@ import numpy as np
 from ..CoreBu import ABuEnv
 # noinspection PyUnresolvedReferences
 from ..CoreBu.ABuFixes import xrange, range, six
+from ..IndicatorBu import ABuNDCache
 from ..MarketBu import ABuMarketDrawing
 from ..TLineBu import ABuTLAtr
 from ..TLineBu import ABuTLJump
@@ -39,6 +40,31 @@ g_atr_xd = 42
 # 快照周期
 g_take_snap_shot_xd = 60
 
+"""
+    角度特征，价格rank特征是否使用预计算的特征序列：每一个交易对象的combine_kl_pd上一次性计算所有交易日的
+    rolling拟合角度，rolling价格rank，交易发生时只需要按交易日读取，关闭后每一次交易都对特征周期切片重新计算
+    eg:
+        abupy.feature.g_enable_feature_vector = False
+"""
+g_enable_feature_vector = True
+
+
+def _combine_day_ind(kl_pd, combine_kl_pd, day_ind):
+    """
+    交易日在combine_kl_pd中的序号，特征周期即为combine_kl_pd中截止到这个序号的最后特征周期长度个交易日
+    :param kl_pd: 择时阶段金融时间序列
+    :param combine_kl_pd: 合并择时阶段之前1年的金融时间序列
+    :param day_ind: 交易发生的时间索引，即对应self.kl_pd.key
+    :return: combine_kl_pd中的序号，不使用预计算特征或者combine_kl_pd中没有这个交易日返回None
+    """
+    if not g_enable_feature_vector:
+        return None
+    day = kl_pd.index[day_ind]
+    combine_ind = combine_kl_pd.index.searchsorted(day)
+    if combine_ind < combine_kl_pd.shape[0] and combine_kl_pd.index[combine_ind] == day:
+        return combine_ind
+    return None
+
 
 class BuyFeatureMixin(object):
     """
@@ -161,8 +187,15 @@ class AbuFeatureDeg(AbuFeatureBase, BuyFeatureMixin, SellFeatureMixin):
 
         # 返回的角度特征键值对字典
         deg_dict = {}
+        combine_ind = _combine_day_ind(kl_pd, combine_kl_pd, day_ind)
         for dk in self.deg_keys:
             # 迭代预设角度周期，计算构建特征
+            if combine_ind is not None:
+                # 使用combine_kl_pd上预计算的rolling拟合角度序列
+                ang = ABuNDCache.kl_indicator(combine_kl_pd, 'rolling_deg', dk)[combine_ind]
+                ang = 0 if np.isnan(ang) else round(ang, 3)
+                deg_dict['{}deg_ang{}'.format(self.feature_prefix(buy_feature=buy_feature), dk)] = ang
+                continue
             if day_ind - dk >= 0:
                 # 如果择时时间序列够提取特征，使用kl_pd截取特征交易周期收盘价格
                 deg_close = kl_pd[day_ind - dk + 1:day_ind + 1].close
@@ -213,8 +246,16 @@ class AbuFeaturePrice(AbuFeatureBase, BuyFeatureMixin, SellFeatureMixin):
         """
         # 返回的价格rank特征键值对字典
         price_rank_dict = {}
+        combine_ind = _combine_day_ind(kl_pd, combine_kl_pd, day_ind)
         for dk in self.price_rank_keys:
             # 迭代预设价格rank周期，计算构建特征
+            if combine_ind is not None:
+                # 使用combine_kl_pd上预计算的rolling价格rank序列
+                price_rank = ABuNDCache.kl_indicator(combine_kl_pd, 'rolling_rank', dk)[combine_ind]
+                price_rank = 0 if np.isnan(price_rank) else round(price_rank, 3)
+                price_rank_dict['{}price_rank{}'.format(self.feature_prefix(buy_feature=buy_feature),
+                                                        dk)] = price_rank
+                continue
             if day_ind - dk >= 0:
                 # 如果择时时间序列够提取特征，使用kl_pd截取特征交易周期收盘价格
                 price_close = kl_pd[day_ind - dk + 1:day_ind + 1].close
@@ -243,7 +284,7 @@ class AbuFeaturePrice(AbuFeatureBase, BuyFeatureMixin, SellFeatureMixin):
                 eg: price_close.rank()[-1] / price_close.rank().shape[0]
                 -> 239.0 / 504 = 0.47420634920634919, 即代表买入或者卖出时价格在特征周期中的位置
             """
-            price_rank = price_close.rank()[-1] / price_close.rank().shape[0]
+            price_rank = price_close.rank().iloc[-1] / price_close.shape[0]
             # 标准化价格rank值
             price_rank = 0 if np.isnan(price_rank) else round(price_rank, 3)
             # 价格rank特征键值对字典添加价格rank周期key和对应的价格rank值
@@ -660,8 +701,15 @@ class AbuFeatureDegExtend(AbuFeatureBase, BuyFeatureMixin, SellFeatureMixin):
         """
         # 返回的角度特征键值对字典
         deg_dict = {}
+        combine_ind = _combine_day_ind(kl_pd, combine_kl_pd, day_ind)
         for dk in self.deg_keys:
             # 迭代预设角度周期，计算构建特征
+            if combine_ind is not None:
+                # 使用combine_kl_pd上预计算的rolling拟合角度序列
+                ang = ABuNDCache.kl_indicator(combine_kl_pd, 'rolling_deg', dk)[combine_ind]
+                ang = 0 if np.isnan(ang) else round(ang, 3)
+                deg_dict['{}deg_ang{}'.format(self.feature_prefix(buy_feature=buy_feature), dk)] = ang
+                continue
             if day_ind - dk >= 0:
                 # 如果择时时间序列够提取特征，使用kl_pd截取特征交易周期收盘价格
                 deg_close = kl_pd[day_ind - dk + 1:day_ind + 1].close
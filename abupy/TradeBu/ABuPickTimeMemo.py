@@ -0,0 +1,187 @@
+# -*- encoding:utf-8 -*-
+"""
+    择时共享缓存模块，grid search等需要对同一批交易对象反复择时的场景中，不同的因子组合之间共享：
+
+    1. 合并了择时之前一年数据的combine_kl_pd，key=(symbol, 择时时间范围)
+    2. 向量化择时模式下买入因子fit_signals计算的买入信号，key=(symbol, 择时时间范围, 因子类, 因子参数)
+    3. 买入卖出交易特征，key=(symbol, 择时时间范围, 交易日序号, 买入或卖出)
+
+    只在pick_time_memo上下文中生效，上下文之外所有计算行为与原来一致，退出最外层上下文时释放全部缓存，
+    每一个缓存的数量上限见g_memo_max_combine_kl，g_memo_max_signals，g_memo_max_features
+    eg:
+        with pick_time_memo():
+            for buy_factors, sell_factors in factors_product:
+                AbuPickTimeMaster.do_symbols_with_same_factors_process(...)
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import copy
+import numbers
+from contextlib import contextmanager
+
+import numpy as np
+
+from ..CoreBu.ABuFixes import six
+
+__author__ = '阿布'
+__weixin__ = 'abu_quant'
+
+"""
+    combine_kl_pd缓存数量上限，每一个交易对象一个，grid search的访问顺序为每一个因子组合依次遍历全部交易对象，
+    LRU淘汰在这种循环访问下每一次都会淘汰下一个需要的缓存，所以缓存满了之后不再加入新的缓存，已有缓存一直保留
+    eg:
+        abupy.TradeBu.ABuPickTimeMemo.g_memo_max_combine_kl = 2000
+"""
+g_memo_max_combine_kl = 500
+
+"""
+    买入信号缓存数量上限，每一个交易对象的每一种买入因子参数一个，满了之后不再加入新的缓存
+    eg:
+        abupy.TradeBu.ABuPickTimeMemo.g_memo_max_signals = 200000
+"""
+g_memo_max_signals = 50000
+
+"""
+    交易特征缓存数量上限，每一个交易对象的每一个买入卖出交易日一个，满了之后不再加入新的缓存
+    eg:
+        abupy.TradeBu.ABuPickTimeMemo.g_memo_max_features = 500000
+"""
+g_memo_max_features = 100000
+
+
+def _canonical(obj):
+    """
+    将因子构造参数转换为可hash且与参数顺序无关的规范形式，不能规范化的参数(如其它对象实例)抛出TypeError
+    :param obj: 因子构造参数
+    """
+    if obj is None or isinstance(obj, (six.string_types, numbers.Number, six.class_types)):
+        return obj
+    if isinstance(obj, dict):
+        return tuple(sorted(((str(key), _canonical(value)) for key, value in obj.items()), key=lambda item: item[0]))
+    if isinstance(obj, (list, tuple)):
+        return tuple(_canonical(value) for value in obj)
+    if isinstance(obj, np.ndarray):
+        return obj.dtype.str, obj.shape, obj.tobytes()
+    raise TypeError('{} can not canonical'.format(type(obj)))
+
+
+def kl_range_key(kl_pd):
+    """
+    金融时间序列的key：(symbol, 开始日期, 结束日期, 交易日数量)，没有name信息的返回None，即不缓存
+    :param kl_pd: 择时金融时间序列，pd.DataFrame对象
+    """
+    name = getattr(kl_pd, 'name', None)
+    if name is None or kl_pd.shape[0] == 0:
+        return None
+    return name, kl_pd.index[0], kl_pd.index[-1], kl_pd.shape[0]
+
+
+def factor_key(factor_class, kwargs):
+    """
+    因子的key：(因子类, 规范化后的因子构造参数)，参数不能规范化的返回None，即不缓存
+    :param factor_class: 因子类
+    :param kwargs: 因子构造参数字典
+    """
+    try:
+        return factor_class, _canonical(kwargs)
+    except TypeError:
+        return None
+
+
+class AbuPickTimeMemo(object):
+    """择时共享缓存类，由pick_time_memo创建，通过active_memo获取"""
+
+    def __init__(self):
+        # combine_kl_pd缓存
+        self.combine_kl = dict()
+        # 买入信号缓存
+        self.signals = dict()
+        # 交易特征缓存
+        self.features = dict()
+        # 缓存命中以及未命中的次数
+        self.hit_cnt = 0
+        self.miss_cnt = 0
+
+    def __str__(self):
+        """打印对象显示：各个缓存的数量，命中次数"""
+        return 'combine_kl:{}, signals:{}, features:{}, hit:{}, miss:{}'.format(
+            len(self.combine_kl), len(self.signals), len(self.features), self.hit_cnt, self.miss_cnt)
+
+    __repr__ = __str__
+
+    def _get(self, cache, key, make_func, max_size):
+        """key为None时不缓存直接计算，否则缓存中没有时计算，缓存数量没有达到max_size时加入缓存"""
+        if key is None:
+            return make_func()
+        if key in cache:
+            self.hit_cnt += 1
+            return cache[key]
+        self.miss_cnt += 1
+        value = make_func()
+        if len(cache) < max_size:
+            cache[key] = value
+        return value
+
+    def combine_kl_pd(self, kl_pd, make_func):
+        """
+        缓存的combine_kl_pd
+        :param kl_pd: 择时金融时间序列
+        :param make_func: 没有缓存时的计算函数，无参数，返回combine_kl_pd
+        """
+        return self._get(self.combine_kl, kl_range_key(kl_pd), make_func, g_memo_max_combine_kl)
+
+    def signal_array(self, factor, make_func):
+        """
+        缓存的买入因子信号序列，返回只读的np.array
+        :param factor: 买入因子对象，通过factor.memo_key区分因子类及参数
+        :param make_func: 没有缓存时的计算函数，无参数，返回bool信号序列
+        """
+        kl_key = kl_range_key(factor.kl_pd)
+        key = None if kl_key is None or factor.memo_key is None else kl_key + factor.memo_key
+
+        def _make():
+            signal_array = np.asarray(make_func(), dtype=bool)
+            # 多个因子组合共享同一个信号序列，设置只读防止被修改
+            signal_array.flags.writeable = False
+            return signal_array
+
+        return self._get(self.signals, key, _make, g_memo_max_signals)
+
+    def ml_feature(self, kl_pd, day_ind, buy_feature, make_func):
+        """
+        缓存的交易特征，返回字典的拷贝，订单后续update特征时不影响缓存
+        :param kl_pd: 择时金融时间序列
+        :param day_ind: 交易发生的时间索引
+        :param buy_feature: 是否是买入特征
+        :param make_func: 没有缓存时的计算函数，无参数，返回特征字典
+        """
+        kl_key = kl_range_key(kl_pd)
+        key = None if kl_key is None else kl_key + (int(day_ind), buy_feature)
+        ml_feature_dict = self._get(self.features, key, make_func, g_memo_max_features)
+        return copy.copy(ml_feature_dict)
+
+
+"""当前生效的择时共享缓存，None即没有开启"""
+_g_pick_time_memo = None
+
+
+def active_memo():
+    """当前生效的AbuPickTimeMemo对象，没有开启返回None"""
+    return _g_pick_time_memo
+
+
+@contextmanager
+def pick_time_memo():
+    """开启择时共享缓存的上下文，已经开启时复用外层的缓存，退出最外层上下文时释放缓存"""
+    global _g_pick_time_memo
+    if _g_pick_time_memo is not None:
+        yield _g_pick_time_memo
+        return
+    _g_pick_time_memo = AbuPickTimeMemo()
+    try:
+        yield _g_pick_time_memo
+    finally:
+        _g_pick_time_memo = None
@@ -42,44 +42,43 @@ def calc_simple_profit(orders, kl_pd):
 
 def make_orders_pd(orders, kl_pd):
     """
-    AbuOrder对象序列转换为pd.DataFrame对象，order_pd中每一行代表一个AbuOrder信息
+    AbuOrder对象序列转换为pd.DataFrame对象，order_pd中每一行代表一个AbuOrder信息,
+    先将所有order的属性收集为列序列，通过预先构建的date->key映射查询key，最后一次性构建pd.DataFrame
     :param orders: AbuOrder对象序列
     :param kl_pd: 金融时间序列，pd.DataFrame对象
     """
-    ret_orders_pd = None
-    for index, order in enumerate(orders):
-        # 迭代order，将每一个AbuOrder对象转换为一个pd.DataFrame对象
-        order_pd = pd.DataFrame(np.array([order.buy_date, order.buy_price, order.buy_cnt, order.buy_factor,
-                                          order.buy_symbol, order.buy_pos,
-                                          order.buy_type_str, order.expect_direction,
-                                          order.sell_type_extra, order.sell_date, order.sell_price, order.sell_type,
-                                          order.ml_features]).reshape(1, -1),
-                                index=[index],
-                                columns=['buy_date', 'buy_price', 'buy_cnt', 'buy_factor', 'symbol', 'buy_pos',
-                                         'buy_type_str', 'expect_direction',
-                                         'sell_type_extra',
-                                         'sell_date',
-                                         'sell_price', 'sell_type', 'ml_features'])
-
-        # 从原始金融时间序列中找到key，赋予order_pd['key']
-        mask = kl_pd[kl_pd['date'] == order.buy_date]
-        order_pd['key'] = mask['key'].values[0]
-        # 将所有order_pd concat生成一个pd.DataFrame对象
-        ret_orders_pd = order_pd if ret_orders_pd is None else pd.concat([ret_orders_pd, order_pd])
-
-    # 转换连接好的pd.DataFrame对象的index赋予对应的时间，形成交易时间序列
-    dates_fmt = list(map(lambda date: ABuDateUtil.fmt_date(date), ret_orders_pd['buy_date'].tolist()))
-    dates_pd = pd.to_datetime(dates_fmt)
-    ret_orders_pd.index = dates_pd
-
-    # 把除字符串类型外的所有进行列类型进行显示转换，因为支持py3
-    ret_orders_pd['sell_price'] = ret_orders_pd['sell_price'].astype(float)
-    ret_orders_pd['sell_date'] = pd.to_numeric(ret_orders_pd['sell_date'], errors='coerce').fillna(0).astype(int)
-
-    ret_orders_pd['buy_price'] = ret_orders_pd['buy_price'].astype(float)
-    ret_orders_pd['buy_date'] = ret_orders_pd['buy_date'].astype(int)
-    ret_orders_pd['buy_cnt'] = ret_orders_pd['buy_cnt'].astype(float)
-    ret_orders_pd['expect_direction'] = ret_orders_pd['expect_direction'].astype(float)
+    # 从原始金融时间序列中构建交易日期到key的映射，替代每一个order都对kl_pd进行一次全量的date比对
+    date_key_dict = dict(zip(kl_pd['date'].values.tolist(), kl_pd['key'].values.tolist()))
+
+    buy_date = [int(order.buy_date) for order in orders]
+    ret_orders_pd = pd.DataFrame(
+        {
+            'buy_date': np.array(buy_date, dtype=int),
+            'buy_price': np.array([order.buy_price for order in orders], dtype=float),
+            'buy_cnt': np.array([order.buy_cnt for order in orders], dtype=float),
+            'buy_factor': [order.buy_factor for order in orders],
+            'symbol': [order.buy_symbol for order in orders],
+            'buy_pos': [order.buy_pos for order in orders],
+            'buy_type_str': [order.buy_type_str for order in orders],
+            'expect_direction': np.array([order.expect_direction for order in orders], dtype=float),
+            'sell_type_extra': [order.sell_type_extra for order in orders],
+            # 还没有卖出的单子sell_date为0
+            'sell_date': np.array([0 if order.sell_date is None else int(order.sell_date) for order in orders],
+                                  dtype=int),
+            # 还没有卖出的单子sell_price为nan
+            'sell_price': np.array([np.nan if order.sell_price is None else order.sell_price for order in orders],
+                                   dtype=float),
+            'sell_type': [order.sell_type for order in orders],
+            'ml_features': [order.ml_features for order in orders],
+            'key': np.array([date_key_dict[date] for date in buy_date], dtype=int)
+        },
+        columns=['buy_date', 'buy_price', 'buy_cnt', 'buy_factor', 'symbol', 'buy_pos',
+                 'buy_type_str', 'expect_direction', 'sell_type_extra', 'sell_date',
+                 'sell_price', 'sell_type', 'ml_features', 'key'])
+
+    # pd.DataFrame对象的index赋予对应的时间，形成交易时间序列
+    dates_fmt = list(map(lambda date: ABuDateUtil.fmt_date(date), buy_date))
+    ret_orders_pd.index = pd.to_datetime(dates_fmt)
 
     # 计算收益
     c_ss = (ret_orders_pd['sell_price'] - ret_orders_pd['buy_price']) * ret_orders_pd[
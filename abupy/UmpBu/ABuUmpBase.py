@@ -52,6 +52,8 @@ class CachedUmpManager:
     def __init__(self):
         """初始化_cache本体，根据s_use_weak决定使用WeakValueDictionary或者dict"""
         self._cache = weakref.WeakValueDictionary() if CachedUmpManager.s_use_weak else dict()
+        # 裁判本体编译后的预测对象缓存
+        self._compiled_cache = dict()
 
     def get_ump(self, ump):
         """
@@ -89,9 +91,22 @@ class CachedUmpManager:
             dump_clf = self._cache[name]
         return dump_clf
 
+    def get_compiled_ump(self, ump, compiled_class):
+        """
+        获取裁判本体编译后的预测对象，只在第一次使用时通过裁判本体构建，之后使用缓存
+        :param ump: 具体裁判对象，AbuUmpBase对象
+        :param compiled_class: 编译预测类，使用get_ump返回的裁判本体构造，eg：AbuUmpMainPredictor
+        :return: compiled_class实例对象
+        """
+        name = ump.dump_file_fn()
+        if name not in self._compiled_cache or name not in self._cache:
+            self._compiled_cache[name] = compiled_class(self.get_ump(ump))
+        return self._compiled_cache[name]
+
     def clear(self):
         """清除缓存中所有cache ump"""
         self._cache.clear()
+        self._compiled_cache.clear()
 
 
 def ump_main_make_xy(func):
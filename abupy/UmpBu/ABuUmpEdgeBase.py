@@ -12,6 +12,7 @@ import os
 from abc import abstractmethod
 
 import numpy as np
+import pandas as pd
 import sklearn.preprocessing as preprocessing
 from enum import Enum
 from sklearn.metrics.pairwise import pairwise_distances
@@ -19,6 +20,7 @@ from ..CoreBu import ABuEnv
 from ..UtilBu import ABuFileUtil
 from ..SimilarBu.ABuCorrcoef import ECoreCorrType, corr_xy
 from .ABuUmpBase import AbuUmpBase
+from .ABuUmpEdgePredictor import AbuUmpEdgePredictor
 # noinspection PyUnresolvedReferences
 from ..CoreBu.ABuFixes import filter
 
@@ -66,6 +68,14 @@ class EEdgeType(Enum):
 """在第二轮的相似度匹配中使用的方法，传递给ABuCorrcoef.corr_xy函数"""
 g_similar_type = ECoreCorrType.E_CORE_TYPE_PEARS
 
+"""
+    边裁predict是否使用AbuUmpEdgePredictor编译的批量预测，标准化参数增量更新，距离矩阵乘法批量计算，
+    关闭后每一次predict将x拼接到训练集矩阵后重新fit_transform
+    eg:
+        abupy.UmpBu.ABuUmpEdgeBase.g_enable_compiled_predict = False
+"""
+g_enable_compiled_predict = True
+
 
 class AbuUmpEdgeBase(AbuUmpBase):
     """边裁基类"""
@@ -314,6 +324,42 @@ class AbuUmpEdgeBase(AbuUmpBase):
         """
         ABuFileUtil.dump_pickle(df_x_dict, self.dump_file_fn(), how='zero')
 
+    def _compiled_predictor(self):
+        """从CachedUmpManager中获取缓存的AbuUmpEdgePredictor"""
+        return AbuUmpBase.dump_clf_manager.get_compiled_ump(self, AbuUmpEdgePredictor)
+
+    def predict_batch(self, x):
+        """
+        批量边裁交易决策，用于对整个orders_pd进行离线评估，结果与对每一条交易特征调用predict一致
+
+            eg:
+                orders_pd_test = abu_result_tuple_test.orders_pd
+                edge = ump_deg.predict_batch(orders_pd_test)
+                orders_pd_test[edge == EEdgeType.E_EEdge_TOP_LOSS.value].profit.sum()
+
+        :param x: 交易特征矩阵，或者包含训练集特征列的pd.DataFrame对象，如unzip_ml_feature后的orders_pd
+        :return: 每一条交易特征的EEdgeType.value，np.array对象，拦截为-1
+        """
+        predictor = self._compiled_predictor()
+        if isinstance(x, pd.DataFrame):
+            x = x[predictor.feature_columns].values
+        return predictor.predict_batch(x, K_DISTANCE_THRESHOLD, K_N_TOP_SEED, K_SIMILAR_THRESHOLD, K_EDGE_JUDGE_RATE,
+                                       g_similar_type)
+
+    def top_k(self, k=K_N_TOP_SEED, **kwargs):
+        """
+        与kwargs关键字参数所描述的交易特征距离最近的k个训练集交易
+        :param k: 最近的交易数量，默认K_N_TOP_SEED
+        :param kwargs: 需要和训练集特征列对应的关键字参数，eg: buy_deg_ang42=3.378, buy_deg_ang60=3.458
+        :return: 训练集fiter_df中最近的k个交易，添加distance列，按距离由小到大排序
+        """
+        predictor = self._compiled_predictor()
+        x = np.array([kwargs[col] for col in predictor.feature_columns]).reshape(1, -1)
+        top_ind, top_dist = predictor.top_k(x, k)
+        top_df = AbuUmpBase.dump_clf_manager.get_ump(self)['fiter_df'].iloc[top_ind[0]].copy()
+        top_df['distance'] = top_dist[0]
+        return top_df
+
     def predict(self, **kwargs):
         """
         边裁交易决策函数，从CachedUmpManager中获取缓存df_x_dict，对kwargs关键字参数所描述的交易特征进行拦截决策
@@ -354,6 +400,11 @@ class AbuUmpEdgeBase(AbuUmpBase):
         x = np.array([kwargs[col] for col in feature_columns])
         x = x.reshape(1, -1)
 
+        if g_enable_compiled_predict:
+            # 使用编译的批量预测，不再对整个训练集重新fit_transform
+            return EEdgeType(self._compiled_predictor().predict_batch(
+                x, K_DISTANCE_THRESHOLD, K_N_TOP_SEED, K_SIMILAR_THRESHOLD, K_EDGE_JUDGE_RATE, g_similar_type)[0])
+
         # 把新的x concatenate到之前保存的矩阵中
         con_x = np.concatenate((x, df_x_dict['fiter_x']), axis=0)
         # 将输入的x和原始矩阵组装好的新矩阵con_x一起标准化
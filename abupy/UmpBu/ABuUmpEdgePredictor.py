@@ -0,0 +1,146 @@
+# -*- encoding:utf-8 -*-
+"""
+    边裁批量预测模块，训练集矩阵的均值，方差，平方矩阵在构建时一次计算，预测时：
+
+    1. 新交易特征加入后的标准化参数通过增量公式O(n_features)更新，与把x拼接到训练集矩阵后
+       scaler.fit_transform的结果一致，不需要每一次对整个训练集重新fit
+    2. 标准化后的欧式距离展开为矩阵乘法，批量交易特征一次BLAS计算与整个训练集的距离
+    3. 种子交易的相关系数向量化计算，替代逐个corr_xy
+"""
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+
+import numpy as np
+
+from ..SimilarBu.ABuCorrcoef import ECoreCorrType, corr_xy
+
+__author__ = '阿布'
+__weixin__ = 'abu_quant'
+
+# 批量预测时每一批交易特征数量，限制中间距离矩阵shape(批量, 训练集数量)的内存占用
+K_PREDICT_CHUNK = 256
+
+
+class AbuUmpEdgePredictor(object):
+    """边裁编译预测类，由边裁dump的df_x_dict构建，predict结果与AbuUmpEdgeBase逐个predict一致"""
+
+    def __init__(self, df_x_dict):
+        """
+        :param df_x_dict: 边裁训练后dump的字典，{'fiter_df': 训练集特征pd.DataFrame, 'fiter_x': 训练集特征矩阵}
+        """
+        fiter_df = df_x_dict['fiter_df']
+        # 与predict中一致，从fiter_df.columns中筛选特征列
+        self.feature_columns = fiter_df.columns.drop(['profit', 'profit_cg', 'p_rk_cg', 'rk'])
+        self.train_x = np.asarray(df_x_dict['fiter_x'], dtype=np.float64)
+        # 每一个训练集交易的rk值，投票时使用
+        self.rk = fiter_df['rk'].values
+        self.train_sq = np.square(self.train_x)
+        self.n_train = self.train_x.shape[0]
+        self.mean = self.train_x.mean(axis=0)
+        self.var = self.train_x.var(axis=0)
+
+    def _scaler_with(self, x):
+        """
+        x加入训练集后StandardScaler的mean_和scale_，增量计算
+        :param x: 交易特征矩阵，shape(m, n_features)，每一行各自加入训练集
+        :return: mean shape(m, n_features), scale shape(m, n_features)
+        """
+        n = self.n_train
+        delta = x - self.mean
+        mean = self.mean + delta / (n + 1)
+        var = (n * self.var + n / (n + 1) * np.square(delta)) / (n + 1)
+        scale = np.sqrt(var)
+        # 与sklearn一致，方差为0的特征不缩放
+        scale[scale < 10 * np.finfo(scale.dtype).eps] = 1.
+        return mean, scale
+
+    def distances(self, x):
+        """
+        标准化后交易特征与训练集中每一个交易的欧式距离
+        :param x: 交易特征矩阵，shape(m, n_features)
+        :return: 距离矩阵，shape(m, 训练集数量)
+        """
+        x = np.asarray(x, dtype=np.float64)
+        if x.ndim == 1:
+            x = x.reshape(1, -1)
+        _, scale = self._scaler_with(x)
+        # 标准化的均值在距离中抵消，只需要按scale加权：sum(w * (x - t)^2) = x^2·w - 2 * t·(w * x) + t^2·w
+        w = 1. / np.square(scale)
+        xw = x * w
+        dist = np.sum(x * xw, axis=1)[:, np.newaxis] - 2 * np.dot(xw, self.train_x.T) + np.dot(w, self.train_sq.T)
+        return np.sqrt(np.maximum(dist, 0))
+
+    def top_k(self, x, k):
+        """
+        与训练集中距离最近的k个交易
+        :param x: 交易特征矩阵，shape(m, n_features)
+        :param k: 最近的交易数量
+        :return: (训练集序号 shape(m, k)，距离 shape(m, k))，按距离由小到大排序
+        """
+        dist = self.distances(x)
+        k = min(k, dist.shape[1])
+        top_ind = np.argpartition(dist, k - 1, axis=1)[:, :k]
+        top_dist = np.take_along_axis(dist, top_ind, axis=1)
+        order = np.argsort(top_dist, axis=1)
+        return np.take_along_axis(top_ind, order, axis=1), np.take_along_axis(top_dist, order, axis=1)
+
+    def _similar(self, x, mean, scale, seeds, similar_type):
+        """标准化后交易特征与种子交易的相关系数"""
+        scaled_x = (x - mean) / scale
+        scaled_seeds = (self.train_x[seeds] - mean) / scale
+        if similar_type not in (ECoreCorrType.E_CORE_TYPE_PEARS, ECoreCorrType.E_CORE_TYPE_SIGN):
+            return np.array([corr_xy(scaled_x, seed, similar_type) for seed in scaled_seeds])
+        if similar_type == ECoreCorrType.E_CORE_TYPE_SIGN:
+            scaled_x = np.sign(scaled_x)
+            scaled_seeds = np.sign(scaled_seeds)
+
+        dx = scaled_x - scaled_x.mean()
+        ds = scaled_seeds - scaled_seeds.mean(axis=1)[:, np.newaxis]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            similar = np.dot(ds, dx) / np.sqrt(np.sum(np.square(ds), axis=1) * np.sum(np.square(dx)))
+        # 与corr_xy一致，全序列唯一不能使用相关计算，使用相同的数和与总数的比例
+        const = np.all(scaled_seeds == scaled_seeds[:, :1], axis=1) | np.all(scaled_x == scaled_x[0])
+        if const.any():
+            similar[const] = np.mean(scaled_seeds[const] == scaled_x, axis=1)
+        return similar
+
+    def predict_batch(self, x, distance_threshold, n_top_seed, similar_threshold, judge_rate, similar_type):
+        """
+        批量边裁决策，参数对应ABuUmpEdgeBase中的模块常量
+        :param x: 交易特征矩阵，shape(m, n_features)
+        :param distance_threshold: K_DISTANCE_THRESHOLD
+        :param n_top_seed: K_N_TOP_SEED
+        :param similar_threshold: K_SIMILAR_THRESHOLD
+        :param judge_rate: K_EDGE_JUDGE_RATE
+        :param similar_type: g_similar_type
+        :return: EEdgeType.value序列，-1: 拦截，0，1: 放行，shape(m,)
+        """
+        x = np.asarray(x, dtype=np.float64)
+        if x.ndim == 1:
+            x = x.reshape(1, -1)
+        result = np.zeros(x.shape[0], dtype=int)
+        n_top = n_top_seed if self.n_train > n_top_seed else self.n_train
+        for start in range(0, x.shape[0], K_PREDICT_CHUNK):
+            chunk = x[start:start + K_PREDICT_CHUNK]
+            dist = self.distances(chunk)
+            mean, scale = self._scaler_with(chunk)
+            # 距离最近的n_top个训练集交易做为种子
+            seeds = np.argpartition(dist, n_top - 1, axis=1)[:, :n_top]
+            for ind in range(chunk.shape[0]):
+                if dist[ind].min() > distance_threshold:
+                    continue
+                similar = self._similar(chunk[ind], mean[ind], scale[ind], seeds[ind], similar_type)
+                vote = similar > similar_threshold
+                if vote.sum() < int(n_top * 0.1):
+                    # 投票的太少，认为无效
+                    continue
+                vote_rk = self.rk[seeds[ind][vote]]
+                top_loss_cluster_cnt = similar[vote][vote_rk == -1].sum()
+                top_win_cluster_cnt = similar[vote][vote_rk == 1].sum()
+                if int(top_win_cluster_cnt * judge_rate) > top_loss_cluster_cnt:
+                    result[start + ind] = 1
+                elif int(top_loss_cluster_cnt * judge_rate) > top_win_cluster_cnt:
+                    result[start + ind] = -1
+        return result
@@ -26,6 +26,7 @@ from mpl_toolkits.mplot3d import Axes3D
 from ..UtilBu import ABuFileUtil
 from ..UtilBu.ABuProgress import AbuProgress
 from .ABuUmpBase import AbuUmpBase
+from .ABuUmpMainPredictor import AbuUmpMainPredictor
 from ..CoreBu.ABuFixes import GMM
 from ..UtilBu.ABuProgress import AbuMulPidProgress
 from ..CoreBu.ABuParallel import delayed, Parallel
@@ -49,6 +50,14 @@ g_brust_min_default = (0, 0, 0.65)
 """代表在ump_main_clf_dump中show_order或者save_order为True的情况下最多绘制和保存的交易快照数量"""
 g_plot_order_max_cnt = 100
 
+"""
+    主裁predict是否使用AbuUmpMainPredictor编译的批量预测，一次向量化计算所有GMM分类簇，
+    关闭后使用逐个(clf, cluster)调用clf.predict
+    eg:
+        abupy.UmpBu.ABuUmpMainBase.g_enable_compiled_predict = False
+"""
+g_enable_compiled_predict = True
+
 
 def _do_gmm_cluster(sub_ncs, x, df, threshold):
     """
@@ -1010,6 +1019,11 @@ class AbuUmpMainBase(AbuUmpBase):
                 ....................................................................................................
                 }
         """
+        predictor = self._compiled_predictor()
+        if predictor is not None:
+            # 使用编译的批量预测，结果与下面逐个clf.predict一致
+            return int(predictor.predict_batch(x, need_hit_cnt)[0])
+
         count_hit = 0
         # if need_hit_cnt > 1 and len(clf_cluster_dict) < 50:
         #     need_hit_cnt = 1
@@ -1030,6 +1044,51 @@ class AbuUmpMainBase(AbuUmpBase):
                     return 1
         return 0
 
+    def _compiled_predictor(self):
+        """从CachedUmpManager中获取缓存的AbuUmpMainPredictor，未开启或者主裁本体不支持编译时返回None"""
+        if not g_enable_compiled_predict:
+            return None
+        predictor = AbuUmpMainBase.dump_clf_manager.get_compiled_ump(self, AbuUmpMainPredictor)
+        return predictor if predictor.enable else None
+
+    def _batch_x(self, x):
+        """将orders_pd或者特征矩阵转换为批量预测使用的x，orders_pd使用get_predict_col中的特征列"""
+        if isinstance(x, pd.DataFrame):
+            x = x[self.get_predict_col()].values
+        x = np.asarray(x, dtype=np.float64)
+        return x.reshape(1, -1) if x.ndim == 1 else x
+
+    def hit_cnt_batch(self, x):
+        """
+        批量进行ump分类簇命中统计，结果与对每一条交易特征调用hit_cnt一致
+        :param x: 交易特征矩阵，或者包含get_predict_col特征列的pd.DataFrame对象，如unzip_ml_feature后的orders_pd
+        :return: 每一条交易特征的命中数量，np.array对象
+        """
+        x = self._batch_x(x)
+        predictor = self._compiled_predictor()
+        if predictor is not None:
+            return predictor.hit_cnt_batch(x)
+        return np.array([self.hit_cnt(x[ind:ind + 1]) for ind in range(x.shape[0])])
+
+    def predict_batch(self, x, need_hit_cnt=1):
+        """
+        批量主裁交易决策，用于对整个orders_pd进行离线评估，结果与对每一条交易特征调用predict一致
+
+            eg:
+                orders_pd_test = abu_result_tuple_test.orders_pd
+                block = ump_deg.predict_batch(orders_pd_test, need_hit_cnt=2)
+                orders_pd_test[block == 1].profit.sum()
+
+        :param x: 交易特征矩阵，或者包含get_predict_col特征列的pd.DataFrame对象，如unzip_ml_feature后的orders_pd
+        :param need_hit_cnt: 透传给self.predict中need_hit_cnt参数，做为分类簇匹配拦截阀值
+        :return: 每一条交易特征是否进行拦截，拦截为1，放行为0，np.array对象
+        """
+        x = self._batch_x(x)
+        predictor = self._compiled_predictor()
+        if predictor is not None:
+            return predictor.predict_batch(x, need_hit_cnt)
+        return np.array([self.predict(x[ind:ind + 1], need_hit_cnt) for ind in range(x.shape[0])])
+
     def predict_kwargs(self, w_col=None, need_hit_cnt=1, **kwargs):
         """
         主裁交易决策函数，对kwargs关键字参数所描述的交易特征进行拦截决策，从子类对象必须实现的虚方法get_predict_col中获取特征列，
@@ -1273,6 +1332,10 @@ class AbuUmpMainBase(AbuUmpBase):
         """
 
         # 统一从CachedUmpManager中获取缓存ump，没有缓存的情况下load_pickle
+        predictor = self._compiled_predictor()
+        if predictor is not None:
+            return int(predictor.hit_cnt_batch(x)[0])
+
         clf_cluster_dict = AbuUmpBase.dump_clf_manager.get_ump(self)
         hit_cnt = 0
         for clf, cluster in clf_cluster_dict.values():
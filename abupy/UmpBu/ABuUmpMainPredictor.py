@@ -0,0 +1,112 @@
+# -*- encoding:utf-8 -*-
+"""
+    主裁批量预测模块，将主裁字典中所有GMM的各个分类簇参数（均值，精度矩阵cholesky分解，权重）
+    堆叠为数组，一次向量化计算所有分类簇的对数似然，对批量交易特征同时完成所有GMM的predict，
+    替代逐个(clf, cluster)对单条交易特征调用clf.predict
+"""
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+
+import numpy as np
+
+__author__ = '阿布'
+__weixin__ = 'abu_quant'
+
+# 批量预测时每一批交易特征数量，限制中间矩阵shape(分类簇数量, 批量, n_features)的内存占用
+K_PREDICT_CHUNK = 256
+
+
+class AbuUmpMainPredictor(object):
+    """主裁编译预测类，由主裁字典clf_cluster_dict构建，predict结果与逐个clf.predict一致"""
+
+    def __init__(self, clf_cluster_dict):
+        """
+        :param clf_cluster_dict: 主裁训练后dump的字典，eg: {'14_7': (GaussianMixture对象, 7), ...}
+        """
+        # 同一个component的GMM对象在字典中被多个cluster共享，按对象去重
+        clf_ind = dict()
+        clf_list = list()
+        pair_clf = list()
+        pair_cluster = list()
+        for clf, cluster in clf_cluster_dict.values():
+            if id(clf) not in clf_ind:
+                clf_ind[id(clf)] = len(clf_list)
+                clf_list.append(clf)
+            pair_clf.append(clf_ind[id(clf)])
+            pair_cluster.append(cluster)
+
+        # 只支持sklearn GaussianMixture covariance_type='full'，其它情况使用逐个clf.predict
+        self.enable = len(clf_list) > 0 and all(
+            getattr(clf, 'covariance_type', None) == 'full' and hasattr(clf, 'precisions_cholesky_')
+            for clf in clf_list)
+        if not self.enable:
+            return
+
+        # 每一对(clf, cluster)对应的clf序号及cluster
+        self.pair_clf = np.array(pair_clf)
+        self.pair_cluster = np.array(pair_cluster)
+
+        n_components = np.array([clf.means_.shape[0] for clf in clf_list])
+        self.max_component = n_components.max()
+        # 所有分类簇参数堆叠，clf_seg为每一个分类簇在(clf数量, 最大component数量)矩阵中的位置
+        self.clf_seg = np.concatenate([np.full(n, ind) for ind, n in enumerate(n_components)])
+        self.component_seg = np.concatenate([np.arange(n) for n in n_components])
+        self.prec_chol = np.concatenate([clf.precisions_cholesky_ for clf in clf_list])
+        means = np.concatenate([clf.means_ for clf in clf_list])
+        # 与sklearn _estimate_log_gaussian_prob一致：y = x * prec_chol - mu * prec_chol
+        self.mu_prec = np.einsum('kd,kde->ke', means, self.prec_chol)
+        n_features = means.shape[1]
+        log_det = np.sum(np.log(self.prec_chol.reshape(self.prec_chol.shape[0], -1)[:, ::n_features + 1]), axis=1)
+        log_weights = np.concatenate([np.log(clf.weights_) for clf in clf_list])
+        self.log_const = log_det + log_weights - .5 * n_features * np.log(2 * np.pi)
+        self.n_clf = len(clf_list)
+
+    def predict_clf(self, x):
+        """
+        批量计算所有GMM对交易特征的predict结果
+        :param x: 交易特征矩阵，shape(n, n_features)
+        :return: 每一条交易特征在每一个GMM上的分类簇序号，shape(n, clf数量)
+        """
+        x = np.asarray(x, dtype=np.float64)
+        if x.ndim == 1:
+            x = x.reshape(1, -1)
+        # y shape(分类簇数量, n, n_features)
+        y = np.matmul(x, self.prec_chol) - self.mu_prec[:, np.newaxis, :]
+        log_prob = -.5 * np.sum(np.square(y), axis=2) + self.log_const[:, np.newaxis]
+
+        # 放入(n, clf数量, 最大component数量)矩阵，不足最大component数量的位置为-inf，之后每一个clf上argmax
+        weighted = np.full((x.shape[0], self.n_clf, self.max_component), -np.inf)
+        weighted[:, self.clf_seg, self.component_seg] = log_prob.T
+        return weighted.argmax(axis=2)
+
+    def hit_cnt_batch(self, x):
+        """
+        批量统计交易特征命中分类簇的数量
+        :param x: 交易特征矩阵，shape(n, n_features)
+        :return: 每一条交易特征的命中数量，shape(n,)
+        """
+        x = np.asarray(x, dtype=np.float64)
+        if x.ndim == 1:
+            x = x.reshape(1, -1)
+        hit_cnt = np.zeros(x.shape[0], dtype=int)
+        for start in range(0, x.shape[0], K_PREDICT_CHUNK):
+            predict_cluster = self.predict_clf(x[start:start + K_PREDICT_CHUNK])
+            # 每一对(clf, cluster)中clf的predict结果与cluster一致即代表hit
+            hit = predict_cluster[:, self.pair_clf] == self.pair_cluster
+            hit_cnt[start:start + K_PREDICT_CHUNK] = hit.sum(axis=1)
+        return hit_cnt
+
+    def predict_batch(self, x, need_hit_cnt=1):
+        """
+        批量主裁决策，命中数量达到need_hit_cnt即拦截
+        :param x: 交易特征矩阵，shape(n, n_features)
+        :param need_hit_cnt: 命中分类簇数量阀值
+        :return: 拦截为1，放行为0，shape(n,)
+        """
+        hit_cnt = self.hit_cnt_batch(x)
+        if need_hit_cnt < 1:
+            # 与逐个predict一致，need_hit_cnt < 1时永远不会拦截
+            return np.zeros_like(hit_cnt)
+        return (hit_cnt >= need_hit_cnt).astype(int)
@@ -71,6 +71,22 @@ g_show_ui_progress = True
 """主进程下用来存贮子进程传递子进程pid为key，进度条对象UIProgress为value"""
 ui_progress_dict = {}
 
+"""
+    进度回调函数，默认None，设置后AbuMulPidProgress以及AbuProgress每次显示进度时回调hook(label, 进度百分比)，
+    外部任务系统可以通过回调记录任务进度，回调中抛出的异常不做处理，即可以通过回调抛出异常中断任务，
+    ABuParallel多进程并行时主进程中每完成一个任务块回调一次label='parallel'的进度，AbuEnvProcess不向子进程拷贝回调，
+    fork出的子进程仍然会继承回调，只需要主进程回调时在ABuParallel.g_process_initializer中清除
+    eg:
+        abupy.UtilBu.ABuProgress.g_progress_hook = lambda label, ps: print(label, ps)
+"""
+g_progress_hook = None
+
+
+def _call_progress_hook(label, ps):
+    """设置了g_progress_hook时进行进度回调"""
+    if g_progress_hook is not None:
+        g_progress_hook(label, ps)
+
 
 def _socket_cmd_handle(socket_cmd):
     """主进程中处理子进程传递的进度条处理信息：创建，进度更新，销毁"""
@@ -297,6 +313,7 @@ class AbuMulPidProgress(object):
             ps = round(self.epoch / self._total * 100, 2)
             ps = 100 if ps > 100 else ps
             ps_text = "pid:{} {}:{}%".format(os.getpid(), self._label, ps)
+            _call_progress_hook(self._label, ps)
             if not ABuEnv.g_is_ipython or self._total < 2:
                 if clear:
                     do_clear_output()
@@ -418,6 +435,7 @@ class AbuProgress(object):
         """
         self.progress = a_progress if a_progress is not None else self.progress + 1
         ps = round(self._progress / self._total * 100, 2)
+        _call_progress_hook(self._label, ps)
 
         if self._label is not None:
             # 如果初始化label没有就只显示ui进度
@@ -43,11 +43,12 @@ class WidgetEnvSetMixin(object):
         set_mode_label_tip = widgets.Label(u'缓存模式|联网模式|数据源只在开放数据模式下生效：',
                                            layout=widgets.Layout(width='300px', align_items='stretch'))
 
-        """csv模式与hdf5模式模式切换"""
+        """csv模式，hdf5模式与列式存储模式切换"""
         self.store_mode_dict = {EDataCacheType.E_DATA_CACHE_CSV.value: u'csv模式(推荐)',
-                                EDataCacheType.E_DATA_CACHE_HDF5.value: u'hdf5模式'}
+                                EDataCacheType.E_DATA_CACHE_HDF5.value: u'hdf5模式',
+                                EDataCacheType.E_DATA_CACHE_COLUMNAR.value: u'列式存储模式'}
         self.store_mode = widgets.RadioButtons(
-            options=[u'csv模式(推荐)', u'hdf5模式'],
+            options=[u'csv模式(推荐)', u'hdf5模式', u'列式存储模式'],
             value=self.store_mode_dict[ABuEnv.g_data_cache_type.value],
             description=u'缓存模式:',
             disabled=False
@@ -0,0 +1,85 @@
+"""Job result artifacts: large result sections stored as gzip'd NDJSON files next to the job row."""
+
+from pathlib import Path
+from typing import Iterator, Optional
+import gzip
+import json
+import os
+import re
+import shutil
+
+from .config import get_settings
+
+
+ARTIFACT_FORMAT = "ndjson.gz"
+
+
+def artifact_root() -> Path:
+    return Path(get_settings().artifact_dir)
+
+
+def _job_dir(job_id: int) -> Path:
+    return artifact_root() / f"job_{int(job_id)}"
+
+
+def _section_name(section: str) -> str:
+    return re.sub(r"[^0-9A-Za-z_-]", "_", str(section)) or "section"
+
+
+def write_section(job_id: int, section: str, rows: list) -> dict:
+    job_dir = _job_dir(job_id)
+    job_dir.mkdir(parents=True, exist_ok=True)
+    path = job_dir / f"{_section_name(section)}.{ARTIFACT_FORMAT}"
+    tmp = path.with_name(path.name + ".tmp")
+    columns: dict[str, None] = {}
+    with gzip.open(tmp, "wt", encoding="utf-8") as fh:
+        for row in rows:
+            if isinstance(row, dict):
+                columns.update(dict.fromkeys(row))
+            fh.write(json.dumps(row, ensure_ascii=False, default=str))
+            fh.write("\n")
+    os.replace(tmp, path)
+    return {
+        "format": ARTIFACT_FORMAT,
+        "path": str(path.relative_to(artifact_root())),
+        "rows": len(rows),
+        "bytes": path.stat().st_size,
+        "columns": list(columns),
+    }
+
+
+def store_result(job_id: int, result) -> tuple[object, Optional[dict]]:
+    """Move long list sections of a result into artifacts; returns (inline result with previews, artifacts)."""
+    if not isinstance(result, dict):
+        return result, None
+    preview_rows = get_settings().artifact_preview_rows
+    inline = dict(result)
+    artifacts = {}
+    for section, value in result.items():
+        if isinstance(value, list) and len(value) > preview_rows:
+            artifacts[section] = write_section(job_id, section, value)
+            inline[section] = value[:preview_rows]
+    return inline, artifacts or None
+
+
+def artifact_path(meta: dict) -> Path:
+    root = artifact_root().resolve()
+    path = (root / meta["path"]).resolve()
+    if root not in path.parents:
+        raise ValueError("Artifact path outside artifact_dir")
+    return path
+
+
+def iter_section_lines(meta: dict, offset: int = 0, limit: Optional[int] = None) -> Iterator[str]:
+    """JSON text of rows [offset, offset + limit) of an artifact, without the trailing newline."""
+    with gzip.open(artifact_path(meta), "rt", encoding="utf-8") as fh:
+        for index, line in enumerate(fh):
+            if index < offset:
+                continue
+            if limit is not None and index >= offset + limit:
+                break
+            yield line.rstrip("\n")
+
+
+def remove_job_artifacts(job_id: int) -> None:
+    shutil.rmtree(_job_dir(job_id), ignore_errors=True)
@@ -1,11 +1,15 @@
 from typing import Optional
+import io
 
 from sqlalchemy.orm import Session
-from sqlalchemy import select, or_, and_, func, not_
+from sqlalchemy import select, delete, or_, and_, func, not_, text, table, column, cast, Integer
 from sqlalchemy.dialects.postgresql import insert as pg_insert
 from datetime import date
 
-from . import models, schemas
+from . import artifacts, models, schemas
+from .config import get_settings
+from .kline_cache import kline_frames
+from .symbol_index import symbol_index
 
 
 def _dedupe_rows(rows: list[dict], keys: tuple[str, ...]) -> list[dict]:
@@ -28,7 +32,10 @@ def _market_filter(model, markets: Optional[list[str]]):
 
 
 def create_quant_job(db: Session, payload: schemas.QuantJobCreate) -> models.QuantJob:
-    job = models.QuantJob(type=payload.type, params=payload.params, status="queued")
+    priority = payload.priority
+    if priority is None:
+        priority = get_settings().job_priorities.get(payload.type, 0)
+    job = models.QuantJob(type=payload.type, params=payload.params, status="queued", priority=priority)
     db.add(job)
     db.commit()
     db.refresh(job)
@@ -52,10 +59,21 @@ def set_quant_job_running(db: Session, job: models.QuantJob) -> models.QuantJob:
     return job
 
 
+def get_quant_job_progress(db: Session, job_id: int):
+    stmt = select(
+        models.QuantJob.id,
+        models.QuantJob.status,
+        models.QuantJob.progress,
+        models.QuantJob.cancel_requested,
+    ).where(models.QuantJob.id == job_id)
+    return db.execute(stmt).first()
+
+
 def set_quant_job_result(db: Session, job: models.QuantJob, result: dict) -> models.QuantJob:
     job.status = "succeeded"
-    job.result = result
+    job.result, job.artifacts = artifacts.store_result(job.id, result)
     job.error = None
+    job.progress = 100.0
     db.add(job)
     db.commit()
     db.refresh(job)
@@ -71,92 +89,40 @@ def set_quant_job_error(db: Session, job: models.QuantJob, error: str) -> models
     return job
 
 
+def set_quant_job_cancelled(db: Session, job: models.QuantJob) -> models.QuantJob:
+    job.status = "cancelled"
+    job.error = "Cancelled"
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    return job
+
+
+def request_quant_job_cancel(db: Session, job: models.QuantJob) -> models.QuantJob:
+    job.cancel_requested = True
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    return job
+
+
 def delete_quant_job(db: Session, job: models.QuantJob) -> None:
+    job_id = job.id
     db.delete(job)
     db.commit()
+    artifacts.remove_job_artifacts(job_id)
 
 
-def search_stock_symbols(
-    db: Session,
-    markets: Optional[list[str]],
-    query: Optional[str],
-    kind: Optional[str],
-    page: int = 1,
-    page_size: int = 50,
-) -> tuple[list[models.StockSymbol], int]:
-    filters = []
-    stmt = select(models.StockSymbol)
-    if markets:
-        market_pred = _market_filter(models.StockSymbol, markets)
-        if market_pred is not None:
-            filters.append(market_pred)
-        prefix_filters = []
-        if "SH" in markets:
-            prefix_filters.append(models.StockSymbol.symbol.ilike("sh%"))
-        if "SZ" in markets:
-            if "300" in markets:
-                prefix_filters.append(models.StockSymbol.symbol.ilike("sz%"))
-            else:
-                prefix_filters.append(
-                    and_(
-                        models.StockSymbol.symbol.ilike("sz%"),
-                        not_(models.StockSymbol.symbol.ilike("sz3%")),
-                    )
-                )
-        if "300" in markets:
-            prefix_filters.append(models.StockSymbol.symbol.ilike("sz3%"))
-        if prefix_filters:
-            filters.append(or_(*prefix_filters))
-    if query:
-        cleaned = query.strip()
-        if cleaned.isdigit():
-            filters.append(models.StockSymbol.symbol.ilike(f"%{cleaned}%"))
-        else:
-            like = f"%{cleaned}%"
-            filters.append(
-                (models.StockSymbol.symbol.ilike(like))
-                | (models.StockSymbol.name.ilike(like))
-            )
-    if kind and kind != "all":
-        name = func.coalesce(models.StockSymbol.name, "")
-        industry = func.coalesce(models.StockSymbol.industry, "")
-        index_pred = or_(
-            name.ilike("%指数%"),
-            industry.ilike("%指数%"),
-            models.StockSymbol.symbol.ilike("sh000%"),
-            models.StockSymbol.symbol.ilike("sz399%"),
-        )
-        if kind == "index":
-            filters.append(index_pred)
-        elif kind == "stock":
-            filters.append(not_(index_pred))
-            if markets:
-                if "SH" in markets:
-                    filters.append(
-                        or_(
-                            models.StockSymbol.symbol.ilike("sh6%"),
-                            models.StockSymbol.symbol.ilike("sh9%"),
-                        )
-                    )
-                if "SZ" in markets:
-                    filters.append(
-                        or_(
-                            models.StockSymbol.symbol.ilike("sz0%"),
-                            models.StockSymbol.symbol.ilike("sz2%"),
-                        )
-                    )
-                if "300" in markets and "SZ" not in markets:
-                    filters.append(models.StockSymbol.symbol.ilike("sz3%"))
-    if filters:
-        stmt = stmt.where(*filters)
-    total_stmt = select(func.count()).select_from(models.StockSymbol)
-    if filters:
-        total_stmt = total_stmt.where(*filters)
-    total = db.execute(total_stmt).scalar_one()
-    offset = max(0, (page - 1) * page_size)
-    stmt = stmt.order_by(models.StockSymbol.symbol).offset(offset).limit(page_size)
-    result = db.execute(stmt)
-    return result.scalars().all(), int(total)
+def delete_idle_quant_job(db: Session, job_id: int) -> bool:
+    # a worker may claim the job between the read and the delete, only delete it when it is not running
+    result = db.execute(
+        delete(models.QuantJob).where(models.QuantJob.id == job_id, models.QuantJob.status != "running")
+    )
+    db.commit()
+    if not result.rowcount:
+        return False
+    artifacts.remove_job_artifacts(job_id)
+    return True
 
 
 def search_stock_symbols_from_klines(
@@ -283,6 +249,7 @@ def upsert_stock_symbols(db: Session, rows: list[dict]) -> int:
     )
     result = db.execute(stmt)
     db.commit()
+    symbol_index.invalidate()
     return result.rowcount or 0
 
 
@@ -302,6 +269,76 @@ def upsert_stock_klines(db: Session, rows: list[dict]) -> int:
     )
     result = db.execute(stmt)
     db.commit()
+    kline_frames.invalidate({(row["market"], row["symbol"]) for row in rows})
+    return result.rowcount or 0
+
+
+KLINE_COPY_COLUMNS = (
+    "market",
+    "symbol",
+    "trade_date",
+    "open",
+    "close",
+    "high",
+    "low",
+    "pre_close",
+    "p_change",
+    "volume",
+    "date_week",
+    "key",
+    "atr14",
+    "atr21",
+)
+KLINE_CONFLICT_COLUMNS = ("market", "symbol", "trade_date")
+KLINE_STAGE_TABLE = "stock_klines_stage"
+
+
+def create_kline_stage(db: Session) -> None:
+    columns = models.StockKline.__table__.columns
+    dialect = db.get_bind().dialect
+    ddl = ", ".join(f'"{name}" {columns[name].type.compile(dialect=dialect)}' for name in KLINE_COPY_COLUMNS)
+    # seq keeps COPY order so the merge can prefer the last copy of a duplicated row
+    db.execute(
+        text(f"CREATE TEMP TABLE IF NOT EXISTS {KLINE_STAGE_TABLE} (seq BIGSERIAL, {ddl}) ON COMMIT DROP")
+    )
+
+
+def copy_kline_stage(db: Session, frame) -> int:
+    if frame is None or frame.empty:
+        return 0
+    buf = io.StringIO()
+    frame.to_csv(buf, columns=list(KLINE_COPY_COLUMNS), header=False, index=False)
+    buf.seek(0)
+    names = ", ".join(f'"{name}"' for name in KLINE_COPY_COLUMNS)
+    raw = db.connection().connection
+    cursor = raw.cursor()
+    try:
+        cursor.copy_expert(f"COPY {KLINE_STAGE_TABLE} ({names}) FROM STDIN WITH (FORMAT csv)", buf)
+    finally:
+        cursor.close()
+    return len(frame)
+
+
+def merge_kline_stage(db: Session) -> int:
+    stage = table(KLINE_STAGE_TABLE, column("seq"), *[column(name) for name in KLINE_COPY_COLUMNS])
+    keys = [stage.c[name] for name in KLINE_CONFLICT_COLUMNS]
+    source = (
+        select(*[stage.c[name] for name in KLINE_COPY_COLUMNS])
+        .distinct(*keys)
+        .order_by(*keys, stage.c.seq.desc())
+    )
+    stmt = pg_insert(models.StockKline).from_select(list(KLINE_COPY_COLUMNS), source)
+    update_cols = {
+        name: getattr(stmt.excluded, name) for name in KLINE_COPY_COLUMNS if name not in KLINE_CONFLICT_COLUMNS
+    }
+    update_cols["updated_at"] = func.now()
+    stmt = stmt.on_conflict_do_update(
+        index_elements=list(KLINE_CONFLICT_COLUMNS),
+        set_=update_cols,
+    )
+    result = db.execute(stmt)
+    db.commit()
+    kline_frames.invalidate()
     return result.rowcount or 0
 
 
@@ -323,3 +360,77 @@ def load_klines(
     stmt = stmt.order_by(models.StockKline.trade_date)
     result = db.execute(stmt)
     return result.scalars().all()
+
+
+KLINE_FRAME_COLUMNS = (
+    "date",
+    "date_week",
+    "key",
+    "open",
+    "close",
+    "high",
+    "low",
+    "pre_close",
+    "p_change",
+    "volume",
+    "atr14",
+    "atr21",
+)
+
+
+def load_kline_arrays(
+    db: Session,
+    market: str,
+    symbol: str,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    columns: tuple[str, ...] = KLINE_FRAME_COLUMNS,
+    limit: Optional[int] = None,
+) -> dict:
+    """Column arrays ordered by date; with limit only the latest `limit` rows are read."""
+    import numpy as np
+
+    kline = models.StockKline
+    stmt = select(
+        cast(func.to_char(kline.trade_date, "YYYYMMDD"), Integer).label("date"),
+        *[getattr(kline, name) for name in columns[1:]],
+    ).where(kline.market == market, kline.symbol == symbol)
+    if start:
+        stmt = stmt.where(kline.trade_date >= start)
+    if end:
+        stmt = stmt.where(kline.trade_date <= end)
+    if limit:
+        stmt = stmt.order_by(kline.trade_date.desc()).limit(limit)
+    else:
+        stmt = stmt.order_by(kline.trade_date)
+    rows = db.execute(stmt).all()
+    if limit:
+        rows.reverse()
+    if not rows:
+        return {name: np.empty(0, dtype=np.int32 if name == "date" else np.float64) for name in columns}
+    values = list(zip(*rows))
+    # NULL becomes nan in the float columns
+    arrays = {"date": np.array(values[0], dtype=np.int32)}
+    for name, column_values in zip(columns[1:], values[1:]):
+        arrays[name] = np.array(column_values, dtype=np.float64)
+    return arrays
+
+
+def kline_version(
+    db: Session,
+    market: str,
+    symbol: str,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+) -> tuple[int, Optional[object]]:
+    """(row count, latest updated_at) of a symbol range, cheap enough to validate cached responses."""
+    kline = models.StockKline
+    stmt = select(func.count(), func.max(kline.updated_at)).where(
+        kline.market == market, kline.symbol == symbol
+    )
+    if start:
+        stmt = stmt.where(kline.trade_date >= start)
+    if end:
+        stmt = stmt.where(kline.trade_date <= end)
+    count, updated = db.execute(stmt).one()
+    return int(count or 0), updated
@@ -0,0 +1,65 @@
+"""Server-side downsampling of K-line columns to a target point count."""
+
+import numpy as np
+
+
+def bucket_edges(n: int, points: int) -> np.ndarray:
+    return np.linspace(0, n, points + 1).astype(np.int64)
+
+
+def ohlc_buckets(columns: dict, points: int) -> dict:
+    """Merge consecutive bars into `points` OHLC bars: first open, max high, min low, last close, summed volume."""
+    n = len(columns["date"])
+    if points <= 0 or n <= points:
+        return columns
+    edges = bucket_edges(n, points)
+    starts, ends = edges[:-1], edges[1:]
+    out = {"date": columns["date"][starts]}
+    if "open" in columns:
+        out["open"] = columns["open"][starts]
+    if "close" in columns:
+        out["close"] = columns["close"][ends - 1]
+    if "high" in columns:
+        # fmax/fmin skip missing values inside a bucket
+        out["high"] = np.fmax.reduceat(columns["high"], starts)
+    if "low" in columns:
+        out["low"] = np.fmin.reduceat(columns["low"], starts)
+    if "volume" in columns:
+        volume = columns["volume"]
+        sums = np.add.reduceat(np.nan_to_num(volume, nan=0.0), starts)
+        empty = np.logical_and.reduceat(np.isnan(volume), starts)
+        out["volume"] = np.where(empty, np.nan, sums)
+    return out
+
+
+def lttb_indices(y: np.ndarray, points: int) -> np.ndarray:
+    """Largest-Triangle-Three-Buckets over (index, y); keeps the first and last point."""
+    n = len(y)
+    if points >= n or points < 3:
+        return np.arange(n)
+    y = np.where(np.isnan(y), np.nanmean(y) if np.isfinite(y).any() else 0.0, y)
+    edges = np.linspace(1, n - 1, points - 1).astype(np.int64)
+    selected = np.empty(points, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    prev = 0
+    for bucket in range(points - 2):
+        lo, hi = edges[bucket], edges[bucket + 1]
+        next_lo, next_hi = edges[bucket + 1], edges[bucket + 2] if bucket + 2 < len(edges) else n
+        if next_hi <= next_lo:
+            next_hi = next_lo + 1
+        avg_x = (next_lo + next_hi - 1) / 2.0
+        avg_y = y[next_lo:next_hi].mean()
+        xs = np.arange(lo, hi)
+        areas = np.abs((prev - avg_x) * (y[lo:hi] - y[prev]) - (prev - xs) * (avg_y - y[prev]))
+        prev = lo + int(np.argmax(areas))
+        selected[bucket + 1] = prev
+    return selected
+
+
+def lttb(columns: dict, points: int, field: str = "close") -> dict:
+    n = len(columns["date"])
+    if points <= 0 or n <= points:
+        return columns
+    keep = lttb_indices(columns[field], points)
+    return {name: values[keep] for name, values in columns.items()}
@@ -0,0 +1,313 @@
+"""Job worker subsystem: a quant_jobs backed queue drained by a pool of worker processes.
+
+Run `python -m app.jobs` to start workers outside the API process (set JOB_WORKERS=0 for the API).
+"""
+
+from pathlib import Path
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+from typing import Callable, Optional
+
+from sqlalchemy import func, select, text, update
+from sqlalchemy.orm import Session
+
+from . import crud, models
+from .config import get_settings
+from .database import SessionLocal, engine
+
+logger = logging.getLogger("doraemon")
+
+# pg_advisory_xact_lock key serializing claims so per-type limits hold across worker processes
+CLAIM_LOCK_KEY = 0x71756A6F
+PROGRESS_MIN_INTERVAL = 1.0
+
+QUEUE_SCHEMA_SQL = (
+    "ALTER TABLE quant_jobs ADD COLUMN IF NOT EXISTS priority INTEGER NOT NULL DEFAULT 0",
+    "ALTER TABLE quant_jobs ADD COLUMN IF NOT EXISTS progress DOUBLE PRECISION",
+    "ALTER TABLE quant_jobs ADD COLUMN IF NOT EXISTS cancel_requested BOOLEAN NOT NULL DEFAULT false",
+    "ALTER TABLE quant_jobs ADD COLUMN IF NOT EXISTS worker VARCHAR(64)",
+    "ALTER TABLE quant_jobs ADD COLUMN IF NOT EXISTS started_at TIMESTAMP WITH TIME ZONE",
+    "ALTER TABLE quant_jobs ADD COLUMN IF NOT EXISTS artifacts JSONB",
+    "CREATE INDEX IF NOT EXISTS ix_quant_jobs_queue ON quant_jobs (status, priority, id)",
+)
+
+
+class JobCancelled(BaseException):
+    """Raised from progress hooks; a BaseException so abupy's `except Exception` guards do not swallow it."""
+
+
+def ensure_queue_schema() -> None:
+    # create_all does not add columns to an existing quant_jobs table
+    with engine.begin() as conn:
+        for stmt in QUEUE_SCHEMA_SQL:
+            conn.execute(text(stmt))
+
+
+def worker_name() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def claim_job(db: Session, worker: str, type_limits: dict[str, int]) -> Optional[int]:
+    job = models.QuantJob
+    db.execute(select(func.pg_advisory_xact_lock(CLAIM_LOCK_KEY)))
+    running = dict(
+        db.execute(select(job.type, func.count()).where(job.status == "running").group_by(job.type)).all()
+    )
+    full = [job_type for job_type, limit in type_limits.items() if running.get(job_type, 0) >= limit]
+    stmt = select(job.id).where(job.status == "queued")
+    if full:
+        stmt = stmt.where(job.type.not_in(full))
+    stmt = stmt.order_by(job.priority.desc(), job.id).limit(1).with_for_update(skip_locked=True)
+    job_id = db.execute(stmt).scalar_one_or_none()
+    if job_id is not None:
+        db.execute(
+            update(job)
+            .where(job.id == job_id)
+            .values(status="running", worker=worker, started_at=func.now(), progress=0.0)
+        )
+    db.commit()
+    return job_id
+
+
+class ProgressReporter:
+    """abupy progress hook: stores the job progress and raises JobCancelled once cancellation is requested."""
+
+    def __init__(self, job_id: int, min_interval: float = PROGRESS_MIN_INTERVAL):
+        self.job_id = job_id
+        self.min_interval = min_interval
+        self._last = 0.0
+
+    def __call__(self, label, percent) -> None:
+        now = time.monotonic()
+        if now - self._last < self.min_interval:
+            return
+        self._last = now
+        session = SessionLocal()
+        try:
+            cancel = session.execute(
+                update(models.QuantJob)
+                .where(models.QuantJob.id == self.job_id)
+                .values(progress=min(100.0, max(0.0, float(percent))))
+                .returning(models.QuantJob.cancel_requested)
+            ).scalar_one_or_none()
+            session.commit()
+        finally:
+            session.close()
+        if cancel:
+            raise JobCancelled(self.job_id)
+
+
+_current_reporter: Optional[ProgressReporter] = None
+
+
+def report_progress(done: int, total: int, label: str = "") -> None:
+    """Progress for job code that does not go through abupy progress bars; no-op outside a worker."""
+    if _current_reporter is not None and total:
+        _current_reporter(label, done / total * 100)
+
+
+def run_claimed_job(job_id: int, run: Callable[[int], None]) -> None:
+    global _current_reporter
+    from abupy.UtilBu import ABuProgress
+
+    reporter = ProgressReporter(job_id)
+    prev_hook = ABuProgress.g_progress_hook
+    ABuProgress.g_progress_hook = reporter
+    _current_reporter = reporter
+    try:
+        run(job_id)
+    except JobCancelled:
+        logger.info("Job %s cancelled", job_id)
+    finally:
+        ABuProgress.g_progress_hook = prev_hook
+        _current_reporter = None
+
+    db = SessionLocal()
+    try:
+        job = crud.get_quant_job(db, job_id)
+        # the cancel escaped or abupy swallowed it before the job finished; a job that already reached a final
+        # state keeps it
+        if job and job.cancel_requested and job.status == "running":
+            crud.set_quant_job_cancelled(db, job)
+    finally:
+        db.close()
+
+
+def worker_main(poll_interval: float, parent_pid: Optional[int] = None) -> None:
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s %(message)s")
+    # spawned fresh, but never reuse pooled connections inherited from a parent
+    engine.dispose()
+    # lead a process group so stopping the worker also stops the abupy pool processes it forks
+    if hasattr(os, "setpgrp"):
+        os.setpgrp()
+    from .routes import _run_job
+
+    settings = get_settings()
+    worker = worker_name()
+    logger.info("Job worker %s started", worker)
+    while True:
+        # workers are not daemonic so backtests can open process pools, leave once the pool owner is gone
+        if parent_pid is not None and os.getppid() != parent_pid:
+            logger.info("Job worker %s exiting, parent %s is gone", worker, parent_pid)
+            return
+        db = SessionLocal()
+        try:
+            job_id = claim_job(db, worker, settings.job_type_limits)
+        except Exception:
+            logger.exception("Job worker %s failed to claim", worker)
+            job_id = None
+        finally:
+            db.close()
+        if job_id is None:
+            time.sleep(poll_interval)
+            continue
+        run_claimed_job(job_id, _run_job)
+
+
+def reap_orphaned_jobs(alive_pids: set[int]) -> int:
+    """Fail running jobs claimed by workers of this host that no longer exist."""
+    host = socket.gethostname()
+    db = SessionLocal()
+    try:
+        rows = db.execute(
+            select(models.QuantJob.id, models.QuantJob.worker).where(
+                models.QuantJob.status == "running", models.QuantJob.worker.like(f"{host}:%")
+            )
+        ).all()
+        orphaned = []
+        for job_id, worker in rows:
+            pid = int(worker.rsplit(":", 1)[1])
+            if pid not in alive_pids and not _pid_alive(pid):
+                orphaned.append(job_id)
+        if orphaned:
+            db.execute(
+                update(models.QuantJob)
+                .where(models.QuantJob.id.in_(orphaned), models.QuantJob.status == "running")
+                .values(status="failed", error="Job worker exited")
+            )
+            db.commit()
+        return len(orphaned)
+    finally:
+        db.close()
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _signal_worker(proc, kill: bool = False) -> None:
+    """Terminate or kill a worker together with the abupy pool processes in its process group."""
+    alive = proc.is_alive()
+    if hasattr(os, "killpg"):
+        try:
+            group = os.getpgid(proc.pid)
+        except ProcessLookupError:
+            group = None
+        # an unreaped worker keeps its pid, signal its group once it leads one; a reaped worker's pid may be reused,
+        # but not while its pool processes still use it as their group id, so its group is only signalled when no
+        # process owns that pid any more
+        if group == proc.pid if alive else group is None:
+            try:
+                os.killpg(proc.pid, signal.SIGKILL if kill else signal.SIGTERM)
+            except (ProcessLookupError, PermissionError):
+                pass
+            return
+    if alive:
+        if kill:
+            proc.kill()
+        else:
+            proc.terminate()
+
+
+class JobWorkerPool:
+    """Keeps `workers` spawned worker processes alive until stop()."""
+
+    def __init__(self, workers: int, poll_interval: float):
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self._ctx = multiprocessing.get_context("spawn")
+        self._procs: list = []
+        self._stop = threading.Event()
+        self._monitor: Optional[threading.Thread] = None
+
+    def _spawn(self):
+        proc = self._ctx.Process(
+            target=worker_main, args=(self.poll_interval, os.getpid()), name="doraemon-job-worker", daemon=False
+        )
+        proc.start()
+        return proc
+
+    def start(self) -> None:
+        reap_orphaned_jobs(set())
+        self._procs = [self._spawn() for _ in range(self.workers)]
+        self._monitor = threading.Thread(target=self._watch, name="doraemon-job-monitor", daemon=True)
+        self._monitor.start()
+
+    def _watch(self) -> None:
+        while not self._stop.wait(self.poll_interval * 5):
+            if all(proc.is_alive() for proc in self._procs):
+                continue
+            alive = {proc.pid for proc in self._procs if proc.is_alive()}
+            try:
+                reaped = reap_orphaned_jobs(alive)
+            except Exception:
+                logger.exception("Failed to reap orphaned jobs")
+                reaped = 0
+            for index, proc in enumerate(self._procs):
+                if not proc.is_alive() and not self._stop.is_set():
+                    logger.warning("Job worker %s exited with %s, restarting", proc.pid, proc.exitcode)
+                    # pool processes left behind by the dead worker would keep running its job
+                    _signal_worker(proc, kill=True)
+                    self._procs[index] = self._spawn()
+            if reaped:
+                logger.warning("Marked %s orphaned jobs as failed", reaped)
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        for proc in self._procs:
+            if proc.is_alive():
+                _signal_worker(proc)
+        for proc in self._procs:
+            proc.join(timeout)
+            # also reaches pool processes that outlived their worker
+            _signal_worker(proc, kill=True)
+            proc.join(timeout)
+        if self._monitor is not None:
+            self._monitor.join(timeout)
+        try:
+            reap_orphaned_jobs(set())
+        except Exception:
+            logger.exception("Failed to reap orphaned jobs")
+
+
+if __name__ == "__main__":
+    repo_root = str(Path(__file__).resolve().parents[2])
+    if repo_root not in sys.path:
+        sys.path.insert(0, repo_root)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s %(message)s")
+    # import through the package so spawned workers unpickle app.jobs.worker_main, not __main__
+    from app.jobs import JobWorkerPool, ensure_queue_schema
+
+    ensure_queue_schema()
+    settings = get_settings()
+    pool = JobWorkerPool(max(1, settings.job_workers), settings.job_poll_interval)
+    pool.start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        pool.stop()
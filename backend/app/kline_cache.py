@@ -0,0 +1,81 @@
+from collections import OrderedDict
+from threading import Lock
+import time
+from typing import Callable, Hashable, Optional
+
+from .config import get_settings
+
+
+_MISSING = object()
+
+
+class KlineFrameCache:
+    """Bounded LRU of ready K-line frames keyed by (market, symbol, start, end).
+
+    Klines are also written by job worker processes whose `invalidate` calls never reach this process, so every
+    entry remembers the version it was loaded at and is reloaded when the caller's current version differs. The
+    version is checked at most once per `refresh` seconds per entry, hits in between do not call it.
+    """
+
+    def __init__(self, maxsize: int, refresh: float = 0.0):
+        self.maxsize = maxsize
+        self.refresh = refresh
+        self._frames: OrderedDict = OrderedDict()
+        self._lock = Lock()
+        # bumped on every invalidation, a load that raced with a write is not stored
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_load(
+        self,
+        key: Hashable,
+        loader: Callable[[], Optional["pandas.DataFrame"]],
+        version: Callable[[], Hashable],
+    ):
+        with self._lock:
+            entry = self._frames.get(key, _MISSING)
+            if entry is not _MISSING and time.monotonic() - entry[2] < self.refresh:
+                return self._hit(key, entry)
+        # read before loading: a write landing during the load leaves a stale version and a reload next time
+        checked = time.monotonic()
+        current = version()
+        with self._lock:
+            entry = self._frames.get(key, _MISSING)
+            if entry is not _MISSING and entry[1] == current:
+                entry = self._frames[key] = (entry[0], current, checked)
+                return self._hit(key, entry)
+            self.misses += 1
+            generation = self._generation
+        frame = loader()
+        if self.maxsize > 0:
+            with self._lock:
+                if generation == self._generation:
+                    self._frames[key] = (frame, current, checked)
+                    self._frames.move_to_end(key)
+                    while len(self._frames) > self.maxsize:
+                        self._frames.popitem(last=False)
+        return None if frame is None else frame.copy()
+
+    def _hit(self, key: Hashable, entry: tuple):
+        self._frames.move_to_end(key)
+        self.hits += 1
+        frame = entry[0]
+        return None if frame is None else frame.copy()
+
+    def invalidate(self, symbols: Optional[set[tuple[str, str]]] = None) -> None:
+        """Drop cached frames of the given (market, symbol) pairs, or every frame when symbols is None."""
+        with self._lock:
+            self._generation += 1
+            if symbols is None:
+                self._frames.clear()
+                return
+            for key in [key for key in self._frames if key[:2] in symbols]:
+                del self._frames[key]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"size": len(self._frames), "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses}
+
+
+kline_frames = KlineFrameCache(get_settings().kline_cache_size, get_settings().kline_cache_refresh)
@@ -1,3 +1,4 @@
+from contextlib import asynccontextmanager
 from pathlib import Path
 import sys
 import logging
@@ -13,9 +14,11 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 
 from .config import get_settings
-from .database import Base, engine
+from .database import Base, SessionLocal, engine
+from .jobs import JobWorkerPool, ensure_queue_schema
 from .routes import router
 from .schemas import APIResponse
+from .symbol_index import symbol_index
 
 settings = get_settings()
 
@@ -26,8 +29,35 @@ logging.basicConfig(
 logger = logging.getLogger("doraemon")
 
 Base.metadata.create_all(bind=engine)
-
-app = FastAPI(title=settings.app_name, version="1.0.0", openapi_url=f"{settings.api_prefix}/openapi.json")
+ensure_queue_schema()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    db = SessionLocal()
+    try:
+        symbol_index.get(db)
+    except Exception:
+        logger.exception("Failed to build the symbol index, it is retried on the first search")
+    finally:
+        db.close()
+    pool = None
+    if settings.job_workers > 0:
+        pool = JobWorkerPool(settings.job_workers, settings.job_poll_interval)
+        pool.start()
+    try:
+        yield
+    finally:
+        if pool is not None:
+            pool.stop()
+
+
+app = FastAPI(
+    title=settings.app_name,
+    version="1.0.0",
+    openapi_url=f"{settings.api_prefix}/openapi.json",
+    lifespan=lifespan,
+)
 
 app.add_middleware(
     CORSMiddleware,
@@ -53,6 +83,7 @@ async def http_exception_handler(request: Request, exc: HTTPException):
     return JSONResponse(
         status_code=exc.status_code,
         content=APIResponse(message=str(exc.detail), data={"error": str(exc.detail)}).model_dump(),
+        headers=getattr(exc, "headers", None),
     )
 
 
@@ -1,4 +1,16 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, Date, Float, BigInteger, UniqueConstraint, Index
+from sqlalchemy import (
+    Column,
+    Integer,
+    String,
+    Text,
+    DateTime,
+    Date,
+    Float,
+    BigInteger,
+    Boolean,
+    UniqueConstraint,
+    Index,
+)
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.sql import func
 
@@ -14,9 +26,17 @@ class QuantJob(Base):
     params = Column(JSONB, nullable=False, default=dict)
     result = Column(JSONB, nullable=True)
     error = Column(Text, nullable=True)
+    priority = Column(Integer, nullable=False, default=0, server_default="0")
+    progress = Column(Float, nullable=True)
+    cancel_requested = Column(Boolean, nullable=False, default=False, server_default="false")
+    worker = Column(String(64), nullable=True)
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    artifacts = Column(JSONB, nullable=True)
     created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
     updated_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now(), onupdate=func.now())
 
+    __table_args__ = (Index("ix_quant_jobs_queue", "status", "priority", "id"),)
+
 
 class StockSymbol(Base):
     __tablename__ = "stock_symbols"
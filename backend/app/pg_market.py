@@ -0,0 +1,111 @@
+"""Postgres-backed abupy market source that also works inside abupy's worker processes.
+
+The source classes live at module level so `AbuEnvProcess` can pickle `ABuEnv.g_private_data_source` by
+reference, and `init_worker_process` is installed as abupy's process-pool initializer so every child builds
+its own connection pool instead of sharing sockets inherited from the parent, and leaves progress reporting to it.
+"""
+
+from contextlib import contextmanager
+
+from abupy.MarketBu.ABuDataBase import StockBaseMarket, SupportMixin
+
+from .database import engine
+
+
+class PGMarketData(StockBaseMarket, SupportMixin):
+    """Reads klines through the frame cache, falls back to the network sources and writes fetched rows back."""
+
+    write_back = True
+
+    def minute(self, *args, **kwargs):
+        return None
+
+    def kline(self, n_folds=2, start=None, end=None):
+        from abupy.CoreBu import ABuEnv
+        from abupy.CoreBu.ABuEnv import EMarketSourceType
+        from abupy.MarketBu.ABuDataSource import source_dict
+
+        from . import crud
+        from .database import SessionLocal
+        from .routes import (
+            CN_MARKETS,
+            _fetch_akshare_df,
+            _kl_rows_from_df,
+            _load_kl_df,
+            _market_from_symbol,
+            _parse_date_str,
+        )
+
+        symbol_value = self._symbol.value
+        market = _market_from_symbol(symbol_value)
+        start_date = _parse_date_str(start)
+        end_date = _parse_date_str(end)
+        cached = _load_kl_df(None, market, symbol_value, start=start_date, end=end_date)
+        if cached is not None:
+            first = cached.index[0].date()
+            last = cached.index[-1].date()
+            if (not start_date or first <= start_date) and (not end_date or last >= end_date):
+                return cached
+        source_order = [
+            ABuEnv.g_market_source.value,
+            EMarketSourceType.E_MARKET_SOURCE_tx.value,
+            EMarketSourceType.E_MARKET_SOURCE_nt.value,
+            EMarketSourceType.E_MARKET_SOURCE_bd.value,
+        ]
+        seen = set()
+        df = None
+        for source_value in source_order:
+            if source_value in seen:
+                continue
+            seen.add(source_value)
+            source_cls = source_dict.get(source_value)
+            if not source_cls:
+                continue
+            df = source_cls(self._symbol).kline(n_folds=n_folds, start=start, end=end)
+            if df is not None and not getattr(df, "empty", False):
+                break
+        if df is None or getattr(df, "empty", False):
+            if market in CN_MARKETS or market == "CN":
+                df = _fetch_akshare_df(symbol_value, start, end, n_folds)
+        if df is None or getattr(df, "empty", False):
+            return df
+        if self.write_back:
+            session = SessionLocal()
+            try:
+                crud.upsert_stock_klines(session, _kl_rows_from_df(df, market, symbol_value))
+            finally:
+                session.close()
+        return df
+
+
+class PGMarketDataReadOnly(PGMarketData):
+    """Same lookups without writing fetched klines, for callers that persist rows themselves."""
+
+    write_back = False
+
+
+def pg_market_source(write_back: bool = True) -> type:
+    return PGMarketData if write_back else PGMarketDataReadOnly
+
+
+def init_worker_process() -> None:
+    from abupy.UtilBu import ABuProgress
+
+    # drop pooled connections inherited through fork without closing the parent's sockets
+    engine.dispose(close=False)
+    # the inherited job ProgressReporter would report this child's share as job progress from its own sessions,
+    # ABuParallel reports finished chunks from the parent instead
+    ABuProgress.g_progress_hook = None
+
+
+@contextmanager
+def pg_process_pool():
+    """Run abupy process pools opened inside the block with init_worker_process."""
+    from abupy.CoreBu import ABuParallel
+
+    prev = ABuParallel.g_process_initializer
+    ABuParallel.g_process_initializer = init_worker_process
+    try:
+        yield
+    finally:
+        ABuParallel.g_process_initializer = prev
@@ -1,29 +1,38 @@
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from contextlib import contextmanager
 from datetime import date, datetime, timedelta
 from itertools import product
 from pathlib import Path
 import csv
+import hashlib
 import io
 import json
 import logging
+import os
 import re
+import time
 from typing import Optional
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, status
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from sqlalchemy.orm import Session
 
-from . import crud, schemas
+from . import artifacts, crud, downsample, schemas
+from .config import get_settings
 from .database import get_db, SessionLocal
+from .jobs import report_progress
+from .kline_cache import kline_frames
+from .pg_market import pg_market_source, pg_process_pool
 from .strategies import MacdCrossBuy, MacdCrossSell
+from .symbol_index import symbol_index, symbol_kind
 
 router = APIRouter()
 quant_router = APIRouter(prefix="/quant", tags=["quant"])
 jobs_router = APIRouter(prefix="/jobs", tags=["jobs"])
 
-executor = ThreadPoolExecutor(max_workers=4)
 logger = logging.getLogger("doraemon")
+KL_UPDATE_WORKERS = 8
+KL_UPDATE_BATCH_ROWS = 50000
 SYMBOL_PREFIXES = ("us", "hk", "sh", "sz")
 CN_MARKETS = {"SH", "SZ", "300"}
 DEFAULT_SYMBOLS = {
@@ -321,6 +330,30 @@ def _param_int(config: dict, key: str, fallback: int) -> int:
     return fallback if value is None else value
 
 
+def _usable_cores() -> int:
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def _backtest_process_limit() -> int:
+    settings = get_settings()
+    if settings.backtest_processes > 0:
+        return settings.backtest_processes
+    # every backtest and grid_search job that can run concurrently gets an equal share of the cores
+    workers = max(1, settings.job_workers)
+    slots = sum(settings.job_type_limits.get(job_type, workers) for job_type in ("backtest", "grid_search"))
+    return max(1, _usable_cores() // max(1, min(workers, slots)))
+
+
+def _backtest_processes(config: dict, symbols: list[str]) -> int:
+    limit = _backtest_process_limit()
+    n_process = _param_int(config, "n_process", limit)
+    if n_process <= 0:
+        n_process = limit
+    return max(1, min(n_process, limit, len(symbols)))
+
+
 def _param_float(config: dict, key: str, fallback: float) -> float:
     value = _safe_float(config.get(key))
     return fallback if value is None else value
@@ -600,6 +633,17 @@ def _date_to_int(value) -> Optional[int]:
     return int(dt.strftime("%Y%m%d"))
 
 
+def _dates_to_int(values):
+    import pandas as pd
+
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values.dt.year * 10000 + values.dt.month * 100 + values.dt.day
+    if pd.api.types.is_integer_dtype(values):
+        parsed = pd.to_datetime(values.astype(str), format="%Y%m%d", errors="coerce")
+        return values.where(parsed.notna())
+    return values.apply(_date_to_int)
+
+
 def _date_week_from_int(value) -> Optional[int]:
     try:
         return datetime.strptime(str(int(value)), "%Y%m%d").weekday()
@@ -621,63 +665,62 @@ def _resolve_date_range(start: Optional[str], end: Optional[str], n_folds: int)
     return start_date, end_date
 
 
-def _kl_rows_from_df(df, market: str, symbol: str) -> list[dict]:
+KL_FLOAT_COLUMNS = ("open", "close", "high", "low", "pre_close", "p_change", "atr14", "atr21")
+KL_INT_COLUMNS = ("volume", "date_week", "key")
+
+
+def _kl_frame_from_df(df, market: str, symbol: str):
+    import numpy as np
+    import pandas as pd
+
     if df is None or getattr(df, "empty", False):
-        return []
+        return None
     df = _normalize_kl_df(df)
     if df is None or getattr(df, "empty", False):
+        return None
+    dates = pd.to_datetime(df["date"].astype("int64").astype(str), format="%Y%m%d", errors="coerce")
+    data = {
+        "market": market,
+        "symbol": symbol,
+        "trade_date": dates.dt.date.to_numpy(),
+    }
+    for col in KL_FLOAT_COLUMNS:
+        if col in df.columns:
+            data[col] = pd.to_numeric(df[col], errors="coerce").astype("float64").to_numpy()
+        else:
+            data[col] = np.nan
+    for col in KL_INT_COLUMNS:
+        if col in df.columns:
+            values = pd.to_numeric(df[col], errors="coerce").astype("float64").replace([np.inf, -np.inf], np.nan)
+            data[col] = pd.array(np.trunc(values.to_numpy()), dtype="Int64")
+        else:
+            data[col] = pd.array([None] * len(df), dtype="Int64")
+    frame = pd.DataFrame(data, columns=crud.KLINE_COPY_COLUMNS)
+    frame = frame[dates.notna().to_numpy()]
+    frame = frame.drop_duplicates(subset="trade_date", keep="last")
+    return frame.reset_index(drop=True)
+
+
+def _kl_rows_from_df(df, market: str, symbol: str) -> list[dict]:
+    frame = _kl_frame_from_df(df, market, symbol)
+    if frame is None or frame.empty:
         return []
-    rows = []
-    for _, row in df.iterrows():
-        trade_date = _parse_trade_date(row.get("date")) or _parse_trade_date(getattr(row, "name", None))
-        if trade_date is None:
-            continue
-        rows.append(
-            {
-                "market": market,
-                "symbol": symbol,
-                "trade_date": trade_date,
-                "open": _safe_float(row.get("open")),
-                "close": _safe_float(row.get("close")),
-                "high": _safe_float(row.get("high")),
-                "low": _safe_float(row.get("low")),
-                "pre_close": _safe_float(row.get("pre_close")),
-                "p_change": _safe_float(row.get("p_change")),
-                "volume": _safe_int(row.get("volume")),
-                "date_week": _safe_int(row.get("date_week")),
-                "key": _safe_int(row.get("key")),
-                "atr14": _safe_float(row.get("atr14")),
-                "atr21": _safe_float(row.get("atr21")),
-            }
-        )
-    return rows
+    return frame.astype(object).where(frame.notna(), None).to_dict("records")
 
 
-def _kl_df_from_rows(rows: list) -> Optional["pandas.DataFrame"]:
+def _kl_df_from_columns(columns: dict) -> Optional["pandas.DataFrame"]:
+    import numpy as np
     import pandas as pd
 
-    if not rows:
+    if not columns or len(columns["date"]) == 0:
         return None
-    data = []
-    for row in rows:
-        trade_date = row.trade_date
-        data.append(
-            {
-                "date": int(trade_date.strftime("%Y%m%d")),
-                "date_week": row.date_week if row.date_week is not None else trade_date.weekday(),
-                "key": row.key,
-                "open": row.open,
-                "close": row.close,
-                "high": row.high,
-                "low": row.low,
-                "pre_close": row.pre_close,
-                "p_change": row.p_change,
-                "volume": row.volume,
-                "atr14": row.atr14,
-                "atr21": row.atr21,
-            }
-        )
-    df = pd.DataFrame(data)
+    df = pd.DataFrame({name: columns[name] for name in crud.KLINE_FRAME_COLUMNS})
+    df["date"] = df["date"].astype("int64")
+    weekday = pd.to_datetime(df["date"].astype(str), format="%Y%m%d").dt.dayofweek
+    df["date_week"] = df["date_week"].fillna(weekday)
+    for col in ("date_week", "key", "volume"):
+        if df[col].notna().all():
+            df[col] = df[col].astype("int64")
     df.sort_values("date", inplace=True)
     df.reset_index(drop=True, inplace=True)
     if "pre_close" not in df.columns or df["pre_close"].isna().all():
@@ -687,10 +730,8 @@ def _kl_df_from_rows(rows: list) -> Optional["pandas.DataFrame"]:
         base = df["pre_close"].replace(0, float("nan"))
         df["p_change"] = (df["close"] - df["pre_close"]) / base * 100
         df["p_change"] = df["p_change"].fillna(0)
-    if "date_week" not in df.columns or df["date_week"].isna().all():
-        df["date_week"] = df["date"].apply(_date_week_from_int)
     if "key" not in df.columns or df["key"].isna().all():
-        df["key"] = list(range(len(df)))
+        df["key"] = np.arange(len(df))
     for col in ("atr14", "atr21"):
         if col in df.columns and df[col].isna().all():
             df.drop(columns=[col], inplace=True)
@@ -698,6 +739,34 @@ def _kl_df_from_rows(rows: list) -> Optional["pandas.DataFrame"]:
     return df
 
 
+def _load_kl_df(
+    db: Optional[Session],
+    market: str,
+    symbol: str,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+) -> Optional["pandas.DataFrame"]:
+    # fresh cache hits touch no database, open a session only for a version check or a load
+    opened: list[Session] = []
+
+    def session() -> Session:
+        if db is not None:
+            return db
+        if not opened:
+            opened.append(SessionLocal())
+        return opened[0]
+
+    try:
+        return kline_frames.get_or_load(
+            (market, symbol, start, end),
+            lambda: _kl_df_from_columns(crud.load_kline_arrays(session(), market, symbol, start=start, end=end)),
+            lambda: crud.kline_version(session(), market, symbol, start=start, end=end),
+        )
+    finally:
+        for item in opened:
+            item.close()
+
+
 def _market_from_symbol(symbol: str) -> str:
     if not symbol:
         return "CN"
@@ -719,17 +788,6 @@ def _resolve_benchmark_symbol(market: str) -> str:
     return DEFAULT_BENCHMARKS.get(key, DEFAULT_BENCHMARKS["CN"])
 
 
-def _symbol_kind(symbol: str, name: Optional[str], industry: Optional[str]) -> str:
-    if name and "指数" in name:
-        return "index"
-    if industry and "指数" in industry:
-        return "index"
-    lower = (symbol or "").lower()
-    if lower.startswith("sh000") or lower.startswith("sz399"):
-        return "index"
-    return "stock"
-
-
 def _is_index_symbol(symbol: Optional[str]) -> bool:
     lower = (symbol or "").lower()
     return lower.startswith("sh000") or lower.startswith("sz399")
@@ -741,7 +799,7 @@ def _normalize_kl_df(df):
     df = df.copy()
     if "date" not in df.columns:
         df["date"] = df.index
-    df["date"] = df["date"].apply(_date_to_int)
+    df["date"] = _dates_to_int(df["date"])
     df = df[df["date"].notna()]
     if "open" not in df.columns and "close" in df.columns:
         df["open"] = df["close"]
@@ -838,8 +896,7 @@ def _ensure_symbol_klines(
     market = _market_from_symbol(symbol)
     start_date = _parse_date_str(start)
     end_date = _parse_date_str(end)
-    rows = crud.load_klines(db, market, symbol, start=start_date, end=end_date)
-    if rows:
+    if _load_kl_df(db, market, symbol, start=start_date, end=end_date) is not None:
         return True
     from abupy.MarketBu import ABuSymbolPd
 
@@ -890,14 +947,13 @@ def _with_benchmark_fallback(fallback_symbol: Optional[str]):
                 try:
                     _ensure_symbol_klines(session, fallback_symbol, start, end, n_folds)
                     market = _market_from_symbol(fallback_symbol)
-                    rows = crud.load_klines(
+                    df = _load_kl_df(
                         session,
                         market,
                         fallback_symbol,
                         start=_parse_date_str(start),
                         end=_parse_date_str(end),
                     )
-                    df = _kl_df_from_rows(rows)
                 finally:
                     session.close()
                 if df is None or getattr(df, "empty", False):
@@ -919,73 +975,17 @@ def _with_benchmark_fallback(fallback_symbol: Optional[str]):
         abu_module.AbuBenchmark = prev
 
 
-def _get_pg_market_source():
-    from abupy.MarketBu.ABuDataBase import StockBaseMarket, SupportMixin
-
-    class PGMarketData(StockBaseMarket, SupportMixin):
-        def minute(self, *args, **kwargs):
-            return None
-
-        def kline(self, n_folds=2, start=None, end=None):
-            from abupy.CoreBu import ABuEnv
-            from abupy.MarketBu.ABuDataSource import source_dict
-            from abupy.CoreBu.ABuEnv import EMarketSourceType
-
-            session = SessionLocal()
-            try:
-                symbol_value = self._symbol.value
-                market = _market_from_symbol(symbol_value)
-                start_date = _parse_date_str(start)
-                end_date = _parse_date_str(end)
-                rows = crud.load_klines(session, market, symbol_value, start=start_date, end=end_date)
-                if rows:
-                    first = rows[0].trade_date
-                    last = rows[-1].trade_date
-                    if (not start_date or first <= start_date) and (not end_date or last >= end_date):
-                        return _kl_df_from_rows(rows)
-                source_order = [
-                    ABuEnv.g_market_source.value,
-                    EMarketSourceType.E_MARKET_SOURCE_tx.value,
-                    EMarketSourceType.E_MARKET_SOURCE_nt.value,
-                    EMarketSourceType.E_MARKET_SOURCE_bd.value,
-                ]
-                seen = set()
-                df = None
-                for source_value in source_order:
-                    if source_value in seen:
-                        continue
-                    seen.add(source_value)
-                    source_cls = source_dict.get(source_value)
-                    if not source_cls:
-                        continue
-                    df = source_cls(self._symbol).kline(n_folds=n_folds, start=start, end=end)
-                    if df is not None and not getattr(df, "empty", False):
-                        break
-                if df is None or getattr(df, "empty", False):
-                    if market in CN_MARKETS or market == "CN":
-                        df = _fetch_akshare_df(symbol_value, start, end, n_folds)
-                if df is None or getattr(df, "empty", False):
-                    return df
-                rows = _kl_rows_from_df(df, market, symbol_value)
-                crud.upsert_stock_klines(session, rows)
-                return df
-            finally:
-                session.close()
-
-    return PGMarketData
-
-
 @contextmanager
-def _with_pg_data_env(market: str):
+def _with_pg_data_env(market: str, write_back: bool = True):
     from abupy.CoreBu import ABuEnv
     from abupy.CoreBu.ABuEnv import EMarketDataFetchMode
 
     prev_source = ABuEnv.g_private_data_source
     prev_mode = ABuEnv.g_data_fetch_mode
-    ABuEnv.g_private_data_source = _get_pg_market_source()
+    ABuEnv.g_private_data_source = pg_market_source(write_back=write_back)
     ABuEnv.g_data_fetch_mode = EMarketDataFetchMode.E_DATA_FETCH_FORCE_NET
     try:
-        with _with_market_env(market):
+        with _with_market_env(market), pg_process_pool():
             yield
     finally:
         ABuEnv.g_private_data_source = prev_source
@@ -1297,10 +1297,10 @@ def search_symbols(
     kind = (kind or "all").strip().lower()
     if kind not in {"stock", "index", "all"}:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid kind")
-    items, total = crud.search_stock_symbols(db, markets, query, kind, page, page_size)
+    items, total = symbol_index.search(db, markets, query, kind, page, page_size)
     if total == 0 and query and market in {"CN", "SH", "SZ", "300"}:
         if _ensure_symbol_from_akshare(db, market, query):
-            items, total = crud.search_stock_symbols(db, markets, query, kind, page, page_size)
+            items, total = symbol_index.search(db, markets, query, kind, page, page_size)
     payload = [
         schemas.StockSymbolRead(
             symbol=item.symbol,
@@ -1308,7 +1308,7 @@ def search_symbols(
             name=item.name,
             exchange=item.exchange,
             industry=item.industry,
-            kind=_symbol_kind(item.symbol, item.name, item.industry),
+            kind=item.kind,
         )
         for item in items
     ]
@@ -1321,7 +1321,7 @@ def search_symbols(
                 name=None,
                 exchange=market_value,
                 industry=None,
-                kind=_symbol_kind(symbol, None, None),
+                kind=symbol_kind(symbol, None, None),
             )
             for market_value, symbol in kline_rows
         ]
@@ -1359,48 +1359,99 @@ def get_symbol(symbol: str, market: str = "CN", db: Session = Depends(get_db)):
             name=item.name,
             exchange=item.exchange,
             industry=item.industry,
-            kind=_symbol_kind(item.symbol, item.name, item.industry),
+            kind=symbol_kind(item.symbol, item.name, item.industry),
         )
     )
 
 
+KLINE_API_COLUMNS = ("date", "open", "close", "high", "low", "volume")
+KLINE_SAMPLE_MODES = ("ohlc", "lttb")
+
+
+def _kline_etag(version: tuple, *parts) -> str:
+    count, updated = version
+    stamp = updated.isoformat() if updated is not None else ""
+    digest = hashlib.sha1(repr((count, stamp) + parts).encode("utf-8")).hexdigest()[:20]
+    return f'W/"{digest}"'
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags or etag[2:] in tags
+
+
+def _kline_column_values(name: str, values) -> list:
+    import numpy as np
+
+    if name in ("date", "volume"):
+        return [None if np.isnan(v) else int(v) for v in values.astype(np.float64)]
+    return [None if v != v else v for v in values.tolist()]
+
+
 @quant_router.get("/klines", response_model=schemas.APIResponse)
 def get_klines(
+    response: Response,
     symbol: str,
     market: str = "CN",
     start: Optional[str] = None,
     end: Optional[str] = None,
-    limit: int = 400,
+    limit: int = Query(400, ge=0),
+    points: Optional[int] = Query(None, ge=3),
+    sample: str = "ohlc",
+    layout: str = "rows",
+    if_none_match: Optional[str] = Header(None),
     db: Session = Depends(get_db),
 ):
     if not symbol:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Symbol is required")
+    if sample not in KLINE_SAMPLE_MODES:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="sample must be ohlc or lttb")
+    if layout not in ("rows", "columns"):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="layout must be rows or columns")
     market = (market or "CN").upper()
     normalized = _normalize_symbol(symbol, market) or symbol
-    if market in CN_MARKETS or market == "CN":
-        _ensure_symbol_klines(db, normalized, start, end, 1)
     target_market = _market_from_symbol(normalized)
-    rows = crud.load_klines(db, target_market, normalized, start=_parse_date_str(start), end=_parse_date_str(end))
-    if limit and len(rows) > limit:
-        rows = rows[-limit:]
-    items = [
-        {
-            "date": int(row.trade_date.strftime("%Y%m%d")),
-            "open": row.open,
-            "close": row.close,
-            "high": row.high,
-            "low": row.low,
-            "volume": row.volume,
-        }
-        for row in rows
-    ]
-    return schemas.APIResponse(
-        data={
-            "symbol": normalized,
-            "market": target_market,
-            "items": items,
-        }
+    start_date = _parse_date_str(start)
+    end_date = _parse_date_str(end)
+
+    version = crud.kline_version(db, target_market, normalized, start=start_date, end=end_date)
+    if version[0] == 0 and (market in CN_MARKETS or market == "CN"):
+        # only fetch from the data source when the range has nothing stored yet
+        _ensure_symbol_klines(db, normalized, start, end, 1)
+        version = crud.kline_version(db, target_market, normalized, start=start_date, end=end_date)
+    etag = _kline_etag(version, target_market, normalized, start_date, end_date, limit, points, sample, layout)
+    if _etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+    columns = crud.load_kline_arrays(
+        db,
+        target_market,
+        normalized,
+        start=start_date,
+        end=end_date,
+        columns=KLINE_API_COLUMNS,
+        limit=limit or None,
     )
+    total = len(columns["date"])
+    if points and total > points:
+        columns = downsample.ohlc_buckets(columns, points) if sample == "ohlc" else downsample.lttb(columns, points)
+    values = {name: _kline_column_values(name, columns[name]) for name in KLINE_API_COLUMNS}
+    data = {
+        "symbol": normalized,
+        "market": target_market,
+        "total": total,
+        "sampled": len(values["date"]) < total,
+    }
+    if layout == "columns":
+        data["fields"] = list(KLINE_API_COLUMNS)
+        data["columns"] = values
+    else:
+        data["items"] = [dict(zip(KLINE_API_COLUMNS, row)) for row in zip(*values.values())]
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "no-cache"
+    return schemas.APIResponse(data=data)
 
 
 @quant_router.get("/strategies", response_model=schemas.APIResponse)
@@ -1408,6 +1459,97 @@ def list_strategies():
     return schemas.APIResponse(data=STRATEGY_CATALOG)
 
 
+def _fetch_kl_frame(symbol: str, n_folds, start: Optional[str], end: Optional[str]):
+    from abupy.MarketBu import ABuSymbolPd
+
+    kl = ABuSymbolPd.make_kl_df(symbol, n_folds=n_folds, start=start, end=end)
+    if kl is None or getattr(kl, "empty", False):
+        return None
+    return _kl_frame_from_df(kl, _market_from_symbol(symbol), symbol)
+
+
+def _run_kl_update_pipeline(
+    db: Session,
+    market: str,
+    symbols: list[str],
+    n_folds,
+    start: Optional[str],
+    end: Optional[str],
+    workers: int = KL_UPDATE_WORKERS,
+    batch_rows: int = KL_UPDATE_BATCH_ROWS,
+) -> dict:
+    import pandas as pd
+
+    symbols = list(dict.fromkeys(symbols))
+    started = time.perf_counter()
+    write_seconds = 0.0
+    copied_rows = 0
+    updated_symbols = 0
+    missing_symbols = []
+    pending = []
+    pending_rows = 0
+    done = 0
+
+    def flush():
+        nonlocal write_seconds, copied_rows, pending, pending_rows
+        if not pending:
+            return
+        write_started = time.perf_counter()
+        copied_rows += crud.copy_kline_stage(db, pd.concat(pending, ignore_index=True))
+        write_seconds += time.perf_counter() - write_started
+        pending = []
+        pending_rows = 0
+
+    try:
+        crud.create_kline_stage(db)
+        # the PG source must not write back per symbol, every row goes through COPY and one merge
+        with _with_pg_data_env(market, write_back=False):
+            pool = ThreadPoolExecutor(max_workers=max(1, workers))
+            try:
+                futures = {pool.submit(_fetch_kl_frame, symbol, n_folds, start, end): symbol for symbol in symbols}
+                for future in as_completed(futures):
+                    symbol = futures[future]
+                    done += 1
+                    report_progress(done, len(symbols), "kl_update")
+                    try:
+                        frame = future.result()
+                    except Exception:
+                        logger.exception("kl_update fetch failed: %s", symbol)
+                        frame = None
+                    if frame is None or frame.empty:
+                        missing_symbols.append(symbol)
+                        continue
+                    pending.append(frame)
+                    pending_rows += len(frame)
+                    updated_symbols += 1
+                    if pending_rows >= batch_rows:
+                        flush()
+            except BaseException:
+                # cancelled or failed: drop the queued fetches instead of waiting for all of them like `with` does
+                pool.shutdown(wait=False, cancel_futures=True)
+                raise
+            pool.shutdown()
+        flush()
+
+        merge_started = time.perf_counter()
+        total_rows = crud.merge_kline_stage(db)
+        write_seconds += time.perf_counter() - merge_started
+    except Exception:
+        # COPY runs on the raw connection, reset the session so the job error can still be saved
+        db.rollback()
+        raise
+    elapsed = time.perf_counter() - started
+    return {
+        "rows": total_rows,
+        "copied_rows": copied_rows,
+        "updated_symbols": updated_symbols,
+        "missing_symbols": missing_symbols[:200],
+        "elapsed_seconds": round(elapsed, 3),
+        "write_seconds": round(write_seconds, 3),
+        "rows_per_sec": round(copied_rows / elapsed, 1) if elapsed > 0 else None,
+    }
+
+
 def _run_job(job_id: int):
     db = SessionLocal()
     try:
@@ -1417,8 +1559,6 @@ def _run_job(job_id: int):
         crud.set_quant_job_running(db, job)
 
         if job.type == "kl_update":
-            from abupy.MarketBu import ABuSymbolPd
-
             market = (job.params.get("market") or "CN").upper()
             raw_symbols = job.params.get("symbols")
             symbols = _normalize_symbols(raw_symbols, market)
@@ -1434,21 +1574,16 @@ def _run_job(job_id: int):
             if not symbols:
                 raise RuntimeError("No symbols available; import symbols into database first.")
 
-            n_folds = job.params.get("n_folds", 1)
-            start = job.params.get("start")
-            end = job.params.get("end")
-            total_rows = 0
-            updated_symbols = 0
-            missing_symbols = []
-            with _with_pg_data_env(market):
-                for symbol in symbols:
-                    kl = ABuSymbolPd.make_kl_df(symbol, n_folds=n_folds, start=start, end=end)
-                    if kl is None or getattr(kl, "empty", False):
-                        missing_symbols.append(symbol)
-                        continue
-                    rows = _kl_rows_from_df(kl, _market_from_symbol(symbol), symbol)
-                    total_rows += crud.upsert_stock_klines(db, rows)
-                    updated_symbols += 1
+            stats = _run_kl_update_pipeline(
+                db,
+                market,
+                symbols,
+                n_folds=job.params.get("n_folds", 1),
+                start=job.params.get("start"),
+                end=job.params.get("end"),
+                workers=_param_int(job.params, "workers", KL_UPDATE_WORKERS),
+                batch_rows=_param_int(job.params, "batch_rows", KL_UPDATE_BATCH_ROWS),
+            )
 
             crud.set_quant_job_result(
                 db,
@@ -1456,10 +1591,8 @@ def _run_job(job_id: int):
                 {
                     "message": "kl_update finished",
                     "symbols": symbols,
-                    "rows": total_rows,
                     "seeded_symbols": seeded,
-                    "updated_symbols": updated_symbols,
-                    "missing_symbols": missing_symbols[:200],
+                    **stats,
                 },
             )
             return
@@ -1506,7 +1639,7 @@ def _run_job(job_id: int):
                     start=job.params.get("start"),
                     end=job.params.get("end"),
                     n_process_kl=1,
-                    n_process_pick=1,
+                    n_process_pick=_backtest_processes(job.params, symbols),
                 )
             if abu_result is None:
                 raise RuntimeError("Backtest returned empty result")
@@ -1541,11 +1674,12 @@ def _run_job(job_id: int):
                             continue
                         start_date = datetime.strptime(str(min_date), "%Y%m%d").date()
                         end_date = datetime.strptime(str(max_date), "%Y%m%d").date()
-                        rows = crud.load_klines(db, _market_from_symbol(sym), sym, start=start_date, end=end_date)
-                        atr_map = {
-                            int(row.trade_date.strftime("%Y%m%d")): (row.atr14, row.atr21)
-                            for row in rows
-                        }
+                        kl = _load_kl_df(db, _market_from_symbol(sym), sym, start=start_date, end=end_date)
+                        atr_map = {}
+                        if kl is not None:
+                            atr = kl.reindex(columns=["atr14", "atr21"]).astype(object)
+                            atr = atr.where(atr.notna(), None)
+                            atr_map = dict(zip(kl["date"].tolist(), zip(atr["atr14"], atr["atr21"])))
                         for idx in sym_orders.index:
                             buy_date = int(orders_pd.at[idx, "buy_date_int"] or 0)
                             if buy_date <= 0:
@@ -1571,14 +1705,15 @@ def _run_job(job_id: int):
                                 orders_pd.at[idx, "stop_win_price"] = buy_price - stop_win_n * atr_base
                             orders_pd.at[idx, "atr_base"] = atr_base
 
-                    orders_json = orders_pd.head(200).to_json(orient="records", date_format="iso")
+                    # full frames, set_quant_job_result keeps a preview inline and the rest as an artifact
+                    orders_json = orders_pd.to_json(orient="records", date_format="iso")
                     orders_preview = json.loads(orders_json)
             except Exception:
                 orders_preview = None
             try:
                 action_pd = getattr(abu_result, "action_pd", None)
                 if action_pd is not None and hasattr(action_pd, "head") and hasattr(action_pd, "to_json"):
-                    actions_json = action_pd.head(200).to_json(orient="records", date_format="iso")
+                    actions_json = action_pd.to_json(orient="records", date_format="iso")
                     actions_preview = json.loads(actions_json)
             except Exception:
                 actions_preview = None
@@ -1633,6 +1768,7 @@ def _run_job(job_id: int):
             max_runs = max(1, min(max_runs, 200))
 
             runs = []
+            n_process_pick = _backtest_processes(job.params, symbols)
             fallback_symbol = benchmark_symbol
             with _with_pg_data_env(market), _with_benchmark_fallback(fallback_symbol):
                 run_index = 0
@@ -1657,7 +1793,7 @@ def _run_job(job_id: int):
                             start=start,
                             end=end,
                             n_process_kl=1,
-                            n_process_pick=1,
+                            n_process_pick=n_process_pick,
                         )
                         if abu_result is None:
                             continue
@@ -1699,7 +1835,7 @@ def _run_job(job_id: int):
                     "sell_strategy": sell_strategy,
                     "max_runs": max_runs,
                     "best": best,
-                    "runs": runs_sorted[:200],
+                    "runs": runs_sorted,
                 },
             )
             return
@@ -1822,8 +1958,7 @@ def _run_analysis_job(params: dict, db: Session) -> dict:
 
     def _fetch_kl(symbol: str):
         start_date, end_date = _resolve_dates()
-        rows = crud.load_klines(db, market, symbol, start=start_date, end=end_date)
-        return _kl_df_from_rows(rows)
+        return _load_kl_df(db, market, symbol, start=start_date, end=end_date)
 
     def _fetch_kl_dict(items: list[str]):
         data = {}
@@ -2088,38 +2223,38 @@ def _run_analysis_job(params: dict, db: Session) -> dict:
     raise RuntimeError("Unsupported analysis tool")
 
 
+def _job_create(job_type: str, payload: dict) -> schemas.QuantJobCreate:
+    priority = payload.get("priority") if isinstance(payload, dict) else None
+    return schemas.QuantJobCreate(type=job_type, params=payload, priority=_safe_int(priority))
+
+
 @quant_router.post("/kl/update", response_model=schemas.APIResponse, status_code=status.HTTP_202_ACCEPTED)
 def start_kl_update(payload: dict, db: Session = Depends(get_db)):
-    job = crud.create_quant_job(db, schemas.QuantJobCreate(type="kl_update", params=payload))
-    executor.submit(_run_job, job.id)
+    job = crud.create_quant_job(db, _job_create("kl_update", payload))
     return schemas.APIResponse(message="Job queued", data=schemas.QuantJobRead.model_validate(job))
 
 
 @quant_router.post("/backtest", response_model=schemas.APIResponse, status_code=status.HTTP_202_ACCEPTED)
 def start_backtest(payload: dict, db: Session = Depends(get_db)):
-    job = crud.create_quant_job(db, schemas.QuantJobCreate(type="backtest", params=payload))
-    executor.submit(_run_job, job.id)
+    job = crud.create_quant_job(db, _job_create("backtest", payload))
     return schemas.APIResponse(message="Job queued", data=schemas.QuantJobRead.model_validate(job))
 
 
 @quant_router.post("/grid-search", response_model=schemas.APIResponse, status_code=status.HTTP_202_ACCEPTED)
 def start_grid_search(payload: dict, db: Session = Depends(get_db)):
-    job = crud.create_quant_job(db, schemas.QuantJobCreate(type="grid_search", params=payload))
-    executor.submit(_run_job, job.id)
+    job = crud.create_quant_job(db, _job_create("grid_search", payload))
     return schemas.APIResponse(message="Job queued", data=schemas.QuantJobRead.model_validate(job))
 
 
 @quant_router.post("/tools", response_model=schemas.APIResponse, status_code=status.HTTP_202_ACCEPTED)
 def start_quant_tools(payload: dict, db: Session = Depends(get_db)):
-    job = crud.create_quant_job(db, schemas.QuantJobCreate(type="analysis", params=payload))
-    executor.submit(_run_job, job.id)
+    job = crud.create_quant_job(db, _job_create("analysis", payload))
     return schemas.APIResponse(message="Job queued", data=schemas.QuantJobRead.model_validate(job))
 
 
 @quant_router.get("/verify", response_model=schemas.APIResponse)
 def verify_quant_env(db: Session = Depends(get_db)):
     job = crud.create_quant_job(db, schemas.QuantJobCreate(type="verify", params={}))
-    executor.submit(_run_job, job.id)
     return schemas.APIResponse(message="Job queued", data=schemas.QuantJobRead.model_validate(job))
 
 
@@ -2132,7 +2267,6 @@ def list_jobs(limit: int = 50, db: Session = Depends(get_db)):
 @jobs_router.post("/", response_model=schemas.APIResponse, status_code=status.HTTP_202_ACCEPTED)
 def create_job(payload: schemas.QuantJobCreate, db: Session = Depends(get_db)):
     job = crud.create_quant_job(db, payload)
-    executor.submit(_run_job, job.id)
     return schemas.APIResponse(message="Job queued", data=schemas.QuantJobRead.model_validate(job))
 
 
@@ -2149,14 +2283,140 @@ def delete_job(job_id: int, db: Session = Depends(get_db)):
     job = crud.get_quant_job(db, job_id)
     if not job:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
-    if job.status == "running":
-        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Job is running")
-    crud.delete_quant_job(db, job)
-    return schemas.APIResponse(message="Job deleted", data={"id": job_id})
+    if job.status != "running" and crud.delete_idle_quant_job(db, job_id):
+        return schemas.APIResponse(message="Job deleted", data={"id": job_id})
+    # running jobs stop cooperatively at the next progress report and end as cancelled
+    job = crud.request_quant_job_cancel(db, job)
+    return JSONResponse(
+        status_code=status.HTTP_202_ACCEPTED,
+        content=schemas.APIResponse(
+            message="Job cancellation requested",
+            data=schemas.QuantJobProgress.model_validate(job).model_dump(),
+        ).model_dump(),
+    )
+
+
+@jobs_router.get("/{job_id}/progress", response_model=schemas.APIResponse)
+def get_job_progress(job_id: int, db: Session = Depends(get_db)):
+    row = crud.get_quant_job_progress(db, job_id)
+    if not row:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+    return schemas.APIResponse(data=schemas.QuantJobProgress.model_validate(row))
+
+
+EXPORT_CHUNK_ROWS = 1000
+EXPORT_CHUNK_BYTES = 1 << 16
+
+
+def _export_json_lines(value, meta: Optional[dict], offset: int, limit: Optional[int]):
+    if meta is not None:
+        yield from artifacts.iter_section_lines(meta, offset, limit)
+        return
+    end = None if limit is None else offset + limit
+    for item in value[offset:end]:
+        yield json.dumps(item, ensure_ascii=False, default=str)
+
+
+def _stream_json_list(lines):
+    yield "["
+    for index, line in enumerate(lines):
+        yield line if index == 0 else "," + line
+    yield "]"
+
+
+def _stream_json_result(result: dict, job_artifacts: dict):
+    # whole result with artifact sections expanded in place of their previews
+    yield "{"
+    for index, (key, value) in enumerate(result.items()):
+        yield ("," if index else "") + json.dumps(str(key), ensure_ascii=False) + ":"
+        if key in job_artifacts:
+            yield from _stream_json_list(artifacts.iter_section_lines(job_artifacts[key]))
+        else:
+            yield json.dumps(value, ensure_ascii=False, default=str)
+    yield "}"
+
+
+def _stream_csv_rows(lines, keys: list[str]):
+    buf = io.StringIO()
+    writer = csv.DictWriter(buf, fieldnames=keys, extrasaction="ignore")
+    writer.writeheader()
+    for index, line in enumerate(lines, 1):
+        item = json.loads(line)
+        if isinstance(item, dict):
+            writer.writerow({k: item.get(k) for k in keys})
+        if index % EXPORT_CHUNK_ROWS == 0:
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+    yield buf.getvalue()
+
+
+def _encode_chunks(chunks, bom: bool = False):
+    pending = ["\ufeff"] if bom else []
+    size = 0
+    for chunk in chunks:
+        pending.append(chunk)
+        size += len(chunk)
+        if size >= EXPORT_CHUNK_BYTES:
+            yield "".join(pending).encode("utf-8")
+            pending = []
+            size = 0
+    if pending:
+        yield "".join(pending).encode("utf-8")
+
+
+def _file_range_response(path: Path, filename: str, range_header: Optional[str]):
+    size = path.stat().st_size
+    start, end = 0, size - 1
+    status_code = status.HTTP_200_OK
+    if range_header:
+        match = re.fullmatch(r"bytes=(\d*)-(\d*)", range_header.strip())
+        if not match or not (match.group(1) or match.group(2)):
+            raise HTTPException(status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE, detail="Invalid range")
+        if match.group(1):
+            start = int(match.group(1))
+            end = min(int(match.group(2)), size - 1) if match.group(2) else size - 1
+        else:
+            start = max(0, size - int(match.group(2)))
+        if start >= size or start > end:
+            raise HTTPException(
+                status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+                detail="Range not satisfiable",
+                headers={"Content-Range": f"bytes */{size}"},
+            )
+        status_code = status.HTTP_206_PARTIAL_CONTENT
+
+    def body():
+        with open(path, "rb") as fh:
+            fh.seek(start)
+            remaining = end - start + 1
+            while remaining > 0:
+                chunk = fh.read(min(EXPORT_CHUNK_BYTES, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+
+    headers = {
+        "Accept-Ranges": "bytes",
+        "Content-Length": str(end - start + 1),
+        "Content-Disposition": f'attachment; filename="{filename}"',
+    }
+    if status_code == status.HTTP_206_PARTIAL_CONTENT:
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    return StreamingResponse(body(), status_code=status_code, media_type="application/gzip", headers=headers)
 
 
 @jobs_router.get("/{job_id}/export")
-def export_job(job_id: int, format: str = "json", section: Optional[str] = None, db: Session = Depends(get_db)):
+def export_job(
+    job_id: int,
+    format: str = "json",
+    section: Optional[str] = None,
+    offset: int = Query(0, ge=0),
+    limit: Optional[int] = Query(None, ge=1),
+    range_header: Optional[str] = Header(None, alias="Range"),
+    db: Session = Depends(get_db),
+):
     job = crud.get_quant_job(db, job_id)
     if not job:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
@@ -2164,42 +2424,74 @@ def export_job(job_id: int, format: str = "json", section: Optional[str] = None,
         raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Job has no result yet")
 
     payload = job.result
+    job_artifacts = job.artifacts or {}
     section_key = None
     if section and isinstance(payload, dict) and section in payload:
         payload = payload.get(section)
         section_key = section
+    meta = job_artifacts.get(section_key) if section_key else None
 
     fmt = (format or "json").strip().lower()
     file_stem = f"job_{job_id}"
     if section_key:
         file_stem = f"{file_stem}_{section_key}"
 
-    if fmt == "json":
-        return JSONResponse(
-            content=payload,
-            headers={"Content-Disposition": f'attachment; filename="{file_stem}.json"'},
-        )
+    if fmt == artifacts.ARTIFACT_FORMAT:
+        # raw compressed artifact, resumable through Range requests
+        if meta is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Section has no artifact")
+        return _file_range_response(artifacts.artifact_path(meta), f"{file_stem}.{fmt}", range_header)
 
-    if fmt != "csv":
+    if fmt not in ("json", "ndjson", "csv"):
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Unsupported format")
 
+    headers = {}
+    is_list = meta is not None or isinstance(payload, list)
+    if is_list:
+        headers["X-Total-Count"] = str(meta["rows"] if meta is not None else len(payload))
+        lines = _export_json_lines(payload, meta, offset, limit)
+
+    if fmt == "json":
+        headers["Content-Disposition"] = f'attachment; filename="{file_stem}.json"'
+        if is_list:
+            chunks = _stream_json_list(lines)
+        elif section_key is None and isinstance(payload, dict) and job_artifacts:
+            chunks = _stream_json_result(payload, job_artifacts)
+        else:
+            return JSONResponse(content=payload, headers=headers)
+        return StreamingResponse(_encode_chunks(chunks), media_type="application/json", headers=headers)
+
+    if fmt == "ndjson":
+        if not is_list:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="ndjson export needs a list section")
+        headers["Content-Disposition"] = f'attachment; filename="{file_stem}.ndjson"'
+        chunks = (line + "\n" for line in lines)
+        return StreamingResponse(_encode_chunks(chunks), media_type="application/x-ndjson", headers=headers)
+
+    headers["Content-Disposition"] = f'attachment; filename="{file_stem}.csv"'
+    if is_list:
+        if meta is not None:
+            keys = list(meta.get("columns") or [])
+        else:
+            keys = []
+            for item in payload:
+                if isinstance(item, dict):
+                    for k in item.keys():
+                        if k not in keys:
+                            keys.append(k)
+        if keys:
+            chunks = _stream_csv_rows(lines, keys)
+        else:
+            chunks = iter(["value\r\n", *(line + "\r\n" for line in lines)])
+        return StreamingResponse(_encode_chunks(chunks, bom=True), media_type="text/csv", headers=headers)
+
     buf = io.StringIO()
-    if isinstance(payload, list) and payload and isinstance(payload[0], dict):
-        keys = []
-        for item in payload:
-            if isinstance(item, dict):
-                for k in item.keys():
-                    if k not in keys:
-                        keys.append(k)
-        writer = csv.DictWriter(buf, fieldnames=keys)
-        writer.writeheader()
-        for item in payload:
-            if isinstance(item, dict):
-                writer.writerow({k: item.get(k) for k in keys})
-    elif isinstance(payload, dict):
+    if isinstance(payload, dict):
         writer = csv.writer(buf)
         writer.writerow(["key", "value"])
         for k, v in payload.items():
+            if k in job_artifacts and section_key is None:
+                v = f"{job_artifacts[k]['rows']} rows, export with section={k}"
             if isinstance(v, (dict, list)):
                 writer.writerow([k, json.dumps(v, ensure_ascii=False)])
             else:
@@ -2208,13 +2500,7 @@ def export_job(job_id: int, format: str = "json", section: Optional[str] = None,
         writer = csv.writer(buf)
         writer.writerow(["value"])
         writer.writerow([payload])
-
-    out = io.BytesIO(buf.getvalue().encode("utf-8-sig"))
-    return StreamingResponse(
-        out,
-        media_type="text/csv",
-        headers={"Content-Disposition": f'attachment; filename="{file_stem}.csv"'},
-    )
+    return StreamingResponse(_encode_chunks([buf.getvalue()], bom=True), media_type="text/csv", headers=headers)
 
 
 router.include_router(quant_router)
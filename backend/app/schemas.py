@@ -24,6 +24,7 @@ class StockSymbolRead(SymbolRead):
 class QuantJobCreate(BaseModel):
     type: str = Field(..., max_length=50)
     params: dict = Field(default_factory=dict)
+    priority: Optional[int] = None
 
 
 class QuantJobRead(BaseModel):
@@ -33,7 +34,21 @@ class QuantJobRead(BaseModel):
     params: dict
     result: Optional[dict] = None
     error: Optional[str] = None
+    artifacts: Optional[dict] = None
+    priority: int = 0
+    progress: Optional[float] = None
+    cancel_requested: bool = False
+    started_at: Optional[datetime] = None
     created_at: Optional[datetime] = None
     updated_at: Optional[datetime] = None
 
     model_config = ConfigDict(from_attributes=True)
+
+
+class QuantJobProgress(BaseModel):
+    id: int
+    status: str
+    progress: Optional[float] = None
+    cancel_requested: bool = False
+
+    model_config = ConfigDict(from_attributes=True)
@@ -2,7 +2,6 @@ from __future__ import annotations
 
 from abupy.FactorBuyBu.ABuFactorBuyBase import AbuFactorBuyXD, BuyCallMixin
 from abupy.FactorSellBu.ABuFactorSellBase import AbuFactorSellXD, ESupportDirection
-from abupy.IndicatorBu.ABuNDMacd import calc_macd
 
 
 class MacdCrossBuy(AbuFactorBuyXD, BuyCallMixin):
@@ -16,15 +15,11 @@ class MacdCrossBuy(AbuFactorBuyXD, BuyCallMixin):
         super(MacdCrossBuy, self)._init_self(**kwargs)
 
     def fit_day(self, today):
-        dif, dea, _ = calc_macd(
-            self.xd_kl.close,
-            fast_period=self.fast_period,
-            slow_period=self.slow_period,
-            signal_period=self.signal_period,
-        )
-        if len(dif) < 2 or len(dea) < 2:
+        # 完整序列上的 MACD 每个 kl_pd 只计算一次，按 today_ind 读取今天和昨天的值
+        dif, dea, _ = self.indicator("macd", self.fast_period, self.slow_period, self.signal_period)
+        if self.today_ind < 1:
             return None
-        if dif[-2] <= dea[-2] and dif[-1] > dea[-1]:
+        if dif[self.today_ind - 1] <= dea[self.today_ind - 1] and dif[self.today_ind] > dea[self.today_ind]:
             return self.buy_tomorrow()
         return None
 
@@ -43,15 +38,11 @@ class MacdCrossSell(AbuFactorSellXD):
         return [ESupportDirection.DIRECTION_CAll.value, ESupportDirection.DIRECTION_PUT.value]
 
     def fit_day(self, today, orders):
-        dif, dea, _ = calc_macd(
-            self.xd_kl.close,
-            fast_period=self.fast_period,
-            slow_period=self.slow_period,
-            signal_period=self.signal_period,
-        )
-        if len(dif) < 2 or len(dea) < 2:
+        # 完整序列上的 MACD 每个 kl_pd 只计算一次，按 today_ind 读取今天和昨天的值
+        dif, dea, _ = self.indicator("macd", self.fast_period, self.slow_period, self.signal_period)
+        if self.today_ind < 1:
             return None
-        if dif[-2] >= dea[-2] and dif[-1] < dea[-1]:
+        if dif[self.today_ind - 1] >= dea[self.today_ind - 1] and dif[self.today_ind] < dea[self.today_ind]:
             for order in orders:
                 self.sell_tomorrow(order)
         return None
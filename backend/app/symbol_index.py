@@ -0,0 +1,312 @@
+"""In-memory search index over stock_symbols used by `/quant/symbols`.
+
+Entries are numbered in symbol order and every posting list is a Python int used as a bitset, so filters,
+intersections and counts are plain integer operations and set bits come out already sorted by symbol.
+"""
+
+from collections import defaultdict
+from dataclasses import dataclass
+from pathlib import Path
+from threading import Lock
+from typing import Iterator, Optional
+import logging
+import sqlite3
+import time
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from . import models
+from .config import get_settings
+
+logger = logging.getLogger("doraemon")
+
+PINYIN_DB = Path(__file__).resolve().parents[2] / "abupy" / "RomDataBu" / "symbols_db.db"
+# substrings up to GRAM_SIZE chars and prefixes up to PREFIX_DEPTH chars are looked up directly,
+# longer queries intersect their grams and verify the few remaining candidates
+GRAM_SIZE = 3
+PREFIX_DEPTH = 4
+SYMBOL_PREFIXES = ("sh", "sz", "hk", "us")
+STOCK_PREFIXES = {"SH": ("sh6", "sh9"), "SZ": ("sz0", "sz2"), "300": ("sz3",)}
+
+
+@dataclass(frozen=True)
+class SymbolEntry:
+    market: str
+    symbol: str
+    name: Optional[str]
+    exchange: Optional[str]
+    industry: Optional[str]
+    kind: str
+    pinyin: Optional[str]
+
+
+def symbol_kind(symbol: str, name: Optional[str], industry: Optional[str]) -> str:
+    if name and "指数" in name:
+        return "index"
+    if industry and "指数" in industry:
+        return "index"
+    lower = (symbol or "").lower()
+    if lower.startswith("sh000") or lower.startswith("sz399"):
+        return "index"
+    return "stock"
+
+
+def _code_of(symbol: str) -> str:
+    lower = symbol.lower()
+    for prefix in SYMBOL_PREFIXES:
+        if lower.startswith(prefix):
+            return lower[len(prefix) :]
+    return lower
+
+
+def load_pinyin_table(path: Path = PINYIN_DB) -> dict[str, str]:
+    """symbol -> pinyin initials from abupy's symbols_db, keyed like stock_symbols.symbol."""
+    if not path.exists():
+        return {}
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        rows = conn.execute("select stockCode, pinyin from values_table where pinyin != ''").fetchall()
+    finally:
+        conn.close()
+    table = {}
+    for code, pinyin in rows:
+        if not code:
+            continue
+        # abupy codes look like sh600000, hk00700, usmmm.n
+        if code.startswith("us"):
+            code = "us" + code[2:].split(".", 1)[0].upper()
+        table[code] = pinyin.lower()
+    return table
+
+
+def _bits(ids) -> int:
+    value = 0
+    for idx in ids:
+        value |= 1 << idx
+    return value
+
+
+def iter_bits(value: int) -> Iterator[int]:
+    while value:
+        low = value & -value
+        yield low.bit_length() - 1
+        value ^= low
+
+
+class _KeyIndex:
+    """Exact, prefix and substring postings over one family of lower-cased keys."""
+
+    def __init__(self, keys: list[tuple[str, ...]]):
+        self.keys = keys
+        exact: dict[str, list[int]] = defaultdict(list)
+        prefix: dict[str, list[int]] = defaultdict(list)
+        grams: dict[str, list[int]] = defaultdict(list)
+        for idx, entry_keys in enumerate(keys):
+            for key in set(entry_keys):
+                exact[key].append(idx)
+            for key in {key[:size] for key in entry_keys for size in range(1, min(PREFIX_DEPTH, len(key)) + 1)}:
+                prefix[key].append(idx)
+            for gram in {
+                key[pos : pos + size]
+                for key in entry_keys
+                for size in range(1, GRAM_SIZE + 1)
+                for pos in range(len(key) - size + 1)
+            }:
+                grams[gram].append(idx)
+        self.exact = {key: _bits(ids) for key, ids in exact.items()}
+        self.prefix = {key: _bits(ids) for key, ids in prefix.items()}
+        self.grams = {key: _bits(ids) for key, ids in grams.items()}
+
+    def contains(self, query: str) -> int:
+        if len(query) <= GRAM_SIZE:
+            return self.grams.get(query, 0)
+        candidates = -1
+        for pos in range(len(query) - GRAM_SIZE + 1):
+            candidates &= self.grams.get(query[pos : pos + GRAM_SIZE], 0)
+            if not candidates:
+                return 0
+        return _bits(idx for idx in iter_bits(candidates) if any(query in key for key in self.keys[idx]))
+
+    def starts_with(self, query: str, within: int) -> int:
+        if len(query) <= PREFIX_DEPTH:
+            return self.prefix.get(query, 0) & within
+        return _bits(idx for idx in iter_bits(within) if any(key.startswith(query) for key in self.keys[idx]))
+
+
+class SymbolIndex:
+    def __init__(self, entries: list[SymbolEntry], version: tuple = (0, None)):
+        self.entries = sorted(entries, key=lambda item: (item.symbol, item.market))
+        self.version = version
+        self.codes = _KeyIndex(
+            [tuple({item.symbol.lower(), _code_of(item.symbol)}) for item in self.entries]
+        )
+        self.texts = _KeyIndex(
+            [
+                tuple(key for key in {(item.name or "").lower(), item.pinyin or ""} if key)
+                for item in self.entries
+            ]
+        )
+        self.all = (1 << len(self.entries)) - 1
+        self.by_market: dict[str, int] = {}
+        self.by_prefix: dict[str, int] = {}
+        self.index_kind = 0
+        for idx, item in enumerate(self.entries):
+            bit = 1 << idx
+            self.by_market[item.market] = self.by_market.get(item.market, 0) | bit
+            lower = item.symbol.lower()
+            for size in (2, 3):
+                self.by_prefix[lower[:size]] = self.by_prefix.get(lower[:size], 0) | bit
+            if item.kind == "index":
+                self.index_kind |= bit
+
+    def _prefixed(self, *prefixes: str) -> int:
+        value = 0
+        for prefix in prefixes:
+            value |= self.by_prefix.get(prefix, 0)
+        return value
+
+    def scope(self, markets: Optional[list[str]], kind: Optional[str]) -> int:
+        """Bitset of the entries passing the market and kind filters."""
+        allowed = self.all
+        if markets:
+            market_bits = 0
+            for market in markets:
+                market_bits |= self.by_market.get(market, 0)
+            if "300" in markets and "SZ" not in markets:
+                market_bits |= self.by_market.get("SZ", 0) & self._prefixed("sz3")
+            allowed &= market_bits
+            cn_bits = 0
+            if "SH" in markets:
+                cn_bits |= self._prefixed("sh")
+            if "SZ" in markets:
+                cn_bits |= self._prefixed("sz") if "300" in markets else self._prefixed("sz") & ~self._prefixed("sz3")
+            if "300" in markets:
+                cn_bits |= self._prefixed("sz3")
+            if any(market in STOCK_PREFIXES for market in markets):
+                allowed &= cn_bits
+        if kind == "index":
+            allowed &= self.index_kind
+        elif kind == "stock":
+            allowed &= ~self.index_kind
+            board = [STOCK_PREFIXES[market] for market in markets or () if market in STOCK_PREFIXES]
+            if board:
+                allowed &= self._prefixed(*(prefix for prefixes in board for prefix in prefixes))
+        return allowed
+
+    def search(
+        self,
+        markets: Optional[list[str]],
+        query: Optional[str],
+        kind: Optional[str],
+        page: int = 1,
+        page_size: int = 50,
+    ) -> tuple[list[SymbolEntry], int]:
+        """Ranked page of matches: exact code/name/pinyin, then prefix matches, then substring matches."""
+        allowed = self.scope(markets, kind)
+        cleaned = (query or "").strip().lower()
+        if not cleaned:
+            tiers = [allowed]
+        else:
+            families = (self.codes,) if cleaned.isdigit() else (self.codes, self.texts)
+            exact = prefix = contains = 0
+            for family in families:
+                hits = family.contains(cleaned) & allowed
+                contains |= hits
+                exact |= family.exact.get(cleaned, 0) & hits
+                prefix |= family.starts_with(cleaned, hits)
+            prefix &= ~exact
+            tiers = [exact, prefix, contains & ~exact & ~prefix]
+        total = sum(tier.bit_count() for tier in tiers)
+        skip = max(0, (page - 1) * page_size)
+        items = []
+        for tier in tiers:
+            count = tier.bit_count()
+            if skip >= count:
+                skip -= count
+                continue
+            for idx in iter_bits(tier):
+                if skip:
+                    skip -= 1
+                    continue
+                items.append(self.entries[idx])
+                if len(items) >= page_size:
+                    return items, total
+        return items, total
+
+
+def stock_symbols_version(db: Session) -> tuple:
+    return tuple(db.execute(select(func.count(), func.max(models.StockSymbol.updated_at))).one())
+
+
+def build_symbol_index(db: Session) -> SymbolIndex:
+    version = stock_symbols_version(db)
+    rows = db.execute(
+        select(
+            models.StockSymbol.market,
+            models.StockSymbol.symbol,
+            models.StockSymbol.name,
+            models.StockSymbol.exchange,
+            models.StockSymbol.industry,
+        )
+    ).all()
+    pinyin = load_pinyin_table()
+    entries = []
+    for market, symbol, name, exchange, industry in rows:
+        entries.append(
+            SymbolEntry(
+                market=market,
+                symbol=symbol,
+                name=name,
+                exchange=exchange,
+                industry=industry,
+                kind=symbol_kind(symbol, name, industry),
+                pinyin=pinyin.get(symbol),
+            )
+        )
+    return SymbolIndex(entries, version)
+
+
+class SymbolIndexHolder:
+    """Process-wide index, rebuilt after local upserts or when stock_symbols changed in another process."""
+
+    def __init__(self, refresh_interval: float):
+        self.refresh_interval = refresh_interval
+        self._index: Optional[SymbolIndex] = None
+        self._dirty = True
+        self._checked = 0.0
+        self._lock = Lock()
+
+    def invalidate(self) -> None:
+        self._dirty = True
+
+    def get(self, db: Session) -> SymbolIndex:
+        index = self._index
+        now = time.monotonic()
+        if index is not None and not self._dirty and now - self._checked < self.refresh_interval:
+            return index
+        with self._lock:
+            index = self._index
+            if index is not None and not self._dirty:
+                if time.monotonic() - self._checked < self.refresh_interval:
+                    return index
+                if stock_symbols_version(db) == index.version:
+                    self._checked = time.monotonic()
+                    return index
+            self._dirty = False
+            started = time.perf_counter()
+            try:
+                index = build_symbol_index(db)
+            except Exception:
+                self._dirty = True
+                raise
+            self._index = index
+            self._checked = time.monotonic()
+            logger.info("Symbol index built: %s entries in %.3fs", len(index.entries), time.perf_counter() - started)
+            return index
+
+    def search(self, db: Session, *args, **kwargs) -> tuple[list[SymbolEntry], int]:
+        return self.get(db).search(*args, **kwargs)
+
+
+symbol_index = SymbolIndexHolder(get_settings().symbol_index_refresh)
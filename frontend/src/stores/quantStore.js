@@ -79,7 +79,12 @@ export const useQuantStore = defineStore('quant', {
       }
     },
     async deleteJob(id) {
-      await api.delete(`/jobs/${id}`)
+      const response = await api.delete(`/jobs/${id}`)
+      if (response.status === 202) {
+        // running job: cancellation requested, it stays in the list until the worker stops it
+        this.jobs = this.jobs.map((job) => (job.id === id ? { ...job, ...response.data.data } : job))
+        return
+      }
       this.jobs = this.jobs.filter((job) => job.id !== id)
       if (this.activeJob?.id === id) {
         this.activeJob = null
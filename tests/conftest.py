@@ -0,0 +1,13 @@
+# -*- encoding:utf-8 -*-
+"""
+    abupy中部分模块仍然使用from collections import Iterable，python3.10之后这些别名只在collections.abc中，
+    测试导入abupy前补上别名
+"""
+
+import collections
+import collections.abc
+
+for _name in ('Iterable', 'Mapping', 'MutableMapping', 'Sequence', 'Callable', 'Hashable', 'Container', 'Sized',
+              'Set', 'MutableSet', 'MutableSequence', 'Iterator', 'Generator'):
+    if not hasattr(collections, _name):
+        setattr(collections, _name, getattr(collections.abc, _name))
@@ -0,0 +1,137 @@
+# -*- encoding:utf-8 -*-
+"""AbuKLColumnarStore索引日志的增量重放，compact后的基准索引替换，以及日志被截断时的重新读取测试"""
+
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from abupy.MarketBu import ABuDataColumnar
+from abupy.MarketBu.ABuDataColumnar import AbuKLColumnarStore
+
+
+def _kl_df(start, n, base):
+    """构造n天的金融时间序列，base区分不同的数据"""
+    index = pd.date_range(start, periods=n, freq='D', name='date')
+    return pd.DataFrame({'close': np.arange(n, dtype=np.float64) + base,
+                         'volume': np.arange(n, dtype=np.int64) * 10 + int(base),
+                         'key': np.arange(n, dtype=np.int64)}, index=index)
+
+
+def _count_replay(store):
+    """统计store重放索引日志的次数"""
+    calls = {'cnt': 0}
+    replay = store._replay_log
+
+    def _replay_log():
+        calls['cnt'] += 1
+        replay()
+
+    store._replay_log = _replay_log
+    return calls
+
+
+def _assert_kl(store, symbol_key, df):
+    pd.testing.assert_frame_equal(store.load(symbol_key), df, check_freq=False)
+
+
+@pytest.fixture
+def stores(tmp_path):
+    """同一个存储文件夹上的两个实例，分别模拟写入进程与读取进程"""
+    store_dir = str(tmp_path)
+    return AbuKLColumnarStore(store_dir), AbuKLColumnarStore(store_dir)
+
+
+def test_journal_replay_once(stores):
+    writer, reader = stores
+    df_a, df_b = _kl_df('2020-01-01', 5, 1), _kl_df('2020-02-01', 7, 2)
+    writer.dump_batch([('usA', 'usA_1', df_a), ('usB', 'usB_1', df_b)])
+    assert os.path.getsize(writer.log_fn) > 0
+    assert not os.path.exists(writer.index_fn)
+
+    calls = _count_replay(reader)
+    _assert_kl(reader, 'usA', df_a)
+    _assert_kl(reader, 'usB', df_b)
+    for _ in range(100):
+        assert reader.date_key('usA') == 'usA_1'
+        assert 'usB' in reader
+        assert reader.stamp('usB') is not None
+    # 日志没有新追加的记录时只使用内存中的索引
+    assert calls['cnt'] == 1
+
+    df_c = _kl_df('2020-03-01', 3, 3)
+    writer.dump('usC', 'usC_1', df_c)
+    writer.remove('usA')
+    _assert_kl(reader, 'usC', df_c)
+    assert 'usA' not in reader
+    assert reader.date_key('usB') == 'usB_1'
+    # 只重放新追加的部分
+    assert calls['cnt'] == 2
+
+
+def test_compact_reader_notices(stores):
+    writer, reader = stores
+    df_a, df_b = _kl_df('2020-01-01', 5, 1), _kl_df('2020-02-01', 7, 2)
+    writer.dump('usA', 'usA_1', df_a)
+    writer.dump('usB', 'usB_1', df_b)
+    df_a_new = _kl_df('2020-01-01', 9, 10)
+    writer.dump('usA', 'usA_2', df_a_new)
+    _assert_kl(reader, 'usA', df_a_new)
+    stamp_b = reader.stamp('usB')
+    old_files = set(reader._read_index()['files'].values())
+
+    writer.remove('usB')
+    writer.compact()
+    assert os.path.getsize(writer.log_fn) == 0
+    # 旧代列文件全部删除，只剩下新一代的列文件
+    for fn in old_files:
+        assert not os.path.exists(os.path.join(writer.store_dir, fn))
+
+    calls = _count_replay(reader)
+    assert 'usB' not in reader
+    assert reader._read_index()['gen'] == 1
+    _assert_kl(reader, 'usA', df_a_new)
+    assert calls['cnt'] == 0
+
+    # compact后的写入追加到新一代的日志以及列文件
+    writer.dump('usB', 'usB_2', df_b)
+    _assert_kl(reader, 'usB', df_b)
+    assert reader.stamp('usB') != stamp_b
+    assert calls['cnt'] == 1
+
+
+def test_log_fold_and_truncate(stores, monkeypatch):
+    writer, reader = stores
+    dfs = {'us{}'.format(ind): _kl_df('2020-01-01', 4 + ind, ind) for ind in range(6)}
+    writer.dump_batch([(symbol, symbol + '_1', df) for symbol, df in dfs.items()])
+    assert len(reader) == len(dfs)
+
+    # 日志超过上限时合并写入新的基准索引，读取进程发现基准索引变化后重新读取
+    monkeypatch.setattr(ABuDataColumnar, 'K_COLUMNAR_LOG_MAX', 0)
+    df_new = _kl_df('2021-01-01', 3, 100)
+    writer.dump('us0', 'us0_2', df_new)
+    assert os.path.getsize(writer.log_fn) == 0
+    assert reader.date_key('us0') == 'us0_2'
+    _assert_kl(reader, 'us0', df_new)
+    for symbol, df in dfs.items():
+        if symbol != 'us0':
+            _assert_kl(reader, symbol, df)
+
+    # 写入进程崩溃留下的不完整记录不影响读取，下一次写入时截断
+    monkeypatch.setattr(ABuDataColumnar, 'K_COLUMNAR_LOG_MAX', 4 * 1024 * 1024)
+    writer.dump('us1', 'us1_2', df_new)
+    assert reader.date_key('us1') == 'us1_2'
+    with open(writer.log_fn, 'ab') as log_file:
+        log_file.write(b'\x80\x05partial')
+    assert reader.date_key('us1') == 'us1_2'
+    writer.dump('us2', 'us2_2', df_new)
+    assert reader.date_key('us2') == 'us2_2'
+    assert reader._log_pos == os.path.getsize(reader.log_fn)
+
+    # 日志被截断后从基准索引重新读取，不会停留在已经不存在的日志位置上
+    with open(writer.log_fn, 'wb'):
+        pass
+    assert reader.date_key('us1') == 'us1_1'
+    assert reader.date_key('us2') == 'us2_1'
+    assert reader._log_pos == 0
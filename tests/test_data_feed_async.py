@@ -0,0 +1,154 @@
+# -*- encoding:utf-8 -*-
+"""ABuDataFeedAsync.kl_df_dict_async在本地http.server桩服务上的重试，超时，以及并发数量限制测试"""
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pandas as pd
+import pytest
+
+from abupy.CoreBu import ABuEnv
+from abupy.MarketBu import ABuDataFeedAsync
+from abupy.MarketBu.ABuDataBase import StockBaseMarket, SupportMixin
+from abupy.MarketBu.ABuSymbol import Symbol
+from abupy.CoreBu.ABuEnv import EMarketTargetType, EMarketSubType
+
+# 请求超时秒数，桩服务的超时请求睡眠更久
+K_STUB_TIME_OUT = 0.3
+K_STUB_CONCURRENCY = 3
+
+
+class _StubState(object):
+    """桩服务记录的每个路径的请求次数，以及同时处理中的请求数量峰值"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.hits = dict()
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    """
+    /fail_once/<code>   第一次请求返回500，之后返回数据
+    /timeout_once/<code> 第一次请求超时，之后返回数据
+    /always_5xx/<code>  每一次都返回503
+    /ok/<code>          睡眠一小段时间后返回数据，用来观察并发数量
+    """
+    state = None
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        state = self.state
+        kind = self.path.split('/')[1]
+        with state.lock:
+            state.hits[self.path] = state.hits.get(self.path, 0) + 1
+            hit = state.hits[self.path]
+            state.in_flight += 1
+            state.max_in_flight = max(state.max_in_flight, state.in_flight)
+        try:
+            if kind == 'timeout_once' and hit == 1:
+                time.sleep(K_STUB_TIME_OUT * 4)
+            else:
+                time.sleep(0.05)
+            if (kind == 'fail_once' and hit == 1) or kind == 'always_5xx':
+                status, body = (500 if kind == 'fail_once' else 503), b'error'
+            else:
+                status, body = 200, json.dumps({'close': [1.0, 2.0, 3.0]}).encode('utf-8')
+        finally:
+            with state.lock:
+                state.in_flight -= 1
+        try:
+            self.send_response(status)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            # 超时请求客户端已经断开
+            pass
+
+
+class _StubMarket(StockBaseMarket, SupportMixin):
+    """请求桩服务的数据源，symbol_code的前缀决定桩服务的行为，eg: fail_once-A"""
+    base_url = None
+
+    def _support_market(self):
+        return [EMarketTargetType.E_MARKET_TARGET_US]
+
+    def kline_requests(self, n_folds=2, start=None, end=None):
+        kind, code = self._symbol.symbol_code.split('-')
+        return [('{}/{}/{}'.format(self.base_url, kind, code), {'timeout': K_STUB_TIME_OUT, 'retry': 3})]
+
+    def kline_parse(self, resps, n_folds=2, start=None, end=None):
+        if resps[0] is None:
+            return None
+        return pd.DataFrame(resps[0].json())
+
+    def kline(self, n_folds=2, start=None, end=None):
+        raise RuntimeError('async path must not call sync kline')
+
+    def minute(self, *args, **kwargs):
+        pass
+
+
+@pytest.fixture
+def stub_source(monkeypatch):
+    state = _StubState()
+    handler = type('_Handler', (_StubHandler,), {'state': state})
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    monkeypatch.setattr(_StubMarket, 'base_url', 'http://127.0.0.1:{}'.format(server.server_address[1]))
+    monkeypatch.setattr(ABuEnv, 'g_private_data_source', _StubMarket)
+    monkeypatch.setattr(ABuDataFeedAsync, 'g_async_backoff', 0.01)
+    monkeypatch.setattr(ABuDataFeedAsync, 'g_async_source_limit', {_StubMarket: (K_STUB_CONCURRENCY, None)})
+    try:
+        yield state
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def _us(code):
+    return Symbol(EMarketTargetType.E_MARKET_TARGET_US, EMarketSubType.US_N, code)
+
+
+def _fetch(symbols):
+    return ABuDataFeedAsync.kl_df_dict_async(symbols, start='2020-01-02', end='2020-06-30', n_jobs=8)
+
+
+def test_retry_5xx_and_timeout(stub_source):
+    df_dict = _fetch([_us('fail_once-A'), _us('timeout_once-B'), _us('always_5xx-C')])
+
+    assert stub_source.hits['/fail_once/A'] == 2
+    assert stub_source.hits['/timeout_once/B'] == 2
+    # retry=3次全部失败后返回None交给kline_parse
+    assert stub_source.hits['/always_5xx/C'] == 3
+    assert list(df_dict['usfail_once-A'][1]['close']) == [1.0, 2.0, 3.0]
+    assert list(df_dict['ustimeout_once-B'][1]['close']) == [1.0, 2.0, 3.0]
+    assert df_dict['usalways_5xx-C'][1] is None
+
+
+def test_concurrency_limit(stub_source):
+    symbols = [_us('ok-{}'.format(ind)) for ind in range(12)]
+    df_dict = _fetch(symbols)
+
+    assert len(df_dict) == 12
+    assert all(df is not None for _, df in df_dict.values())
+    assert sum(stub_source.hits.values()) == 12
+    # 同时处理中的请求不超过数据源的并发限制，并且确实并发请求
+    assert 1 < stub_source.max_in_flight <= K_STUB_CONCURRENCY
+
+
+def test_unsupported_market(stub_source):
+    df_dict = _fetch([Symbol(EMarketTargetType.E_MARKET_TARGET_HK, EMarketSubType.HK, 'ok-00700')])
+
+    # 与kline_pd一致，不支持的市场记录日志后返回None，不发出请求
+    assert df_dict['hkok-00700'][1] is None
+    assert stub_source.hits == dict()
@@ -0,0 +1,58 @@
+# -*- encoding:utf-8 -*-
+"""GridSearch.fit_halving在第一轮交易对象子集上没有任何有效交易结果时的测试"""
+
+import numpy as np
+import pytest
+
+import abupy
+from abupy.CoreBu import ABuEnv
+from abupy.FactorBuyBu.ABuFactorBuyBreak import AbuFactorBuyBreak
+from abupy.FactorSellBu.ABuFactorAtrNStop import AbuFactorAtrNStop
+from abupy.MetricsBu.ABuGridSearch import GridSearch
+
+K_SYMBOLS = ['usBIDU', 'usGOOG', 'usTSLA', 'usNOAH', 'usSFUN', 'usAAPL', 'usWUBA', 'usVIPS', 'usFB']
+# 与fit_halving使用同一个随机排列，只有排在最后的交易对象会产生交易，第一轮的子集中一定没有
+K_PERMUTATION = list(np.random.RandomState(0).permutation(K_SYMBOLS))
+K_TRADE_SYMBOL = K_PERMUTATION[-1]
+
+
+class _OnlyOneSymbolBreak(AbuFactorBuyBreak):
+    """只在K_TRADE_SYMBOL上产生买入信号的突破买入因子"""
+
+    def fit_day(self, today):
+        if self.kl_pd.name != K_TRADE_SYMBOL:
+            return None
+        return super(_OnlyOneSymbolBreak, self).fit_day(today)
+
+    def fit_signals(self, kl_pd):
+        if kl_pd.name != K_TRADE_SYMBOL:
+            return np.zeros(kl_pd.shape[0], dtype=bool)
+        return super(_OnlyOneSymbolBreak, self).fit_signals(kl_pd)
+
+
+@pytest.fixture
+def example_env(monkeypatch):
+    monkeypatch.setattr(ABuEnv, 'g_data_fetch_mode', ABuEnv.g_data_fetch_mode)
+    monkeypatch.setattr(ABuEnv, '_g_enable_example_env_ipython', ABuEnv._g_enable_example_env_ipython)
+    abupy.env.enable_example_env_ipython()
+
+
+def test_fit_halving_first_round_without_trades(example_env):
+    grid = GridSearch(1000000, K_SYMBOLS,
+                      buy_factors_product=[[{'xd': xd, 'class': _OnlyOneSymbolBreak}] for xd in (20, 42, 60)],
+                      sell_factors_product=[[{'stop_loss_n': stop_loss_n, 'stop_win_n': stop_win_n,
+                                              'class': AbuFactorAtrNStop}]
+                                            for stop_loss_n in (0.5, 1.0, 1.5) for stop_win_n in (3.0,)])
+    scores, score_tuple_array = grid.fit_halving(n_jobs=1)
+
+    first_round, last_round = grid.halving_rounds[0], grid.halving_rounds[-1]
+    assert len(grid.halving_rounds) == 2
+    assert first_round['symbols_cnt'] == 3 and K_TRADE_SYMBOL not in K_PERMUTATION[:3]
+    # 第一轮没有评分，全部因子组合进入下一轮
+    assert first_round['scores'] is None
+    assert last_round['factors_cnt'] == first_round['factors_cnt'] == 9
+    assert last_round['symbols_cnt'] == len(K_SYMBOLS)
+    assert scores is not None and len(scores) > 0
+    assert len(score_tuple_array) == 9
+    assert grid.best_score_tuple_grid is score_tuple_array[scores.index[-1]]
+    assert (grid.best_score_tuple_grid.orders_pd.symbol == K_TRADE_SYMBOL).all()